@@ -0,0 +1,7 @@
+# __main__.py
+
+"""Run the command-line interface: python -m forum_backup_crawler <command> ..."""
+
+from forum_backup_crawler.cli import main
+
+main()
@@ -0,0 +1,296 @@
+# benchmarks/bench_crawl.py
+
+"""
+End-to-end crawl benchmark against the local fake forum.
+
+Starts benchmarks/fake_forum.py in a subprocess (so the server's CPU and
+memory don't count against the crawler), runs core.scheduler.run on it
+into a temporary directory and reports:
+
+  pages/s, bytes/s     pages mirrored and bytes served per wall second
+  p50/p99 latency      server-side response times (incl. injected slowness)
+  connection reuse     share of requests that reused a kept-alive connection
+  DB time              seconds spent in StateDB calls (summed over tasks,
+                       so it includes waiting for the connection lock)
+  parse time           seconds the parse stage spent on pages
+  peak RSS             of the crawler process
+
+Results are saved as JSON (--output); with --compare, each metric is
+printed next to the one from an earlier result file, e.g. from another
+commit.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_crawl [--output r.json] \\
+        [--compare baseline.json] [--concurrency N] [--forums N] ...
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from forum_backup_crawler.benchmarks.fake_forum import (
+    ForumSpec, add_spec_arguments, spec_from_args, spec_to_args,
+)
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.scheduler import run
+from forum_backup_crawler.network.http_client import CONNECTIONS
+from forum_backup_crawler.storage.disk_writer import DiskWriter
+from forum_backup_crawler.storage.state_db import DB_SECONDS
+
+try:
+    import resource
+except ImportError:     # not on Windows: peak RSS is left out there
+    resource = None
+
+# Direction of improvement for --compare (other metrics are just counts)
+_HIGHER_IS_BETTER = {"pages_per_sec", "bytes_per_sec"}
+_LOWER_IS_BETTER = {
+    "elapsed_s", "latency_p50_ms", "latency_p99_ms", "db_time_s", "parse_time_s", "peak_rss_mb",
+    "mirror_files", "mirror_mb",
+}
+
+
+def _db_time() -> Tuple[float, int]:
+    """Seconds and calls recorded in fbc_db_seconds so far, over all ops."""
+    seconds, calls = 0.0, 0
+    for _, series in DB_SECONDS.series():
+        seconds += series.sum
+        calls += series.count
+    return seconds, calls
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak RSS of this process (None where the resource module is missing)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _disk_usage(path: Path) -> Tuple[int, int]:
+    """Number of files under `path` and their total size (hard links counted once)."""
+    inodes = {}
+    for file in path.rglob("*"):
+        if file.is_file():
+            st = file.stat()
+            inodes[st.st_dev, st.st_ino] = st.st_size
+    return len(inodes), sum(inodes.values())
+
+
+def _url_counts(db_path: Path) -> Dict[str, int]:
+    conn = sqlite3.connect(str(db_path))
+    try:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status;"))
+        (assets,) = conn.execute(
+            "SELECT COUNT(*) FROM assets WHERE content_hash IS NOT NULL;"
+        ).fetchone()
+        # Legacy URLs that redirect to a page are saved under the page's path
+        (pages,) = conn.execute(
+            """
+            SELECT COUNT(DISTINCT u.local_path) FROM urls u
+            LEFT JOIN assets a ON a.url_id = u.id
+            WHERE u.status = 'done' AND a.url_id IS NULL;
+            """
+        ).fetchone()
+    finally:
+        conn.close()
+    return {
+        "pages": pages,
+        "assets": assets,
+        "urls_done": counts.get("done", 0),
+        "errors": counts.get("error", 0),
+    }
+
+
+@contextmanager
+def _slow_disk(delay: float) -> Iterator[None]:
+    """Add `delay` seconds to every mirror file write (this process only)."""
+    if not delay:
+        yield
+        return
+    write_file = DiskWriter.write_file
+
+    def slow_write_file(self, path, data):
+        time.sleep(delay)
+        write_file(self, path, data)
+
+    DiskWriter.write_file = slow_write_file
+    try:
+        yield
+    finally:
+        DiskWriter.write_file = write_file
+
+
+async def crawl(base_url: str, workdir: Path, options: argparse.Namespace) -> Dict[str, object]:
+    """Run one crawl of the forum at base_url; return the measured metrics."""
+    settings = Settings(
+        start_urls=[base_url + "/"],
+        output_dir=workdir / "mirror",
+        temp_dir=workdir / "temp",
+        concurrency=options.concurrency,
+        processes=options.processes,
+        depth_limit=1000,
+        rate_limiter=options.rate_limiter,
+        rate_limit_rate=options.rate,
+        rate_limit_burst=options.burst,
+        parse_workers=options.parse_workers,
+        rewriter_engine=options.engine,
+        page_layout=options.page_layout,
+        page_codec=options.page_codec,
+        output_format=options.output_format,
+        disk_writer_threads=options.disk_threads,
+        disk_writer_queue=options.disk_queue,
+        pipeline_report_interval=0,
+        metrics_snapshot_interval=0,
+    )
+    db_before = _db_time()
+    connections_before = {kind: CONNECTIONS.labels(kind).value for kind in ("new", "reused")}
+    started = time.perf_counter()
+    with _slow_disk(options.slow_disk_ms / 1000):
+        stages = await run(settings)
+    elapsed = time.perf_counter() - started
+    db_seconds, db_calls = (a - b for a, b in zip(_db_time(), db_before))
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(base_url + "/_stats") as resp:
+            served = await resp.json()
+
+    counts = _url_counts(settings.temp_dir / "state.db")
+    mirror_files, mirror_bytes = _disk_usage(settings.output_dir)
+    opened, reused = (
+        CONNECTIONS.labels(kind).value - connections_before[kind] for kind in ("new", "reused")
+    )
+    return {
+        **counts,
+        "elapsed_s": elapsed,
+        "pages_per_sec": counts["pages"] / elapsed,
+        "requests": served["requests"],
+        "bytes": served["bytes"],
+        "bytes_per_sec": served["bytes"] / elapsed,
+        "latency_p50_ms": served["latency_p50_ms"],
+        "latency_p99_ms": served["latency_p99_ms"],
+        "statuses": served["statuses"],
+        "connections_opened": opened,
+        "connection_reuse": reused / (opened + reused) if opened + reused else 0.0,
+        "db_time_s": db_seconds,
+        "db_calls": db_calls,
+        "parse_time_s": stages["parse"]["busy"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "mirror_files": mirror_files,
+        "mirror_mb": mirror_bytes / 1e6,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(spec: ForumSpec, options: argparse.Namespace) -> Dict[str, object]:
+    """Start the fake forum, crawl it, and return the full result record."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "forum_backup_crawler.benchmarks.fake_forum",
+         "--port", "0", *spec_to_args(spec)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        base_url = server.stdout.readline().strip()
+        if not base_url:
+            raise RuntimeError("fake forum failed to start")
+        with tempfile.TemporaryDirectory() as tmp:
+            results = asyncio.run(crawl(base_url, Path(tmp), options))
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "label": options.label,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "spec": asdict(spec),
+        "options": {
+            k: getattr(options, k)
+            for k in (
+                "concurrency", "processes", "rate_limiter", "rate", "burst", "parse_workers",
+                "engine", "page_layout", "page_codec", "output_format",
+                "disk_threads", "disk_queue", "slow_disk_ms",
+            )
+        },
+        "expected_pages": spec.page_count(),
+        "results": results,
+    }
+
+
+def report(record: Dict[str, object], baseline: Dict[str, object] = None) -> List[str]:
+    """Format the numeric results, with the change from `baseline` if given."""
+    lines = [f"{record['label'] or 'crawl'} @ {record['commit']}"]
+    old = baseline["results"] if baseline else {}
+    for key, value in record["results"].items():
+        if not isinstance(value, (int, float)):
+            continue
+        line = f"  {key:16} {value:14.2f}"
+        if isinstance(old.get(key), (int, float)) and old[key]:
+            change = (value - old[key]) / old[key]
+            line += f"   {change:+7.1%} vs {old[key]:.2f}"
+            if abs(change) > 0.05 and (key in _HIGHER_IS_BETTER or key in _LOWER_IS_BETTER):
+                line += " better" if (change > 0) == (key in _HIGHER_IS_BETTER) else " worse"
+        lines.append(line)
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", type=Path, help="Write the result record to this JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare with")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--concurrency", type=int, default=16)
+    # The shards' DB and connection metrics stay in their processes (reported as 0)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--rate-limiter", default="token_bucket",
+                        choices=["adaptive", "fixed", "token_bucket"])
+    parser.add_argument("--rate", type=float, default=10_000.0)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--engine", default="soup", choices=["soup", "stream"])
+    parser.add_argument("--page-layout", default="files", choices=["files", "segments"])
+    parser.add_argument("--page-codec", default="none", choices=["none", "gzip", "zstd"])
+    parser.add_argument("--output-format", default="mirror", choices=["mirror", "warc"])
+    parser.add_argument("--disk-threads", type=int, default=4)
+    parser.add_argument("--disk-queue", type=int, default=16)
+    # Simulated disk latency per page file; 1 thread with a queue of 1 writes
+    # batch by batch, as before the disk writer
+    parser.add_argument("--slow-disk-ms", type=float, default=0.0)
+    add_spec_arguments(parser)
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    record = run_benchmark(spec_from_args(options), options)
+    baseline = json.loads(options.compare.read_text()) if options.compare else None
+    print("\n".join(report(record, baseline)))
+    if options.output:
+        options.output.write_text(json.dumps(record, indent=2) + "\n")
+        print(f"Saved {options.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_frontier.py
+
+"""
+Compare URL pop throughput of StateDB.pop_pending against the batched Frontier.
+
+Each run seeds a fresh state.db with N URLs, then drains it with W concurrent
+consumers that pop a URL and immediately mark it done.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_frontier [--urls N] [--workers W]
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.frontier import Frontier
+
+
+async def _seed(db_path: Path, n_urls: int) -> StateDB:
+    db = StateDB(db_path)
+    await db.connect()
+    await db.add_seed_urls(
+        (f"https://forum.example/t{i}-topic" for i in range(n_urls)), depth=0
+    )
+    return db
+
+
+async def bench_db(db_path: Path, n_urls: int, workers: int) -> float:
+    """Drain the queue with direct StateDB calls; return pops per second."""
+    db = await _seed(db_path, n_urls)
+
+    async def consume() -> None:
+        while (item := await db.pop_pending()) is not None:
+            await db.mark_done(item[0], "x.html")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(consume() for _ in range(workers)))
+    elapsed = time.perf_counter() - start
+    await db.close()
+    return n_urls / elapsed
+
+
+async def bench_frontier(
+    db_path: Path, n_urls: int, workers: int, block_size: int
+) -> float:
+    """Drain the queue through a Frontier; return pops per second."""
+    db = await _seed(db_path, n_urls)
+    frontier = Frontier(db, block_size=block_size)
+    await frontier.start()
+
+    async def consume() -> None:
+        while (item := await frontier.pop_pending()) is not None:
+            await frontier.mark_done(item[0], "x.html")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(consume() for _ in range(workers)))
+    await frontier.close()
+    elapsed = time.perf_counter() - start
+    await db.close()
+    return n_urls / elapsed
+
+
+async def main(n_urls: int, workers: int, block_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = await bench_db(Path(tmp) / "direct.db", n_urls, workers)
+        batched = await bench_frontier(
+            Path(tmp) / "frontier.db", n_urls, workers, block_size
+        )
+    print(f"StateDB.pop_pending : {direct:10.0f} pops/s")
+    print(f"Frontier (block={block_size}): {batched:10.0f} pops/s")
+    print(f"Speed-up            : {batched / direct:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--block-size", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(main(args.urls, args.workers, args.block_size))
@@ -0,0 +1,119 @@
+# benchmarks/bench_path_mapper.py
+
+"""
+Measure PathMapper throughput with and without its memos, and the mirror's directory fan-out.
+
+The link workload replays what rewriting --urls links does: pages of a
+synthetic forum, each linking to the forum navigation, its own topic's
+pagination, and members (and their avatars) drawn with a skew towards
+active ones. The layout part maps --urls distinct topic pages flat and
+sharded; with --touch N it also creates N of them as empty files and
+times random lookups in each layout.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_path_mapper [--urls N] [--touch N]
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+HOST = "https://f.example"
+LINKS_PER_PAGE = 40
+# (levels, fanout) compared in the layout part
+LAYOUTS = ((0, 256), (1, 256), (2, 256))
+
+
+def pages(n_links: int, seed: int = 1) -> Iterator[Tuple[str, List[str]]]:
+    """Yield (page URL, links on it) until about `n_links` links were yielded."""
+    rng = random.Random(seed)
+    nav = [f"{HOST}/", f"{HOST}/search", f"{HOST}/memberlist"] + [f"{HOST}/f{i}-forum" for i in range(7)]
+    members = max(n_links // 200, 100)
+    topic = 0
+    for _ in range(n_links // LINKS_PER_PAGE):
+        topic += 1
+        page = f"{HOST}/t{topic}-topic"
+        links = list(nav)
+        links += [f"{HOST}/t{topic}p{15 * k}-topic" for k in range(1, 6)]
+        while len(links) < LINKS_PER_PAGE:
+            user = int(members * rng.random() ** 3)
+            links += [f"{HOST}/u{user}", f"{HOST}/users/avatar/{user % 500}.png"]
+        yield page, links[:LINKS_PER_PAGE]
+
+
+def bench_links(n_links: int, cache_size: int) -> Tuple[float, dict]:
+    """Map and link every URL of the workload; return (links per second, cache stats)."""
+    mapper = PathMapper(Path("."), cache_size=cache_size)
+    workload = list(pages(n_links))
+    start = time.perf_counter()
+    for page, links in workload:
+        page_path = mapper.url_to_path(page)
+        for link in links:
+            mapper.relative_link(page_path, mapper.url_to_path(link))
+    elapsed = time.perf_counter() - start
+    return len(workload) * LINKS_PER_PAGE / elapsed, mapper.cache_stats()
+
+
+def layout(n_urls: int, levels: int, fanout: int) -> List[Path]:
+    mapper = PathMapper(Path("."), shard_levels=levels, shard_fanout=fanout, cache_size=0)
+    return [mapper.url_to_path(f"{HOST}/t{i}-topic") for i in range(n_urls)]
+
+
+def bench_lookups(paths: List[Path], touch: int, lookups: int = 20000) -> Tuple[float, float]:
+    """Create `touch` of `paths` as files; return (creates per second, stats per second)."""
+    paths = paths[:touch]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        for path in paths:
+            target = root / path
+            try:
+                target.touch()
+            except FileNotFoundError:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.touch()
+        created = len(paths) / (time.perf_counter() - start)
+        sample = random.Random(2).choices(paths, k=lookups)
+        start = time.perf_counter()
+        for path in sample:
+            os.stat(root / path)
+        looked_up = lookups / (time.perf_counter() - start)
+    return created, looked_up
+
+
+def main(n_urls: int, touch: int) -> None:
+    for cache_size in (0, 65536):
+        rate, stats = bench_links(n_urls, cache_size)
+        hits = stats["paths"]["hits"] + stats["links"]["hits"]
+        calls = hits + stats["paths"]["misses"] + stats["links"]["misses"]
+        print(
+            f"links, cache {cache_size:6}: {rate:10.0f} links/s"
+            + (f"  ({hits / calls:.0%} memo hits)" if cache_size else "")
+        )
+    for levels, fanout in LAYOUTS:
+        paths = layout(n_urls, levels, fanout)
+        per_dir = Counter(path.parent for path in paths)
+        line = (
+            f"layout {levels} x {fanout:3}: {len(per_dir):6} dirs, "
+            f"max {max(per_dir.values()):8} entries/dir"
+        )
+        if touch:
+            created, looked_up = bench_lookups(paths, touch)
+            line += f"  create {created:8.0f}/s  stat {looked_up:8.0f}/s"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--touch", type=int, default=0, help="Files to create per layout")
+    args = parser.parse_args()
+    main(args.urls, args.touch)
@@ -0,0 +1,93 @@
+# benchmarks/bench_rewriter.py
+
+"""
+Compare throughput and peak memory of the "soup" and "stream" HTML rewriters.
+
+Each engine runs in its own subprocess. Peak memory is what one rewrite
+allocates on top of its input, traced with tracemalloc (both engines are
+pure Python, so that is all of it) outside the timed loop. Input is a
+synthetic forum topic page of roughly --size KB, built by repeating the
+posts of the forumeiros topic fixture.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_rewriter [--pages N] [--size KB]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from forum_backup_crawler.processing.html_rewriter import rewrite_page
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+FIXTURE = Path(__file__).parent.parent / "tests" / "fixtures" / "pages" / "forumeiros_topic.html"
+URL = "https://modelistas.forumeiros.com/t2211p30-kit-frateschi-g12-pintura"
+ENGINES = ("soup", "stream")
+
+
+def synthetic_page(size_kb: int) -> str:
+    """Grow the fixture page to about `size_kb` by repeating its body."""
+    html = FIXTURE.read_text(encoding="utf-8")
+    head, _, rest = html.partition("<body")
+    body, _, tail = rest.partition("</body>")
+    body = body.split(">", 1)[1]
+    parts = [head, "<body>"]
+    size = len(head)
+    i = 0
+    while size < size_kb * 1024:
+        # Vary the links so each copy maps to different URLs
+        chunk = body.replace('href="/t', f'href="/t{i}')
+        parts.append(chunk)
+        size += len(chunk)
+        i += 1
+    parts.append("</body>" + tail)
+    return "".join(parts)
+
+
+def run_engine(engine: str, pages: int, size_kb: int) -> dict:
+    """Rewrite the synthetic page `pages` times; return timing and peak memory."""
+    html = synthetic_page(size_kb)
+    rules = PathMapper(Path("."), hosts=["modelistas.forumeiros.com"]).rules
+    rewrite_page(html, URL, rules, engine)  # warm-up
+    start = time.perf_counter()
+    for _ in range(pages):
+        rewrite_page(html, URL, rules, engine)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    rewrite_page(html, URL, rules, engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"pages_per_sec": pages / elapsed, "peak_kb": peak // 1024, "page_kb": len(html) // 1024}
+
+
+def main(pages: int, size_kb: int) -> None:
+    results = {}
+    for engine in ENGINES:
+        out = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--engine", engine,
+             "--pages", str(pages), "--size", str(size_kb)],
+            check=True, capture_output=True, text=True,
+        )
+        results[engine] = json.loads(out.stdout)
+
+    print(f"Page size: {results['soup']['page_kb']} KB, {pages} pages per engine")
+    for engine, r in results.items():
+        print(f"{engine:7}: {r['pages_per_sec']:8.1f} pages/s   peak {r['peak_kb'] / 1024:7.1f} MB")
+    print(f"Speed-up: {results['stream']['pages_per_sec'] / results['soup']['pages_per_sec']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--size", type=int, default=300, help="Page size in KB")
+    parser.add_argument("--engine", choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.engine:
+        print(json.dumps(run_engine(args.engine, args.pages, args.size)))
+    else:
+        main(args.pages, args.size)
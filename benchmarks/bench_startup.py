@@ -0,0 +1,130 @@
+# benchmarks/bench_startup.py
+
+"""
+Measure CLI startup: wall time and imports of each command, via python -X importtime.
+
+The cheap commands (status, stats, config show) run for real against a scratch
+config; for crawl, export and view only the imports their handlers make
+are timed. Cheap commands must not import any of HEAVY_MODULES, and
+with --budget-ms their wall time must stay under the budget: the run
+exits non-zero otherwise, so it can guard against regressions in CI.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_startup [--runs 5] [--top 8] [--budget-ms 300]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+PACKAGE = "forum_backup_crawler"
+# Modules only the crawl itself (and export/view) should pay for
+HEAVY_MODULES = ("aiohttp", "bs4", "lxml", "selectolax", f"{PACKAGE}.core.scheduler")
+# The imports behind the commands that do the real work
+HANDLER_IMPORTS = {
+    "crawl": f"{PACKAGE}.core.scheduler",
+    "export": f"{PACKAGE}.core.export",
+    "view": f"{PACKAGE}.core.viewer",
+}
+
+
+def import_times(args: Sequence[str], cwd: Path) -> Tuple[float, Dict[str, int]]:
+    """
+    Run `python -X importtime <args>`; return (wall seconds,
+    {module: cumulative import microseconds}).
+
+    :raises subprocess.CalledProcessError: if the command fails
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - start
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return elapsed, modules
+
+
+def heavy_imports(modules: Dict[str, int]) -> List[str]:
+    """The HEAVY_MODULES (or their submodules) among `modules`."""
+    return sorted(
+        name for name in modules
+        if any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+    )
+
+
+def cheap_commands(workdir: Path) -> Dict[str, List[str]]:
+    """Runnable cheap commands, set up against a scratch config in `workdir`."""
+    config = workdir / "config.toml"
+    config.write_text(
+        f'start_urls = ["https://forum.example/"]\noutput_dir = "{(workdir / "out").as_posix()}"\n',
+        encoding="utf-8",
+    )
+    (workdir / "out" / "temp").mkdir(parents=True, exist_ok=True)
+    sqlite3.connect(workdir / "out" / "temp" / "state.db").close()
+    (workdir / "out" / "temp" / "metrics.json").write_text(
+        json.dumps({"time": 0, "metrics": {"fbc_pages_total": 1}}), encoding="utf-8"
+    )
+    return {
+        "status": ["-m", PACKAGE, "status", str(config), "--sample", "0"],
+        "stats": ["-m", PACKAGE, "stats", str(config)],
+        "config show": ["-m", PACKAGE, "config", "show", str(config)],
+    }
+
+
+def main(runs: int, top: int, budget_ms: float) -> int:
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        commands = cheap_commands(workdir)
+        commands.update({
+            name: ["-c", f"import {PACKAGE}.cli, {module}"] for name, module in HANDLER_IMPORTS.items()
+        })
+        for name, args in commands.items():
+            times = []
+            for _ in range(runs):
+                elapsed, modules = import_times(args, Path.cwd())
+                times.append(elapsed)
+            best = min(times) * 1000
+            print(f"{name:12} {best:7.1f} ms wall, {len(modules):4} modules imported")
+            # Top-level packages, plus our own modules
+            slowest = sorted(
+                (
+                    (us, module) for module, us in modules.items()
+                    if "." not in module or module.startswith(PACKAGE)
+                ),
+                reverse=True,
+            )[:top]
+            for us, module in slowest:
+                print(f"    {us / 1000:7.1f} ms  {module}")
+            if name in ("status", "stats", "config show"):
+                heavy = heavy_imports(modules)
+                if heavy:
+                    failures.append(f"{name} imports {', '.join(heavy)}")
+                if budget_ms and best > budget_ms:
+                    failures.append(f"{name} took {best:.0f} ms (budget {budget_ms:.0f} ms)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (best is reported)")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports shown per command")
+    parser.add_argument("--budget-ms", type=float, default=0, help="Fail if a cheap command is slower (0 = no budget)")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.top, args.budget_ms))
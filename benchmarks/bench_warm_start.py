@@ -0,0 +1,86 @@
+# benchmarks/bench_warm_start.py
+
+"""
+Time a restart's startup on a large state.db, cold versus from a checkpoint.
+
+Seeds a state.db with N URLs, then times what scheduler.run does before
+the first fetch: connect, reset_in_progress and the seen filter. Cold,
+the filter is rebuilt from the whole urls table; warm, a checkpoint
+was saved first and the filter is loaded from its file, and verifying
+it against the DB (which the crawl runs in the background) is timed
+separately.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.bench_warm_start [--urls N]
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from forum_backup_crawler.core.checkpoint import Checkpointer, load_checkpoint, restore, verify_checkpoint
+from forum_backup_crawler.network.rate_limit import FixedLimiter, HostLimiterRegistry
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.seen_filter import open_seen_filter
+from forum_backup_crawler.storage.state_db import StateDB
+
+CAPACITY = 5_000_000
+FP_RATE = 1e-5
+
+
+async def _seed(db_path: Path, n_urls: int, chunk: int = 100_000) -> None:
+    db = StateDB(db_path)
+    await db.connect()
+    for first in range(0, n_urls, chunk):
+        await db.add_seed_urls(
+            f"https://forum.example/t{i}-topic" for i in range(first, min(first + chunk, n_urls))
+        )
+    await db.close()
+
+
+async def startup(temp_dir: Path) -> tuple[StateDB, Frontier, float]:
+    """What run() does before crawling; returns (db, frontier, seconds)."""
+    start = time.perf_counter()
+    db = StateDB(temp_dir / "state.db")
+    await db.connect()
+    await db.reset_in_progress()
+    checkpoint = load_checkpoint(temp_dir)
+    if checkpoint is not None:
+        await restore(checkpoint, db, HostLimiterRegistry(lambda host: FixedLimiter(0, 1)))
+    seen = await open_seen_filter(db, temp_dir / "state.seen", CAPACITY, FP_RATE)
+    return db, Frontier(db, seen=seen), time.perf_counter() - start
+
+
+async def main(n_urls: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        temp_dir = Path(tmp)
+        await _seed(temp_dir / "state.db", n_urls)
+
+        db, frontier, cold = await startup(temp_dir)
+        print(f"{f'cold start ({n_urls} URLs)':28}{cold:7.2f}s")
+        started = time.perf_counter()
+        checkpointer = Checkpointer(
+            temp_dir, db, frontier, HostLimiterRegistry(lambda host: FixedLimiter(0, 1)),
+            temp_dir / "state.seen", interval=0,
+        )
+        await checkpointer.close()
+        print(f"{'checkpoint save':28}{time.perf_counter() - started:7.2f}s")
+        await db.close()
+
+        db, frontier, warm = await startup(temp_dir)
+        print(f"{'warm start':28}{warm:7.2f}s")
+        started = time.perf_counter()
+        ok = await verify_checkpoint(db, frontier)
+        elapsed = time.perf_counter() - started
+        print(f"{'background verification':28}{elapsed:7.2f}s ({'ok' if ok else 'FAILED'})")
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.urls))
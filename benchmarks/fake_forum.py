@@ -0,0 +1,346 @@
+# benchmarks/fake_forum.py
+
+"""
+Local stand-in for a Forumeiros/phpBB board, for end-to-end tests and
+crawl benchmarks.
+
+The forum is generated deterministically from a ForumSpec: the same spec
+always serves the same pages, byte for byte. It has an index, paginated
+forum and topic pages with Forumeiros URLs (/f1-slug, /f1p20-slug,
+/t12-slug, /t12p15-slug), member profiles, avatars shared between members,
+post attachments and legacy /viewtopic.php?t= links that redirect. On
+request it also answers bursts of 429s and serves some pages slowly.
+
+GET /_stats returns what was served so far (requests, bytes, statuses,
+latency percentiles) and is not counted itself.
+
+Usage:
+    python -m forum_backup_crawler.benchmarks.fake_forum [--port P] [--forums N] ...
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field, fields
+from typing import AsyncIterator, Dict, List
+
+from aiohttp import web
+
+WORDS = (
+    "locomotiva vagão escala trilho maquete pintura kit frateschi digital "
+    "decoder estação ponte túnel catenária vapor diesel elétrica carga "
+    "passageiros detalhe envelhecimento cenário montagem solda motor"
+).split()
+
+
+@dataclass
+class ForumSpec:
+    """
+    Shape of the generated forum. Every "every" field is a period (every
+    Nth item); 0 disables the feature.
+    """
+    forums: int = 4
+    topics_per_forum: int = 25
+    topics_per_page: int = 20
+    posts_per_topic: int = 40
+    posts_per_page: int = 15
+    users: int = 50
+    avatars: int = 8               # distinct avatar images, shared by members
+    avatar_kb: int = 4
+    attachment_every: int = 10     # posts with an attachment
+    attachment_kb: int = 64
+    legacy_link_every: int = 7     # posts linking a topic by a redirecting URL
+    burst_every: int = 0           # after every N requests, a burst of 429s...
+    burst_length: int = 5          # ...this many requests long
+    slow_every: int = 0            # pages answered slowly
+    slow_delay: float = 0.2
+    seed: int = 1
+
+    @property
+    def topics(self) -> int:
+        return self.forums * self.topics_per_forum
+
+    def topic_pages(self) -> int:
+        return -(-self.posts_per_topic // self.posts_per_page)
+
+    def forum_pages(self) -> int:
+        return -(-self.topics_per_forum // self.topics_per_page)
+
+    def page_count(self) -> int:
+        """HTML pages reachable from the index (redirects not counted)."""
+        return (
+            1
+            + self.forums * self.forum_pages()
+            + self.topics * self.topic_pages()
+            + min(self.users, self.topics * self.posts_per_topic)
+        )
+
+    def attachment_count(self) -> int:
+        if not self.attachment_every:
+            return 0
+        return self.topics * (self.posts_per_topic // self.attachment_every)
+
+
+@dataclass
+class ServerStats:
+    """What the server has answered so far (see GET /_stats)."""
+    requests: int = 0
+    bytes: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    latencies: List[float] = field(default_factory=list)
+
+    def snapshot(self) -> Dict[str, object]:
+        ordered = sorted(self.latencies)
+
+        def pct(p: float) -> float:
+            return ordered[min(int(p * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "latency_p50_ms": pct(0.50) * 1000,
+            "latency_p99_ms": pct(0.99) * 1000,
+        }
+
+
+class FakeForum:
+    """aiohttp application serving the forum described by a ForumSpec."""
+
+    def __init__(self, spec: ForumSpec) -> None:
+        self.spec = spec
+        self.stats = ServerStats()
+        self._avatars = [self._blob("avatar", i, spec.avatar_kb) for i in range(spec.avatars)]
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._account])
+        app.router.add_get("/_stats", self._stats)
+        app.router.add_get("/", self._index)
+        app.router.add_get("/forum", self._index)
+        app.router.add_get(r"/f{f:\d+}-{slug}", self._forum)
+        app.router.add_get(r"/f{f:\d+}p{start:\d+}-{slug}", self._forum)
+        app.router.add_get(r"/t{t:\d+}-{slug}", self._topic)
+        app.router.add_get(r"/t{t:\d+}p{start:\d+}-{slug}", self._topic)
+        app.router.add_get(r"/u{u:\d+}", self._profile)
+        app.router.add_get(r"/users/avatar/{a:\d+}.png", self._avatar)
+        app.router.add_get("/download/file.php", self._attachment)
+        app.router.add_get("/viewtopic.php", self._legacy)
+        return app
+
+    # --- accounting, bursts, slowness ---
+
+    @web.middleware
+    async def _account(self, request: web.Request, handler) -> web.StreamResponse:
+        if request.path == "/_stats":
+            return await handler(request)
+        spec, stats = self.spec, self.stats
+        started = time.perf_counter()
+        stats.requests += 1
+        n = stats.requests
+        if spec.burst_every and n > spec.burst_every and n % spec.burst_every < spec.burst_length:
+            response = web.Response(status=429, text="Too many requests",
+                                    headers={"Retry-After": "1"})
+        else:
+            if spec.slow_every and zlib.crc32(request.path_qs.encode()) % spec.slow_every == 0:
+                await asyncio.sleep(spec.slow_delay)
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                response = web.Response(status=e.status, text=e.text, headers=e.headers)
+        stats.statuses[response.status] += 1
+        stats.bytes += len(response.body or b"")
+        stats.latencies.append(time.perf_counter() - started)
+        return response
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.snapshot())
+
+    # --- pages ---
+
+    def _rng(self, *key: object) -> random.Random:
+        return random.Random(f"{self.spec.seed}:{':'.join(map(str, key))}")
+
+    def _words(self, rng: random.Random, n: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    def _slug(self, kind: str, n: int) -> str:
+        return "-".join(self._words(self._rng(kind, n), 3).split())
+
+    def _topic_url(self, t: int, start: int = 0) -> str:
+        page = f"p{start}" if start else ""
+        return f"/t{t}{page}-{self._slug('t', t)}"
+
+    def _forum_url(self, f: int, start: int = 0) -> str:
+        page = f"p{start}" if start else ""
+        return f"/f{f}{page}-{self._slug('f', f)}"
+
+    def _page(self, title: str, body: str) -> web.Response:
+        html = (
+            "<!DOCTYPE html>\n<html lang=\"pt\"><head><meta charset=\"utf-8\">"
+            f"<title>{title}</title></head>\n<body>"
+            '<div id="header"><a href="/">Índice</a></div>\n'
+            f"{body}\n</body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    def _pagination(self, url, start: int, total: int, per_page: int) -> str:
+        links = [
+            f'<a href="{url(s)}">{s // per_page + 1}</a>' if s != start else f"<b>{s // per_page + 1}</b>"
+            for s in range(0, total, per_page)
+        ]
+        return f'<p class="pagination">{" ".join(links)}</p>' if len(links) > 1 else ""
+
+    async def _index(self, request: web.Request) -> web.Response:
+        rows = "".join(
+            f'<tr><td><a href="{self._forum_url(f)}" class="forumlink">'
+            f"{self._words(self._rng('f', f), 3)}</a></td></tr>\n"
+            for f in range(1, self.spec.forums + 1)
+        )
+        return self._page("Índice", f'<table class="forumline">{rows}</table>')
+
+    async def _forum(self, request: web.Request) -> web.Response:
+        spec = self.spec
+        f = int(request.match_info["f"])
+        start = int(request.match_info.get("start", 0))
+        if not 1 <= f <= spec.forums or start >= spec.topics_per_forum or start % spec.topics_per_page:
+            raise web.HTTPNotFound()
+        first = (f - 1) * spec.topics_per_forum + 1
+        rows = []
+        for t in range(first + start, first + min(start + spec.topics_per_page, spec.topics_per_forum)):
+            last = (spec.topic_pages() - 1) * spec.posts_per_page
+            rows.append(
+                f'<tr><td><a href="{self._topic_url(t)}" class="topictitle">'
+                f"{self._words(self._rng('t', t), 5)}</a>"
+                f' <a href="{self._topic_url(t, last)}">»</a></td></tr>\n'
+            )
+        body = (
+            f'<table class="forumline">{"".join(rows)}</table>'
+            + self._pagination(lambda s: self._forum_url(f, s), start,
+                               spec.topics_per_forum, spec.topics_per_page)
+        )
+        return self._page(f"Fórum {f}", body)
+
+    async def _topic(self, request: web.Request) -> web.Response:
+        spec = self.spec
+        t = int(request.match_info["t"])
+        start = int(request.match_info.get("start", 0))
+        if not 1 <= t <= spec.topics or start >= spec.posts_per_topic or start % spec.posts_per_page:
+            raise web.HTTPNotFound()
+        posts = []
+        for i in range(start, min(start + spec.posts_per_page, spec.posts_per_topic)):
+            rng = self._rng("p", t, i)
+            post_id = (t - 1) * spec.posts_per_topic + i + 1
+            # Members take turns, so every profile is linked once there are enough posts
+            user = (post_id - 1) % spec.users + 1
+            extra = ""
+            if spec.attachment_every and (i + 1) % spec.attachment_every == 0:
+                extra += f'<p><a href="/download/file.php?id={post_id}">anexo-{post_id}.zip</a></p>'
+            if spec.legacy_link_every and (i + 1) % spec.legacy_link_every == 0:
+                other = rng.randrange(spec.topics) + 1
+                extra += f'<p>Veja <a href="/viewtopic.php?t={other}">este tópico</a></p>'
+            posts.append(
+                f'<div class="post" id="p{post_id}">'
+                f'<a href="/u{user}"><img src="/users/avatar/{user % spec.avatars}.png" alt=""></a>'
+                f'<a href="/u{user}" class="author">membro{user}</a>'
+                f'<div class="postbody">{self._words(rng, rng.randint(40, 160))}</div>{extra}</div>\n'
+            )
+        body = (
+            f'<h1>{self._words(self._rng("t", t), 5)}</h1>'
+            + "".join(posts)
+            + self._pagination(lambda s: self._topic_url(t, s), start,
+                               spec.posts_per_topic, spec.posts_per_page)
+        )
+        return self._page(f"Tópico {t}", body)
+
+    async def _profile(self, request: web.Request) -> web.Response:
+        u = int(request.match_info["u"])
+        if not 1 <= u <= self.spec.users:
+            raise web.HTTPNotFound()
+        rng = self._rng("u", u)
+        body = (
+            f'<h1>membro{u}</h1><img src="/users/avatar/{u % self.spec.avatars}.png" alt="">'
+            f"<p>{self._words(rng, 30)}</p>"
+        )
+        return self._page(f"Perfil membro{u}", body)
+
+    def _blob(self, kind: str, n: int, kb: int) -> bytes:
+        return self._rng(kind, n).randbytes(kb * 1024)
+
+    async def _avatar(self, request: web.Request) -> web.Response:
+        a = int(request.match_info["a"])
+        if not 0 <= a < self.spec.avatars:
+            raise web.HTTPNotFound()
+        return web.Response(body=self._avatars[a], content_type="image/png")
+
+    async def _attachment(self, request: web.Request) -> web.Response:
+        post_id = int(request.query.get("id", 0))
+        if not post_id:
+            raise web.HTTPNotFound()
+        return web.Response(
+            body=self._blob("a", post_id, self.spec.attachment_kb),
+            content_type="application/octet-stream",
+        )
+
+    async def _legacy(self, request: web.Request) -> web.Response:
+        t = int(request.query.get("t", 0))
+        if not 1 <= t <= self.spec.topics:
+            raise web.HTTPNotFound()
+        raise web.HTTPMovedPermanently(self._topic_url(t))
+
+
+@asynccontextmanager
+async def serve(spec: ForumSpec, host: str = "127.0.0.1", port: int = 0) -> AsyncIterator[str]:
+    """Serve the forum in the running loop; yields its base URL."""
+    forum = FakeForum(spec)
+    runner = web.AppRunner(forum.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+    try:
+        yield f"http://{host}:{bound}"
+    finally:
+        await runner.cleanup()
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add one --option per ForumSpec field."""
+    for f in fields(ForumSpec):
+        parser.add_argument(
+            "--" + f.name.replace("_", "-"), type=type(f.default), default=f.default
+        )
+
+
+def spec_from_args(args: argparse.Namespace) -> ForumSpec:
+    return ForumSpec(**{f.name: getattr(args, f.name) for f in fields(ForumSpec)})
+
+
+def spec_to_args(spec: ForumSpec) -> List[str]:
+    args = []
+    for name, value in asdict(spec).items():
+        args += ["--" + name.replace("_", "-"), str(value)]
+    return args
+
+
+async def _main(spec: ForumSpec, host: str, port: int) -> None:
+    async with serve(spec, host, port) as url:
+        # First line is read by benchmarks/bench_crawl.py
+        print(url, flush=True)
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(spec_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
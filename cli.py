@@ -0,0 +1,192 @@
+# cli.py
+
+"""
+Mirror an online forum for offline browsing.
+
+Each command imports only what it uses, so the cheap ones (status,
+stats, config show) start without loading aiohttp, the HTML parsers or
+the crawl machinery.
+
+Usage:
+    python -m forum_backup_crawler crawl config.toml [--processes N] [--set name=value ...]
+    python -m forum_backup_crawler export config.toml [--workers N]
+    python -m forum_backup_crawler view path/to/output_dir [--port 8800]
+    python -m forum_backup_crawler status config.toml [--sample 2]
+    python -m forum_backup_crawler stats config.toml
+    python -m forum_backup_crawler config show [config.toml] [--set name=value ...]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import tomllib
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from forum_backup_crawler.config import Settings
+
+
+def load_settings(path: Optional[Path], overrides: Sequence[str] = ()) -> "Settings":
+    """
+    Settings.from_file() with `name=value` overrides on top. Values are
+    read as TOML values (numbers, booleans, ["lists"]) and fall back to
+    plain strings.
+
+    :raises SystemExit: on a malformed override or invalid settings
+    """
+    from pydantic import ValidationError
+
+    from forum_backup_crawler.config import Settings
+
+    values = {}
+    for override in overrides:
+        name, sep, value = override.partition("=")
+        if not sep or not name.strip():
+            raise SystemExit(f"--set expects name=value, got {override!r}")
+        try:
+            values[name.strip()] = tomllib.loads(f"v = {value}")["v"]
+        except tomllib.TOMLDecodeError:
+            values[name.strip()] = value
+    try:
+        return Settings.from_file(path, values)
+    except ValidationError as e:
+        raise SystemExit(f"Invalid settings: {e}")
+
+
+def _crawl(args: argparse.Namespace) -> None:
+    overrides = list(args.set)
+    for name in ("processes", "coordinator_port", "coordinator_url"):
+        value = getattr(args, name)
+        if value is not None:
+            overrides.append(f"{name}={json.dumps(value)}")
+    settings = load_settings(args.config, overrides)
+
+    import asyncio
+    from forum_backup_crawler.core.scheduler import run
+
+    asyncio.run(run(settings))
+
+
+def _export(args: argparse.Namespace) -> None:
+    settings = load_settings(args.config, args.set)
+
+    import asyncio
+    from forum_backup_crawler.core.export import export_archive
+
+    try:
+        pages, assets, failed = asyncio.run(export_archive(settings, args.workers))
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    print(f"Exported {pages} pages and {assets} assets to {settings.output_dir} ({failed} failed)")
+
+
+def _view(args: argparse.Namespace) -> None:
+    import asyncio
+    from forum_backup_crawler.core.viewer import serve
+
+    try:
+        asyncio.run(serve(args.output_dir, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def _status(args: argparse.Namespace) -> None:
+    settings = load_settings(args.config, args.set)
+
+    import asyncio
+    from forum_backup_crawler.core.progress import format_limiters, read_limiters, read_progress
+
+    db_path = settings.temp_dir / "state.db"
+    try:
+        progress = asyncio.run(read_progress(db_path, args.sample))
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    print(f"URLs:     {progress.summary()}")
+    limiters = read_limiters(settings.temp_dir / "metrics.json")
+    print(f"Limiters: {format_limiters(limiters)}")
+
+
+def _stats(args: argparse.Namespace) -> None:
+    settings = load_settings(args.config, args.set)
+    path = settings.temp_dir / "metrics.json"
+    if not path.exists():
+        raise SystemExit(f"No metrics snapshot at {path} (is metrics_snapshot_interval 0?)")
+    snapshot = json.loads(path.read_text(encoding="utf-8"))
+    for name, value in sorted(snapshot["metrics"].items()):
+        if isinstance(value, dict):
+            for labels, series in sorted(value.items()):
+                print(f"{name}{{{labels}}} {json.dumps(series)}")
+        else:
+            print(f"{name} {json.dumps(value)}")
+
+
+def _config_show(args: argparse.Namespace) -> None:
+    print(load_settings(args.config, args.set).to_toml(), end="")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="forum_backup_crawler", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug messages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def with_settings(command: argparse.ArgumentParser, required: bool = True) -> None:
+        command.add_argument(
+            "config", type=Path, nargs=None if required else "?", help="TOML settings file"
+        )
+        command.add_argument(
+            "--set", action="append", default=[], metavar="NAME=VALUE",
+            help="Override a setting (repeatable)",
+        )
+
+    crawl = commands.add_parser("crawl", help="Crawl (or resume crawling) the forum")
+    with_settings(crawl)
+    crawl.add_argument("--processes", type=int, help="Crawl processes, each owning a shard of the URLs")
+    crawl.add_argument("--coordinator-port", type=int, help="Serve the URL queue to remote workers")
+    crawl.add_argument("--coordinator-url", help="Crawl as a worker of this coordinator")
+    crawl.set_defaults(handler=_crawl)
+
+    export = commands.add_parser("export", help="Export a WARC crawl to the mirror layout")
+    with_settings(export)
+    export.add_argument("--workers", type=int, help="Export processes (default: one per CPU)")
+    export.set_defaults(handler=_export)
+
+    view = commands.add_parser("view", help="Browse the mirror over local HTTP")
+    view.add_argument("output_dir", type=Path)
+    view.add_argument("--host", default="127.0.0.1")
+    view.add_argument("--port", type=int, default=8800)
+    view.set_defaults(handler=_view)
+
+    status = commands.add_parser("status", help="Show the progress of a crawl, running or not")
+    with_settings(status)
+    status.add_argument(
+        "--sample", type=float, default=2.0, help="Seconds to measure pages/s over (0 = skip)"
+    )
+    status.set_defaults(handler=_status)
+
+    stats = commands.add_parser("stats", help="Print the crawl's last metrics snapshot")
+    with_settings(stats)
+    stats.set_defaults(handler=_stats)
+
+    config = commands.add_parser("config", help="Inspect settings")
+    config_commands = config.add_subparsers(dest="config_command", required=True)
+    show = config_commands.add_parser("show", help="Print the effective settings as TOML")
+    with_settings(show, required=False)
+    show.set_defaults(handler=_config_show)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s: %(message)s",
+    )
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
 # config.py
 
+import hashlib
 import tomllib
-import tomli_w
 from pathlib import Path
-from typing import List, Literal, Optional
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
 from contextlib import asynccontextmanager
 
-import aiohttp
 from pydantic import BaseSettings, Field
 
+if TYPE_CHECKING:
+    # network.auth imports this module, so network is imported lazily
+    from forum_backup_crawler.network.http_client import PoolConfig
+    from forum_backup_crawler.storage.canonical import CanonicalRules, TrapDetector
+    from forum_backup_crawler.storage.disk_writer import DiskWriter
+    from forum_backup_crawler.storage.page_store import PageStore
+    from forum_backup_crawler.storage.path_mapper import PathMapper
+    from forum_backup_crawler.storage.scheduling import SchedulingPolicy
+    from forum_backup_crawler.storage.state_db import StateDB
+    from forum_backup_crawler.storage.warc import WarcStore
+
 
 class Settings(BaseSettings):
     """
@@ -30,10 +40,160 @@ class Settings(BaseSettings):
         None,
         description="Workspace for DB, logs, cookies; defaults to output_dir/'temp'",
     )
-    concurrency: int = Field(8, description="Number of async workers")
+    concurrency: int = Field(8, description="Number of async fetch workers")
+    processes: int = Field(
+        1, description="Crawl processes, each owning a hash shard of the URLs (1 = one process)"
+    )
+    parse_workers: Optional[int] = Field(
+        None,
+        description="HTML parse processes; None = one per CPU core, 0 = use a thread",
+    )
+    rewriter_engine: Literal["soup", "stream"] = Field(
+        "soup", description="HTML rewriter: full BeautifulSoup tree or single-pass tokenizer"
+    )
+    pipeline_queue_size: int = Field(
+        64, description="Capacity of the fetch→parse and parse→persist queues"
+    )
+    pipeline_report_interval: float = Field(
+        30.0, description="Seconds between per-stage throughput log lines (0 = off)"
+    )
+    metrics_port: Optional[int] = Field(
+        None, description="Serve Prometheus metrics on this local port at /metrics (None = off)"
+    )
+    metrics_host: str = Field("127.0.0.1", description="Interface the metrics endpoint binds to")
+    metrics_snapshot_interval: float = Field(
+        30.0, description="Seconds between metric snapshots to temp_dir/metrics.json (0 = off)"
+    )
+    profile: bool = Field(
+        False, description="Sample stacks and time hot paths; writes to temp_dir/profiles"
+    )
+    profile_interval: float = Field(
+        300.0, description="Seconds between profile dumps (0 = only at the end)"
+    )
+    profile_sample_interval: float = Field(
+        0.01, description="Seconds between profiler stack samples"
+    )
     depth_limit: int = Field(4, description="Max link-following depth")
+    incremental: bool = Field(
+        False,
+        description="Re-check a finished crawl with conditional GETs, topic lists first",
+    )
     rate_limiter: Literal["adaptive", "fixed", "token_bucket"] = Field(
-        "adaptive", description="Throttle strategy"
+        "adaptive", description="Throttle strategy (applied to each host separately)"
+    )
+    adaptive_latency_factor: Optional[float] = Field(
+        None,
+        description="adaptive: back off when p95 latency exceeds this multiple of its baseline",
+    )
+    rate_limit_rate: float = Field(
+        2.0, description="token_bucket: sustained requests per second per host"
+    )
+    rate_limit_burst: int = Field(
+        4, description="token_bucket: requests a host may get back-to-back after idling"
+    )
+    frontier_block_size: int = Field(
+        256, description="Pending URLs claimed from the DB per round-trip"
+    )
+    frontier_flush_interval: float = Field(
+        1.0, description="Seconds between batched write-backs to the DB"
+    )
+    checkpoint_interval: float = Field(
+        60.0, description="Seconds between crawl checkpoints in temp_dir (0 = only at the end)"
+    )
+    scheduling: Literal["forum", "depth"] = Field(
+        "forum",
+        description="Pop order: forum indexes, topics, ... search last; or plain depth order",
+    )
+    class_quotas: Dict[str, float] = Field(
+        {"index": 0.5, "profile": 0.1, "search": 0.05},
+        description="forum: max share of each claimed block per URL class while others wait",
+    )
+    host_round_robin: bool = Field(
+        True, description="Split each claimed block evenly between hosts with pending URLs"
+    )
+    coordinator_port: Optional[int] = Field(
+        None, description="Serve the URL queue to remote workers on this port instead of crawling"
+    )
+    coordinator_host: str = Field(
+        "127.0.0.1", description="Interface the coordinator binds to (it has no authentication)"
+    )
+    coordinator_url: Optional[str] = Field(
+        None, description="Crawl as a worker of the coordinator at this URL (e.g. http://host:8700)"
+    )
+    lease_size: int = Field(64, description="URLs a worker leases from the coordinator at a time")
+    lease_ttl: float = Field(
+        60.0, description="Seconds before an unrenewed lease is lost and its URLs reassigned"
+    )
+    seen_filter: bool = Field(
+        True, description="Drop already-known links in memory before they reach the DB"
+    )
+    seen_filter_capacity: int = Field(
+        5_000_000, description="Expected number of distinct URLs in the seen filter"
+    )
+    seen_filter_fp_rate: float = Field(
+        1e-5, description="Seen-filter false-positive rate (chance of skipping a new URL)"
+    )
+    canonicalize_urls: bool = Field(
+        True, description="Fold URL variants of a page (see strip_params) into one URL"
+    )
+    strip_params: List[str] = Field(
+        [
+            "highlight", "sid", "phpsessid", "sessionid", "jsessionid",
+            "utm_source", "utm_medium", "utm_campaign", "fbclid",
+        ],
+        description="Query parameters removed from every link (case-insensitive)",
+    )
+    strip_default_params: Dict[str, str] = Field(
+        {"start": "0"}, description="Query parameters removed when they have this (default) value"
+    )
+    sort_query_params: bool = Field(True, description="Sort the query parameters of links by name")
+    trap_detection: bool = Field(
+        True, description="Drop links that look like crawler traps before they are queued"
+    )
+    trap_max_url_length: Optional[int] = Field(2000, description="Traps: longest URL followed")
+    trap_max_path_depth: Optional[int] = Field(16, description="Traps: most path segments")
+    trap_max_segment_repeat: Optional[int] = Field(
+        3, description="Traps: most times one path segment may repeat (/a/b/a/b/...)"
+    )
+    trap_max_query_params: Optional[int] = Field(10, description="Traps: most query parameters")
+    trap_max_page_offset: Optional[int] = Field(
+        100_000, description="Traps: highest start/page/offset parameter value"
+    )
+    trap_calendar_years: Optional[int] = Field(
+        30, description="Traps: years back a y/year/date parameter may go (forward: next year)"
+    )
+    page_layout: Literal["files", "segments"] = Field(
+        "files", description="Pages as one file each, or packed into segment files under _pages/"
+    )
+    page_codec: Literal["none", "gzip", "zstd"] = Field(
+        "none", description="Compress stored pages (zstd needs the zstandard package)"
+    )
+    page_compression_level: Optional[int] = Field(
+        None, description="Codec compression level (None = the codec's default)"
+    )
+    zstd_dict_samples: int = Field(
+        0, description="zstd: train a shared dictionary on this many first pages (0 = none)"
+    )
+    page_segment_mb: int = Field(256, description="segments: size at which a new segment starts")
+    disk_writer_threads: int = Field(4, description="Threads writing pages to the mirror")
+    disk_writer_queue: int = Field(
+        16, description="Page batches queued for the disk writer before the crawl waits"
+    )
+    fsync_interval: float = Field(
+        0.0, description="Seconds between grouped fsyncs of the pages written (0 = leave it to the OS)"
+    )
+    output_format: Literal["mirror", "warc"] = Field(
+        "mirror",
+        description="Write the browsable mirror, or append responses to WARC files under warc/ "
+                    "(export a mirror later with core.export)",
+    )
+    warc_segment_mb: int = Field(1024, description="warc: size at which a new WARC file starts")
+    shard_levels: int = Field(
+        0, description="Levels of hashed subdirectories mirror files are spread over (0 = none)"
+    )
+    shard_fanout: int = Field(256, description="Hashed subdirectories per level")
+    path_cache_size: int = Field(
+        65536, description="URL → path and relative-link mappings memoized per process"
     )
     cookies_file: Optional[Path] = Field(
         None, description="Path to JSON file with browser cookies"
@@ -41,6 +201,15 @@ class Settings(BaseSettings):
     user_agent: str = Field(
         "ForumBackupCrawler/1.0", description="User-Agent header for HTTP requests"
     )
+    http_keepalive: float = Field(
+        30.0, description="Seconds an idle connection is kept open for reuse"
+    )
+    dns_cache_ttl: Optional[int] = Field(
+        300, description="Seconds a resolved host name is cached (None = for the whole run)"
+    )
+    http_compression: bool = Field(
+        True, description="Ask servers for gzip/deflate (and brotli, if installed) bodies"
+    )
 
     # Pydantic‐v2 config for env vars
     model_config = {
@@ -50,15 +219,17 @@ class Settings(BaseSettings):
     }
 
     @classmethod
-    def from_file(cls, path: Optional[Path] = None) -> "Settings":
+    def from_file(cls, path: Optional[Path] = None, overrides: Optional[dict] = None) -> "Settings":
         """
         Load settings from a TOML file (if path given), then override
-        with any environment variables. Finally, ensure temp_dir is set.
+        with any environment variables and then `overrides` (e.g. from
+        the command line). Finally, ensure temp_dir is set.
         """
         data: dict = {}
         if path:
             toml_text = Path(path).read_text(encoding="utf-8")
             data = tomllib.loads(toml_text)
+        data.update(overrides or {})
 
         settings = cls(**data)
 
@@ -76,24 +247,145 @@ class Settings(BaseSettings):
         # Ensure temp_dir exists
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
-        # Dump all fields to TOML
-        toml_str = tomli_w.dumps(self.model_dump())
-
         config_path = self.temp_dir / "config.toml"
-        config_path.write_text(toml_str, encoding="utf-8")
+        config_path.write_text(self.to_toml(), encoding="utf-8")
+
+    def to_toml(self) -> str:
+        """
+        All fields as TOML that from_file() reads back. Unset optional
+        values are left out (TOML has no null), paths become strings.
+        """
+        import tomli_w
+
+        data = self.model_dump() if hasattr(self, "model_dump") else self.dict()
+        return tomli_w.dumps({
+            name: str(value) if isinstance(value, Path) else value
+            for name, value in data.items() if value is not None
+        })
+
+    def pool_config(self) -> "PoolConfig":
+        """
+        Connection-pool settings for HTTPClient: as many connections per
+        host as the rate limiters allow concurrent requests.
+        """
+        from forum_backup_crawler.network.http_client import PoolConfig
+
+        return PoolConfig(
+            limit=self.concurrency,
+            limit_per_host=self.concurrency,
+            keepalive=self.http_keepalive,
+            dns_ttl=self.dns_cache_ttl,
+            compression=self.http_compression,
+        )
+
+    def scheduling_policy(self) -> "SchedulingPolicy":
+        """The StateDB claim order chosen by the scheduling settings."""
+        from forum_backup_crawler.storage.scheduling import get_policy
+
+        return get_policy(self.scheduling, self.class_quotas, self.host_round_robin)
+
+    def canonical_rules(self) -> Optional["CanonicalRules"]:
+        """How links are canonicalized, or None if canonicalize_urls is off."""
+        if not self.canonicalize_urls:
+            return None
+        from forum_backup_crawler.storage.canonical import CanonicalRules
+
+        return CanonicalRules.build(
+            self.strip_params, self.strip_default_params.items(), self.sort_query_params
+        )
+
+    def path_mapper(self) -> "PathMapper":
+        """The URL → mirror path mapping, scoped to the start URLs' hosts."""
+        from forum_backup_crawler.storage.path_mapper import PathMapper
+        from forum_backup_crawler.storage.state_db import url_host
+
+        return PathMapper(
+            self.output_dir,
+            hosts=filter(None, map(url_host, self.start_urls)),
+            canonical=self.canonical_rules(),
+            shard_levels=self.shard_levels,
+            shard_fanout=self.shard_fanout,
+            cache_size=self.path_cache_size,
+        )
+
+    def seed_urls(self) -> List[str]:
+        """The start URLs as they are queued: canonical, like every link."""
+        rules = self.canonical_rules()
+        if rules is None:
+            return list(self.start_urls)
+        from forum_backup_crawler.storage.canonical import canonicalize
+
+        return [canonicalize(url, rules) for url in self.start_urls]
+
+    def trap_detector(self) -> Optional["TrapDetector"]:
+        """The crawler-trap filter for links, or None if trap_detection is off."""
+        if not self.trap_detection:
+            return None
+        from forum_backup_crawler.storage.canonical import TrapDetector
+
+        return TrapDetector(
+            max_url_length=self.trap_max_url_length,
+            max_path_depth=self.trap_max_path_depth,
+            max_segment_repeat=self.trap_max_segment_repeat,
+            max_query_params=self.trap_max_query_params,
+            max_page_offset=self.trap_max_page_offset,
+            calendar_years=self.trap_calendar_years,
+        )
+
+    def writer_name(self) -> str:
+        """
+        Name of this process's own segment and WARC files: each temp_dir
+        (one per process) writes its own.
+        """
+        temp_dir = Path(self.temp_dir).resolve()
+        digest = hashlib.sha1(str(temp_dir).encode("utf-8")).hexdigest()[:8]
+        return f"{temp_dir.name}-{digest}"
+
+    def disk_writer(self) -> "DiskWriter":
+        """The thread pool that writes pages to the mirror."""
+        from forum_backup_crawler.storage.disk_writer import DiskWriter
+
+        return DiskWriter(self.disk_writer_threads, self.disk_writer_queue, self.fsync_interval)
+
+    def page_store(self, disk: Optional["DiskWriter"] = None) -> "PageStore":
+        """The store for rewritten pages, writing files through `disk` if given."""
+        from forum_backup_crawler.storage.page_store import open_page_store
+
+        return open_page_store(
+            self.output_dir,
+            self.page_layout,
+            self.page_codec,
+            writer=self.writer_name(),
+            level=self.page_compression_level,
+            dict_samples=self.zstd_dict_samples,
+            segment_size=self.page_segment_mb * 1024 * 1024,
+            disk=disk,
+        )
+
+    def warc_store(self, db: "StateDB") -> Optional["WarcStore"]:
+        """The WARC backend, indexed in `db` (None unless output_format is "warc")."""
+        if self.output_format != "warc":
+            return None
+        from forum_backup_crawler.storage.warc import WARC_DIR, WarcStore
+
+        return WarcStore(
+            db, self.output_dir / WARC_DIR, self.writer_name(),
+            segment_size=self.warc_segment_mb * 1024 * 1024,
+        )
 
     @asynccontextmanager
     async def http_session(self, **kwargs):
         """
         Async context manager yielding an aiohttp.ClientSession
-        with proper headers and cookies.
+        with proper headers and cookies, pooled like HTTPClient's.
 
         Usage:
             async with settings.http_session(cookies=my_cookies) as session:
                 ...
         """
-        headers = {"User-Agent": self.user_agent}
+        from forum_backup_crawler.network.http_client import create_session
+
         cookies = kwargs.get("cookies", None)
 
-        async with aiohttp.ClientSession(headers=headers, cookies=cookies) as session:
+        async with create_session(self.user_agent, cookies, self.pool_config()) as session:
             yield session
@@ -0,0 +1,184 @@
+# core/checkpoint.py
+
+"""
+Periodic crawl checkpoints, so a restart picks up where the crawl was.
+
+Every `checkpoint_interval` seconds the Checkpointer flushes the
+frontier, writes the seen filter next to the DB (state.seen) and writes
+checkpoint.json to temp_dir with what only lives in memory: the host
+round-robin cursor and what each host's rate limiter has learned.
+
+On startup, load_checkpoint() reads it back and restore() applies it;
+the seen filter then loads from its file and only catches up on the
+rows added since, instead of being rebuilt from the whole urls table.
+verify_checkpoint() runs in the background afterwards: it samples rows
+of the DB and drops the seen filter (falling back to the DB's own
+uniqueness checks) if any of them is missing from it.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import aclosing
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from forum_backup_crawler.network.rate_limit import HostLimiterRegistry
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.state_db import StateDB
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+@dataclass
+class Checkpoint:
+    """What checkpoint.json holds."""
+    written: float = 0.0                 # time.time() of the save
+    max_url_id: int = 0                  # highest urls.id at the save
+    host_cursor: int = 0                 # StateDB.host_cursor
+    limiters: Dict[str, dict] = field(default_factory=dict)  # HostLimiterRegistry.state()
+
+
+def load_checkpoint(temp_dir: Path) -> Optional[Checkpoint]:
+    """Read temp_dir's checkpoint, or None if there is none (or it is unreadable)."""
+    path = temp_dir / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    try:
+        return Checkpoint(**json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Ignoring checkpoint {path}: {e}")
+        return None
+
+
+async def restore(checkpoint: Checkpoint, db: StateDB, limiters: HostLimiterRegistry) -> None:
+    """Put a loaded checkpoint's cursor and limiter state back."""
+    db.host_cursor = checkpoint.host_cursor
+    await limiters.restore(checkpoint.limiters)
+    logger.info(
+        f"Resumed from the checkpoint of {time.ctime(checkpoint.written)}: "
+        f"{len(checkpoint.limiters)} host limiters, URL ids up to {checkpoint.max_url_id}"
+    )
+
+
+class Checkpointer:
+    """Saves a checkpoint every `interval` seconds, and once more on close()."""
+
+    def __init__(
+        self,
+        temp_dir: Path,
+        db: StateDB,
+        frontier: Frontier,
+        limiters: HostLimiterRegistry,
+        seen_path: Optional[Path] = None,
+        interval: float = 60.0,
+    ) -> None:
+        """
+        :param temp_dir: Where checkpoint.json is written
+        :param db: The crawl's StateDB
+        :param frontier: Flushed before each save
+        :param limiters: Whose state() is saved
+        :param seen_path: Where the frontier's seen filter is saved (None = not saved)
+        :param interval: Seconds between saves (0 = only on close)
+        """
+        self.path = temp_dir / CHECKPOINT_FILE
+        self._db = db
+        self._frontier = frontier
+        self._limiters = limiters
+        self._seen_path = seen_path
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.saves = 0
+
+    async def start(self) -> None:
+        if self._interval > 0:
+            self._task = asyncio.create_task(self._loop(), name="checkpoint")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.warning(f"Checkpoint failed: {e}")
+
+    async def save(self) -> Checkpoint:
+        """Flush the frontier and write the seen filter and checkpoint.json."""
+        if self._seen_path is not None and isinstance(self._frontier, Frontier):
+            await self._frontier.save_seen(self._seen_path)
+        else:
+            await self._frontier.flush()
+        checkpoint = Checkpoint(
+            written=time.time(),
+            max_url_id=await self._db.max_url_id(),
+            host_cursor=self._db.host_cursor,
+            limiters=self._limiters.state(),
+        )
+        await asyncio.to_thread(_write_json, self.path, asdict(checkpoint))
+        self.saves += 1
+        return checkpoint
+
+    async def close(self) -> None:
+        """Stop the periodic saves and write a last checkpoint."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+
+async def verify_checkpoint(
+    db: StateDB,
+    frontier: Frontier,
+    seen_path: Optional[Path] = None,
+    samples: int = 64,
+    window: int = 16,
+) -> bool:
+    """
+    Check that the frontier's seen filter knows `samples` random windows
+    of `window` URLs from the DB; if any is missing, drop the filter and
+    delete `seen_path` so the next start rebuilds it. Returns whether it
+    was consistent. Meant to run as a background task.
+    """
+    seen = frontier.seen_filter
+    if seen is None:
+        return True
+    # Rows past last_id may be committed but not yet added by the frontier
+    max_id = seen.last_id
+    checked = 0
+    for _ in range(samples if max_id else 0):
+        start = random.randint(0, max(max_id - window, 0))
+        async with aclosing(db.iter_urls(after_id=start, chunk_size=window)) as rows:
+            async for url_id, url in rows:
+                if url_id > max_id:
+                    break
+                if url not in seen:
+                    logger.warning(
+                        f"Seen filter is missing {url} (id {url_id}), "
+                        "dropping it for the rest of the crawl"
+                    )
+                    frontier.drop_seen_filter()
+                    if seen_path is not None:
+                        seen_path.unlink(missing_ok=True)
+                    return False
+                checked += 1
+                if url_id >= start + window:
+                    break
+    logger.debug(f"Checkpoint verified: {checked} URLs found in the seen filter")
+    return True
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
@@ -0,0 +1,530 @@
+# core/coordinator.py
+
+"""
+Distributed crawl: one coordinator owns the URL queue in its state DB and
+serves it over HTTP; workers on any number of machines run the normal
+pipeline (run() with settings.coordinator_url set) and lease batches of
+URLs from it instead of claiming them from a local DB.
+
+Protocol, JSON bodies POSTed to the coordinator; every request carries
+the caller's "worker" id:
+
+    /lease   {"max": n}
+             -> {"lease": id, "urls": [[url, depth], ...], "ttl": seconds}
+              | {"retry_after": seconds}   nothing pending, leases still out
+              | {"finished": true}         nothing pending and nothing leased
+    /renew   {"leases": [id, ...]}         -> {"lost": [id, ...]}
+    /report  {"seeds": [[url, depth]], "done": [[url, local_path]],
+              "errors": [[url, error_text]], "requeue": [[url, priority]]}
+             -> {"ok": true}
+    GET /status                            -> counters
+
+A lease not renewed for `ttl` seconds is lost: its unreported URLs go
+back to pending for other workers. A report is applied in one
+StateDB.apply_batch transaction, and workers report a page's links with
+(or before) the page itself, so links are never lost while a page is done.
+
+Validators, assets and redirects stay in each worker's local state DB.
+There is no authentication: serve on localhost or a trusted network.
+"""
+
+from __future__ import annotations
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.incremental import prepare_recrawl
+from forum_backup_crawler.storage.seen_filter import SeenFilter
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.utils.timeit import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker waits before asking again while other workers hold leases
+RETRY_AFTER = 0.5
+# Longest wait between attempts to reach an unreachable coordinator
+MAX_RETRY_DELAY = 30.0
+
+LEASED = REGISTRY.counter("fbc_coordinator_leased_total", "URLs handed out in leases")
+EXPIRED = REGISTRY.counter("fbc_coordinator_expired_total", "Leased URLs put back after a lost lease")
+
+
+@dataclass
+class Lease:
+    """URLs handed to one worker and not yet reported back."""
+    worker: str
+    urls: Set[str]
+    expires: float
+
+
+@dataclass
+class CoordinatorStats:
+    leases: int = 0
+    leased: int = 0
+    reports: int = 0
+    expired: int = 0
+    workers: Set[str] = field(default_factory=set)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "leases": self.leases,
+            "leased": self.leased,
+            "reports": self.reports,
+            "expired": self.expired,
+            "workers": len(self.workers),
+        }
+
+
+class Coordinator:
+    """
+    Serves the pending URLs of `db` to workers in leased batches (see the
+    module docstring for the protocol). start() begins serving;
+    wait_finished() returns once the queue is drained, nothing is leased
+    and every live worker has been told so.
+    """
+
+    def __init__(
+        self,
+        db: StateDB,
+        lease_ttl: float = 60.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        clock=time.monotonic,
+    ) -> None:
+        """
+        :param db: The StateDB whose queue is served
+        :param lease_ttl: Seconds a lease lives without being renewed
+        :param host: Interface to bind
+        :param port: Port to bind (0 = any free port; see .url)
+        :param clock: Monotonic time source, replaceable in tests
+        """
+        self._db = db
+        self._ttl = lease_ttl
+        self._host = host
+        self._port = port
+        self._clock = clock
+        self._leases: Dict[str, Lease] = {}
+        self._lease_of: Dict[str, str] = {}      # url -> lease id
+        self._last_seen: Dict[str, float] = {}   # worker -> last request
+        self._told: Set[str] = set()             # workers told the crawl is over
+        self._ids = itertools.count(1)
+        self._finished = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+        self._expiry_task: Optional[asyncio.Task] = None
+        self.stats = CoordinatorStats()
+        self.url: Optional[str] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/lease", self._handle_lease)
+        app.router.add_post("/renew", self._handle_renew)
+        app.router.add_post("/report", self._handle_report)
+        app.router.add_get("/status", self._handle_status)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.url = f"http://{self._host}:{port}"
+        self._expiry_task = asyncio.create_task(self._expiry_loop(), name="coordinator-expiry")
+        logger.info(f"Coordinator serving the URL queue at {self.url}")
+
+    async def close(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            self._expiry_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def wait_finished(self) -> None:
+        """Wait until the crawl is over and every live worker knows it."""
+        await self._finished.wait()
+        while True:
+            now = self._clock()
+            waiting = [
+                worker for worker, seen in self._last_seen.items()
+                if worker not in self._told and now - seen < self._ttl
+            ]
+            if not waiting:
+                return
+            await asyncio.sleep(RETRY_AFTER / 2)
+
+    async def expire_leases(self) -> int:
+        """Put the URLs of leases past their expiry back to pending; return how many."""
+        now = self._clock()
+        urls: List[str] = []
+        for lease_id, lease in list(self._leases.items()):
+            if lease.expires <= now:
+                del self._leases[lease_id]
+                for url in lease.urls:
+                    del self._lease_of[url]
+                urls.extend(lease.urls)
+                logger.warning(
+                    f"Lease {lease_id} of worker {lease.worker} expired; "
+                    f"{len(lease.urls)} URLs are pending again"
+                )
+        if urls:
+            await self._db.release_claimed(urls)
+            self.stats.expired += len(urls)
+            EXPIRED.inc(len(urls))
+        return len(urls)
+
+    async def _handle_lease(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        worker = self._touch(body)
+        claimed = await self._db.claim_pending(int(body.get("max", 64)))
+        if claimed:
+            lease_id = str(next(self._ids))
+            lease = Lease(worker, {url for url, _, _ in claimed}, self._clock() + self._ttl)
+            self._leases[lease_id] = lease
+            for url in lease.urls:
+                self._lease_of[url] = lease_id
+            self.stats.leases += 1
+            self.stats.leased += len(claimed)
+            LEASED.inc(len(claimed))
+            return web.json_response({
+                "lease": lease_id,
+                "urls": [[url, depth] for url, depth, _ in claimed],
+                "ttl": self._ttl,
+            })
+        if self._leases:
+            # Leased URLs may still lead to new ones
+            return web.json_response({"retry_after": RETRY_AFTER})
+        self._finished.set()
+        self._told.add(worker)
+        return web.json_response({"finished": True})
+
+    async def _handle_renew(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        worker = self._touch(body)
+        expires = self._clock() + self._ttl
+        lost = []
+        for lease_id in body.get("leases", []):
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.worker != worker:
+                lost.append(lease_id)
+            else:
+                lease.expires = expires
+        return web.json_response({"lost": lost})
+
+    async def _handle_report(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self._touch(body)
+        done = [(url, path) for url, path in body.get("done", [])]
+        errors = [(url, text) for url, text in body.get("errors", [])]
+        await self._db.apply_batch(
+            seeds=[(url, depth) for url, depth in body.get("seeds", [])],
+            done=done,
+            errors=errors,
+            requeue=[(url, priority) for url, priority in body.get("requeue", [])],
+        )
+        # Settled only once committed, so the crawl can't look finished before
+        for url, _ in itertools.chain(done, errors):
+            lease_id = self._lease_of.pop(url, None)
+            if lease_id is not None:
+                lease = self._leases[lease_id]
+                lease.urls.discard(url)
+                if not lease.urls:
+                    del self._leases[lease_id]
+        self.stats.reports += 1
+        return web.json_response({"ok": True})
+
+    async def _handle_status(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            **self.stats.snapshot(),
+            "active_leases": len(self._leases),
+            "leased_now": len(self._lease_of),
+            "pending": await self._db.pending_count(),
+            "finished": self._finished.is_set(),
+        })
+
+    def _touch(self, body: dict) -> str:
+        worker = str(body["worker"])
+        self._last_seen[worker] = self._clock()
+        self.stats.workers.add(worker)
+        return worker
+
+    async def _expiry_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._ttl / 4)
+            try:
+                await self.expire_leases()
+            except Exception:
+                logger.exception("Lease expiry failed")
+
+
+class RemoteFrontier:
+    """
+    The Frontier interface over a coordinator: pending URLs are leased in
+    blocks, and completions and discovered links are buffered and reported
+    in bulk (every flush_interval, or once max_buffered changes are
+    waiting). Leases are renewed in the background until their URLs have
+    been reported.
+    """
+
+    def __init__(
+        self,
+        coordinator_url: str,
+        worker: Optional[str] = None,
+        block_size: int = 64,
+        flush_interval: float = 1.0,
+        max_buffered: int = 1000,
+        seen: Optional[SeenFilter] = None,
+    ) -> None:
+        """
+        :param coordinator_url: Base URL of the coordinator (Coordinator.url)
+        :param worker: This worker's id; defaults to hostname-pid
+        :param block_size: Number of URLs to lease per request
+        :param flush_interval: Seconds between background reports
+        :param max_buffered: Report immediately once this many changes are buffered
+        :param seen: Optional filter of URLs already reported as seeds
+        """
+        self._url = coordinator_url.rstrip("/")
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+        self._block_size = block_size
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+        self._seen = seen
+
+        self._queue: Deque[Tuple[str, int]] = deque()
+        self._seeds: List[Tuple[str, int]] = []
+        self._done: List[Tuple[str, str]] = []
+        self._errors: List[Tuple[str, str]] = []
+        self._requeue: List[Tuple[str, int]] = []
+        self._leases: Dict[str, Set[str]] = {}   # lease id -> URLs not yet reported
+        self._lease_of: Dict[str, str] = {}
+        self._ttl = 60.0
+
+        self._in_flight = 0
+        self._version = 0
+        self._refill_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._changed = asyncio.Condition()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def in_flight(self) -> int:
+        """Number of URLs handed out but not yet marked done or errored."""
+        return self._in_flight
+
+    @property
+    def buffered(self) -> int:
+        """Number of changes waiting to be reported."""
+        return len(self._seeds) + len(self._done) + len(self._errors) + len(self._requeue)
+
+    async def start(self) -> None:
+        """Open the connection to the coordinator; start background reports and renewals."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+            self._tasks = [
+                asyncio.create_task(self._flush_loop(), name="remote-frontier-flush"),
+                asyncio.create_task(self._renew_loop(), name="remote-frontier-renew"),
+            ]
+
+    async def close(self) -> None:
+        """Stop the background tasks, report everything buffered and disconnect."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._session is not None:
+            await self.flush()
+            await self._session.close()
+            self._session = None
+
+    async def pop_pending(self) -> Optional[Tuple[str, int]]:
+        """
+        Return the next (url, depth) to crawl, or None once the crawl is over
+        everywhere. While other workers hold leases, this keeps asking the
+        coordinator, since their pages may link to new URLs.
+        """
+        while True:
+            if self._queue:
+                self._in_flight += 1
+                return self._queue.popleft()
+
+            version = self._version
+            async with self._refill_lock:
+                if self._queue:
+                    continue
+                await self.flush()
+                reply = await self._call("lease", {"max": self._block_size})
+                if reply.get("urls"):
+                    self._add_lease(reply)
+                    continue
+                finished = reply.get("finished", False)
+                retry_after = reply.get("retry_after")
+
+            async with self._changed:
+                if self._version != version or self.buffered or self._queue:
+                    continue
+                if finished and self._in_flight == 0:
+                    return None
+                # Wait for a page of ours to finish, or until it's time to ask again
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=retry_after)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def mark_done(self, url: str, local_path: str) -> None:
+        """Buffer a 'done' report for a URL handed out by pop_pending."""
+        self._done.append((url, local_path))
+        await self._finish_one()
+
+    async def record_error(self, url: str, error_text: str) -> None:
+        """Buffer an 'error' report for a URL handed out by pop_pending."""
+        self._errors.append((url, error_text))
+        await self._finish_one()
+
+    async def add_seed_urls(self, urls: Iterable[str], depth: int = 0) -> None:
+        """Buffer newly discovered URLs for the coordinator."""
+        if self._seen is not None:
+            urls = self._seen.filter_new(urls)
+        self._seeds.extend((url, depth) for url in urls)
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+
+    async def requeue(self, urls: Iterable[str], priority: int = 0) -> None:
+        """Buffer done URLs to be crawled again (see StateDB.requeue_done)."""
+        self._requeue.extend((url, priority) for url in urls)
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Report all buffered changes to the coordinator in one request."""
+        async with self._flush_lock:
+            if not self.buffered:
+                return
+            seeds, self._seeds = self._seeds, []
+            done, self._done = self._done, []
+            errors, self._errors = self._errors, []
+            requeue, self._requeue = self._requeue, []
+            try:
+                await self._call("report", {
+                    "seeds": seeds, "done": done, "errors": errors, "requeue": requeue,
+                })
+            except BaseException:
+                # Cancelled, or an error _call does not retry: keep the batch for
+                # the next flush (a report the coordinator did apply is harmless to repeat)
+                self._seeds[:0] = seeds
+                self._done[:0] = done
+                self._errors[:0] = errors
+                self._requeue[:0] = requeue
+                raise
+            if self._seen is not None:
+                self._seen.update(url for url, _ in seeds)
+            for url, _ in itertools.chain(done, errors):
+                self._settle(url)
+            logger.debug(
+                f"Reported {len(seeds)} seeds, {len(done)} done, "
+                f"{len(errors)} errors, {len(requeue)} requeued"
+            )
+
+    def _add_lease(self, reply: dict) -> None:
+        lease_id = reply["lease"]
+        self._ttl = reply["ttl"]
+        urls = [(url, depth) for url, depth in reply["urls"]]
+        self._leases[lease_id] = {url for url, _ in urls}
+        for url, _ in urls:
+            self._lease_of[url] = lease_id
+        self._queue.extend(urls)
+
+    def _settle(self, url: str) -> None:
+        lease_id = self._lease_of.pop(url, None)
+        if lease_id is not None and lease_id in self._leases:
+            urls = self._leases[lease_id]
+            urls.discard(url)
+            if not urls:
+                del self._leases[lease_id]
+
+    async def _finish_one(self) -> None:
+        self._in_flight -= 1
+        self._version += 1
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _call(self, endpoint: str, body: dict) -> dict:
+        """POST to the coordinator, retrying with backoff until it answers."""
+        assert self._session is not None
+        delay = RETRY_AFTER
+        while True:
+            try:
+                async with self._session.post(
+                    f"{self._url}/{endpoint}", json={"worker": self.worker, **body}
+                ) as resp:
+                    resp.raise_for_status()
+                    return await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Coordinator /{endpoint} failed ({e!r}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Remote frontier background report failed")
+
+    async def _renew_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            if not self._leases:
+                continue
+            try:
+                reply = await self._call("renew", {"leases": list(self._leases)})
+            except Exception:
+                logger.exception("Lease renewal failed")
+                continue
+            for lease_id in reply["lost"]:
+                # Handed to another worker: finishing them here is harmless
+                logger.warning(f"Lost lease {lease_id}; its URLs may be crawled twice")
+                for url in self._leases.pop(lease_id, ()):
+                    self._lease_of.pop(url, None)
+
+
+async def run_coordinator(settings: Settings) -> Dict[str, Dict[str, float]]:
+    """
+    Seed the state DB in temp_dir as run() would, then serve its queue on
+    settings.coordinator_host:coordinator_port until workers have crawled
+    everything. Returns the coordinator's counters.
+    """
+    settings.temp_dir.mkdir(parents=True, exist_ok=True)
+    db = StateDB(settings.temp_dir / "state.db", settings.scheduling_policy())
+    await db.connect()
+    # Anything leased when a previous coordinator stopped is unowned now
+    await db.reset_in_progress()
+    start_urls = settings.seed_urls()
+    await db.add_seed_urls(start_urls)
+    if settings.incremental:
+        await prepare_recrawl(db, start_urls)
+
+    coordinator = Coordinator(
+        db,
+        lease_ttl=settings.lease_ttl,
+        host=settings.coordinator_host,
+        port=settings.coordinator_port or 0,
+    )
+    await coordinator.start()
+    try:
+        await coordinator.wait_finished()
+    finally:
+        await coordinator.close()
+        await db.close()
+    logger.info(f"Coordinator done: {coordinator.stats.snapshot()}")
+    return {"coordinator": coordinator.stats.snapshot()}
@@ -0,0 +1,132 @@
+# core/export.py
+
+"""
+Export a WARC crawl (output_format = "warc") to the mirror directory layout.
+
+Reads the archive index from the crawl's state.db and rebuilds the mirror
+the crawl would have written: pages are rewritten to link locally and
+stored per the page_layout / page_codec settings, assets are written at
+their mirror paths. Chunks of the index are exported by a pool of
+processes, each reading records from the WARC files through mmap.
+
+Usage (the same as the CLI's export command):
+    python -m forum_backup_crawler.core.export config.toml [--workers 4] [--set name=value ...]
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.processing.html_rewriter import rewrite_page
+from forum_backup_crawler.storage.page_store import open_page_store
+from forum_backup_crawler.storage.path_mapper import MapperRules
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.warc import WARC_DIR, WarcReader
+
+logger = logging.getLogger(__name__)
+
+
+async def export_archive(
+    settings: Settings, workers: Optional[int] = None, chunk_size: int = 2000
+) -> Tuple[int, int, int]:
+    """
+    Export the archived responses of a finished (or interrupted) crawl.
+
+    :param settings: The crawl's settings (output_dir, temp_dir, page storage)
+    :param workers: Export processes (None = one per CPU)
+    :param chunk_size: Index rows handed to a process at a time
+    :returns: (pages, assets, failed) counts
+    :raises FileNotFoundError: if the crawl's state.db does not exist
+    """
+    db_path = settings.temp_dir / "state.db"
+    if not db_path.exists():
+        raise FileNotFoundError(f"State DB not found: {db_path}")
+    rules = settings.path_mapper().rules
+
+    # Read-only, under the crawl's own policy: only the archive index is read
+    db = StateDB(db_path, settings.scheduling_policy())
+    await db.connect(read_only=True)
+    loop = asyncio.get_running_loop()
+    # Chunks handed to the pool at a time: enough to keep every process
+    # busy, without queueing up the whole index
+    max_jobs = 2 * (workers or os.cpu_count() or 1)
+    totals = [0, 0, 0]
+
+    def add(finished) -> None:
+        nonlocal totals
+        for job in finished:
+            totals = [a + b for a, b in zip(totals, job.result())]
+
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            jobs = set()
+            async for rows in db.iter_archived(chunk_size):
+                if len(jobs) >= max_jobs:
+                    finished, jobs = await asyncio.wait(jobs, return_when=asyncio.FIRST_COMPLETED)
+                    add(finished)
+                jobs.add(loop.run_in_executor(pool, _export_chunk, settings, rules, rows))
+            if jobs:
+                finished, _ = await asyncio.wait(jobs)
+                add(finished)
+    finally:
+        await db.close()
+    return tuple(totals)
+
+
+def _export_chunk(
+    settings: Settings, rules: MapperRules, rows: List[Tuple[str, str, bool, str, int, int]]
+) -> Tuple[int, int, int]:
+    """Export rows of StateDB.iter_archived; runs in a worker process."""
+    output_dir = settings.output_dir
+    reader = WarcReader(output_dir / WARC_DIR)
+    store = open_page_store(
+        output_dir,
+        settings.page_layout,
+        settings.page_codec,
+        writer=f"export-{os.getpid()}",
+        level=settings.page_compression_level,
+        dict_samples=settings.zstd_dict_samples,
+        segment_size=settings.page_segment_mb * 1024 * 1024,
+    )
+    pages = assets = failed = 0
+    try:
+        for url, local_path, is_asset, *location in rows:
+            try:
+                record = reader.read(location)
+                if not is_asset:
+                    final_url = record.headers.get("WARC-Target-URI", url)
+                    result = rewrite_page(
+                        record.body.decode("utf-8"), final_url, rules, settings.rewriter_engine
+                    )
+                    store.write(Path(local_path), result.html)
+                    pages += 1
+                else:
+                    target = output_dir / local_path
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    target.write_bytes(record.body)
+                    assets += 1
+            except Exception as e:
+                logger.error(f"Could not export {url}: {e}")
+                failed += 1
+        store.flush()
+    finally:
+        store.close()
+        reader.close()
+    return pages, assets, failed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the CLI's export command with `argv` (default: the command line)."""
+    from forum_backup_crawler.cli import main as cli_main
+
+    cli_main(["export", *(sys.argv[1:] if argv is None else argv)])
+
+
+if __name__ == "__main__":
+    main()
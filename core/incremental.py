@@ -0,0 +1,77 @@
+# core/incremental.py
+
+from __future__ import annotations
+import logging
+from dataclasses import dataclass
+from typing import Iterable
+
+from forum_backup_crawler.storage.scheduling import is_topic_list
+from forum_backup_crawler.storage.state_db import StateDB
+
+logger = logging.getLogger(__name__)
+
+# Pop priority of topic-list pages in an incremental run (lower pops first;
+# everything else is 0), so new topics and posts are found first
+LIST_PRIORITY = -1
+
+
+@dataclass
+class IncrementalStats:
+    """
+    Counters of an incremental re-crawl, compared with a full crawl of the
+    pages already known (those with recorded validators):
+      - known_pages / known_bytes: what a full re-crawl would download
+      - checked:        conditional requests sent for known pages
+      - not_modified:   answered 304
+      - unchanged:      answered 200 with the same content hash
+      - changed:        answered 200 with new content (rewritten and saved)
+      - downloaded_bytes: body bytes received for known pages
+    """
+    known_pages: int = 0
+    known_bytes: int = 0
+    checked: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    changed: int = 0
+    downloaded_bytes: int = 0
+
+    @property
+    def requests_saved(self) -> int:
+        return max(self.known_pages - self.checked, 0)
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(self.known_bytes - self.downloaded_bytes, 0)
+
+    def summary(self) -> str:
+        return (
+            f"Incremental: re-checked {self.checked} of {self.known_pages} known pages "
+            f"({self.not_modified} not modified, {self.unchanged} unchanged, "
+            f"{self.changed} changed); saved {self.requests_saved} requests and "
+            f"{self.bytes_saved} of {self.known_bytes} bytes vs. a full crawl"
+        )
+
+
+async def prepare_recrawl(db: StateDB, start_urls: Iterable[str]) -> IncrementalStats:
+    """
+    Set up an incremental run: put the start URLs and every known
+    topic-list page back in the queue at LIST_PRIORITY. Other pages are
+    only re-checked when a changed page links to them (see Pipeline).
+    """
+    totals = await db.validator_totals()
+    stats = IncrementalStats(known_pages=totals[0], known_bytes=totals[1])
+
+    await db.requeue_done(start_urls, LIST_PRIORITY)
+    batch = []
+    async for _, url in db.iter_urls():
+        if is_topic_list(url):
+            batch.append(url)
+        if len(batch) >= 10000:
+            await db.requeue_done(batch, LIST_PRIORITY)
+            batch = []
+    await db.requeue_done(batch, LIST_PRIORITY)
+    logger.info(
+        f"Incremental mode: {await db.pending_count()} pages queued for re-check "
+        f"out of {stats.known_pages} known"
+    )
+    return stats
@@ -0,0 +1,136 @@
+# core/metrics.py
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from aiohttp import web
+
+from forum_backup_crawler.utils.timeit import REGISTRY, MetricsRegistry
+
+if TYPE_CHECKING:
+    from forum_backup_crawler.core.pipeline import Pipeline
+    from forum_backup_crawler.network.rate_limit import HostLimiterRegistry
+    from forum_backup_crawler.storage.frontier import Frontier
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsExporter:
+    """
+    Publishes REGISTRY while a crawl runs:
+      - at http://host:port/metrics in the Prometheus text format (port None = off)
+      - as temp_dir/metrics.json every `interval` seconds and at the end (0 = off)
+
+    Gauges are refreshed from the pipeline, frontier and limiters right
+    before each scrape or snapshot, so the hot path never touches them.
+    """
+
+    def __init__(
+        self,
+        pipeline: "Pipeline",
+        frontier: "Frontier",
+        limiters: "HostLimiterRegistry",
+        snapshot_path: Path,
+        interval: float = 30.0,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        registry: MetricsRegistry = REGISTRY,
+    ) -> None:
+        self._pipeline = pipeline
+        self._frontier = frontier
+        self._limiters = limiters
+        self._snapshot_path = snapshot_path
+        self._interval = interval
+        self._port = port
+        self._host = host
+        self._registry = registry
+        # Point-in-time values, read from the crawl's components when collected
+        self._queue_depth = registry.gauge(
+            "fbc_queue_depth", "Items waiting in a stage's input queue", ["stage"]
+        )
+        self._utilization = registry.gauge(
+            "fbc_stage_utilization", "Share of a stage's task-time spent working", ["stage"]
+        )
+        self._buffered = registry.gauge("fbc_frontier_buffered", "Frontier changes waiting to be written to the DB")
+        self._in_flight = registry.gauge("fbc_frontier_in_flight", "URLs popped and not yet settled")
+        self._delay = registry.gauge(
+            "fbc_limiter_delay_seconds", "Current delay between requests to a host", ["host"]
+        )
+        self._workers = registry.gauge(
+            "fbc_limiter_workers", "Current concurrent requests allowed to a host", ["host"]
+        )
+        self._runner: Optional[web.AppRunner] = None
+        self._task: Optional[asyncio.Task] = None
+        self.url: Optional[str] = None
+
+    async def start(self) -> None:
+        if self._port is not None:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self._host, self._port)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+            self.url = f"http://{self._host}:{port}/metrics"
+            logger.info(f"Serving metrics at {self.url}")
+        if self._interval > 0:
+            self._task = asyncio.create_task(self._snapshot_loop(), name="metrics-snapshot")
+
+    async def close(self) -> None:
+        """Stop serving and write a final snapshot."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._interval > 0:
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    def collect(self) -> None:
+        """Refresh the gauges from the crawl's components."""
+        for stage, snap in self._pipeline.snapshot().items():
+            self._queue_depth.labels(stage).set(snap["queue"])
+            self._utilization.labels(stage).set(snap["utilization"])
+        self._buffered.set(self._frontier.buffered)
+        self._in_flight.set(self._frontier.in_flight)
+        for host, limiter in self._limiters.items():
+            self._delay.labels(host).set(limiter.current_delay)
+            self._workers.labels(host).set(limiter.current_workers)
+
+    def snapshot(self) -> dict:
+        """Refreshed metrics as plain data, as written to the JSON snapshot."""
+        self.collect()
+        return {"time": time.time(), "metrics": self._registry.snapshot()}
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        self.collect()
+        return web.Response(
+            body=self._registry.render().encode("utf-8"),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                # Collected on the event loop; only the file write is offloaded
+                await asyncio.to_thread(self._write, self.snapshot())
+            except OSError as e:
+                logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def _write(self, data: dict) -> None:
+        """Write `data` to snapshot_path as JSON, atomically."""
+        tmp = self._snapshot_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1), encoding="utf-8")
+        os.replace(tmp, self._snapshot_path)
@@ -0,0 +1,476 @@
+# core/pipeline.py
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Set, Union
+
+from forum_backup_crawler.core.incremental import IncrementalStats
+from forum_backup_crawler.core.progress import ProgressTracker, format_limiters
+from forum_backup_crawler.processing.html_rewriter import RewriteResult, rewrite_page
+from forum_backup_crawler.storage.assets import StoredAsset
+from forum_backup_crawler.storage.canonical import TrapDetector
+from forum_backup_crawler.storage.page_store import PageStore
+from forum_backup_crawler.storage.path_mapper import MapperRules
+from forum_backup_crawler.utils.timeit import REGISTRY
+
+if TYPE_CHECKING:
+    from forum_backup_crawler.core.scheduler import Context
+
+logger = logging.getLogger(__name__)
+
+PARSE_SECONDS = REGISTRY.histogram("fbc_parse_seconds", "Time to rewrite one HTML page")
+PERSIST_SECONDS = REGISTRY.histogram(
+    "fbc_persist_batch_seconds", "Time to write a batch of pages and update the frontier"
+)
+CANONICALIZED = REGISTRY.counter(
+    "fbc_links_canonicalized_total", "Links rewritten to the canonical URL of their page"
+)
+
+
+@dataclass
+class PageInfo:
+    """
+    What the stages pass along about a downloaded page:
+      - etag, last_modified, content_hash, size: validators stored for the
+        next incremental run
+      - revalidated: it was already known and has changed since
+    """
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    size: int
+    revalidated: bool = False
+
+
+@dataclass
+class FetchedPage:
+    """An HTML page handed from the fetch stage to the parse stage."""
+    url: str
+    depth: int
+    final_url: str
+    text: str
+    info: PageInfo
+
+
+@dataclass
+class ParsedPage:
+    """
+    A rewritten page handed from the parse stage to the persist stage.
+    With WARC output, `fetched` is the page as downloaded, which is what
+    gets archived.
+    """
+    url: str
+    depth: int
+    local_path: Path
+    html: str
+    links: List[str]
+    assets: List[str]
+    info: PageInfo
+    fetched: Optional[FetchedPage] = None
+
+
+@dataclass
+class StageStats:
+    """
+    Throughput counters for one pipeline stage:
+      - processed: items the stage finished
+      - busy:      seconds spent working (summed over the stage's tasks)
+      - queue:     the stage's input queue, for depth reporting
+    """
+    name: str
+    tasks: int
+    queue: Optional[asyncio.Queue] = None
+    processed: int = 0
+    busy: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "processed": self.processed,
+            "busy": self.busy,
+            "per_sec": self.processed / elapsed,
+            # Share of the stage's task-time spent working: near 1.0 = bottleneck
+            "utilization": self.busy / (elapsed * self.tasks),
+            "queue": self.queue.qsize() if self.queue is not None else 0,
+            "queue_max": self.queue.maxsize if self.queue is not None else 0,
+        }
+
+
+class Pipeline:
+    """
+    Staged crawl pipeline:
+
+      fetch   (N async tasks)   pop URLs from the frontier and download them
+         │  bounded parse queue
+      parse   (M tasks)         rewrite HTML in a process pool, off the event loop
+         │  bounded persist queue
+      persist (1 task)          write pages in batches, then update the frontier
+
+    Bounded queues give each stage backpressure: when parsing falls behind,
+    fetchers block on the parse queue instead of piling pages up in memory.
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        executor: Optional[Executor],
+        fetchers: int,
+        parsers: int,
+        queue_size: int = 64,
+        persist_batch: int = 32,
+        report_interval: float = 30.0,
+        engine: str = "soup",
+        incremental: Optional[IncrementalStats] = None,
+        traps: Optional[TrapDetector] = None,
+    ) -> None:
+        """
+        :param ctx: Shared crawl components
+        :param executor: Executor for the parse stage (None = default thread pool)
+        :param fetchers: Number of concurrent fetch tasks
+        :param parsers: Number of concurrent parse jobs
+        :param queue_size: Capacity of each inter-stage queue
+        :param persist_batch: Max pages written per persist batch
+        :param report_interval: Seconds between stats and progress log lines (0 disables)
+        :param engine: HTML rewriter engine passed to rewrite_page
+        :param incremental: Counters of an incremental run (None = full crawl).
+                            Known pages are then fetched with conditional GETs;
+                            unchanged ones are not rewritten or written, and
+                            changed ones get their known links re-checked.
+        :param traps: Drops links to likely crawler traps before they are queued
+        """
+        self._ctx = ctx
+        self._executor = executor
+        self._parse_q: asyncio.Queue = asyncio.Queue(queue_size)
+        self._persist_q: asyncio.Queue = asyncio.Queue(queue_size)
+        self._persist_batch = persist_batch
+        self._report_interval = report_interval
+        self._engine = engine
+        self.incremental = incremental
+        self.traps = traps
+        self.pages = ctx.pages if ctx.pages is not None else PageStore(ctx.settings.output_dir)
+        # Links rewritten to a canonical URL, i.e. duplicate fetches avoided
+        self.canonicalized = 0
+        # Known URLs re-checked in this run, so a page linked from several
+        # changed pages is only requeued once
+        self._checked: Set[str] = set()
+        self._progress = ProgressTracker()
+        self.stats = {
+            "fetch": StageStats("fetch", fetchers),
+            "parse": StageStats("parse", parsers, self._parse_q),
+            "persist": StageStats("persist", 1, self._persist_q),
+        }
+
+    async def run(self) -> None:
+        """Run all stages until the frontier is drained."""
+        fetch = [
+            asyncio.create_task(self._fetch_loop(i + 1), name=f"fetch-{i+1}")
+            for i in range(self.stats["fetch"].tasks)
+        ]
+        parse = [
+            asyncio.create_task(self._parse_loop(), name=f"parse-{i+1}")
+            for i in range(self.stats["parse"].tasks)
+        ]
+        persist = asyncio.create_task(self._persist_loop(), name="persist")
+        reporter = (
+            asyncio.create_task(self._report_loop(), name="pipeline-report")
+            if self._report_interval > 0 else None
+        )
+
+        try:
+            # Shut stages down front to back so every queued item is drained
+            await asyncio.gather(*fetch)
+            for _ in parse:
+                await self._parse_q.put(None)
+            await asyncio.gather(*parse)
+            await self._persist_q.put(None)
+            await persist
+        finally:
+            for task in (*fetch, *parse, persist):
+                task.cancel()
+            if reporter:
+                reporter.cancel()
+        self.log_stats()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage throughput, utilization and queue depth."""
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    def log_stats(self) -> None:
+        parts = []
+        for name, snap in self.snapshot().items():
+            part = f"{name} {snap['per_sec']:.1f}/s busy {snap['utilization']:.0%}"
+            if snap["queue_max"]:
+                part += f" q {snap['queue']}/{snap['queue_max']}"
+            parts.append(part)
+        logger.info("Pipeline: " + " | ".join(parts))
+
+    async def log_progress(self, log: bool = True) -> None:
+        """
+        Log URL counts, pages/s and ETA from the DB, and each host's
+        limiter. The rate is measured since the previous call.
+        """
+        ctx = self._ctx
+        try:
+            progress = self._progress.update(await ctx.db.status_counts())
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read crawl progress: {e}")
+            return
+        if log:
+            limiters = {
+                host: (limiter.current_delay, limiter.current_workers)
+                for host, limiter in ctx.limiters.items()
+            }
+            logger.info(f"Progress: {progress.summary()} | limiters: {format_limiters(limiters)}")
+
+    async def _report_loop(self) -> None:
+        await self.log_progress(log=False)   # pages/s is measured from here
+        while True:
+            await asyncio.sleep(self._report_interval)
+            self.log_stats()
+            await self.log_progress()
+
+    async def _fetch_loop(self, worker_id: int) -> None:
+        """
+        Fetch stage: pop a URL, download it and route the result.
+        HTML goes to the parse queue; other bodies are streamed straight
+        into the asset store (or the WARC archive); everything else is
+        settled here.
+        """
+        ctx = self._ctx
+        frontier = ctx.frontier
+        stats = self.stats["fetch"]
+
+        while True:
+            pop = await frontier.pop_pending()
+            if pop is None:
+                logger.debug(f"Fetcher {worker_id}: no more URLs, exiting.")
+                return
+            url, depth = pop
+
+            stored: List[StoredAsset] = []
+
+            async def sink(final_url: str, chunks: AsyncIterator[bytes]) -> None:
+                # Stored at the path pages link to, i.e. that of the requested URL
+                try:
+                    local_path = ctx.mapper.url_to_path(ctx.mapper.canonical(url))
+                    if ctx.archive is not None:
+                        stored.append(await ctx.archive.save_asset(url, chunks, local_path))
+                    else:
+                        stored.append(await ctx.assets.save(chunks, local_path))
+                except OSError as e:
+                    logger.error(f"Could not store asset {url}: {e}")
+                    raise
+
+            known = None
+            if self.incremental is not None:
+                known = await ctx.db.get_validators(url)
+                if known is not None:
+                    self._checked.add(url)
+                    self.incremental.checked += 1
+
+            started = time.monotonic()
+            try:
+                response = await ctx.client.fetch(
+                    url, sink=sink,
+                    etag=known.etag if known else None,
+                    last_modified=known.last_modified if known else None,
+                )
+            except OSError as e:
+                # Downloaded fine but not stored (logged by the sink)
+                stats.busy += time.monotonic() - started
+                stats.processed += 1
+                await frontier.record_error(url, f"storage error: {e}")
+                continue
+            stats.busy += time.monotonic() - started
+            stats.processed += 1
+            status, text, final_url = response.status, response.text, response.final_url
+
+            if status == 0:
+                await frontier.record_error(url, "network error")
+            elif status == 304 and known is not None:
+                self.incremental.not_modified += 1
+                await frontier.mark_done(url, known.local_path)
+            elif status < 300 and text is not None:
+                body = text.encode("utf-8")
+                info = PageInfo(
+                    response.etag, response.last_modified,
+                    hashlib.sha256(body).hexdigest(), len(body), known is not None,
+                )
+                if known is not None:
+                    self.incremental.downloaded_bytes += info.size
+                    if info.content_hash == known.content_hash:
+                        # Same bytes as last time: skip the rewrite and the write
+                        self.incremental.unchanged += 1
+                        await ctx.db.set_validators([_validator_row(url, info)])
+                        await frontier.mark_done(url, known.local_path)
+                        continue
+                    self.incremental.changed += 1
+                # Blocks when the parse stage is behind (backpressure)
+                await self._parse_q.put(FetchedPage(url, depth, final_url, text, info))
+            elif stored:
+                # Binary asset, already on disk: nothing to rewrite
+                asset = stored[0]
+                local_path = str(asset.local_path)
+                await ctx.db.record_asset(url, local_path, asset.content_hash, asset.size)
+                await frontier.mark_done(url, local_path)
+            elif 300 <= status < 400 and status != 304:
+                await ctx.db.add_redirect(url, final_url)
+                await frontier.mark_done(url, final_url)
+            else:
+                await frontier.record_error(url, f"HTTP {status}")
+
+    async def _parse_loop(self) -> None:
+        """Parse stage: rewrite HTML in the executor and queue it for persisting."""
+        mapper = self._ctx.mapper
+        rules = mapper.rules
+        stats = self.stats["parse"]
+
+        while True:
+            page = await self._parse_q.get()
+            if page is None:
+                return
+            started = time.monotonic()
+            try:
+                result = await self._rewrite(page, rules)
+            except Exception as e:
+                logger.exception(f"Error parsing HTML for {page.url}")
+                await self._ctx.frontier.record_error(page.url, str(e))
+                continue
+            finally:
+                elapsed = time.monotonic() - started
+                stats.busy += elapsed
+                PARSE_SECONDS.observe(elapsed)
+            stats.processed += 1
+            if result.canonicalized:
+                self.canonicalized += result.canonicalized
+                CANONICALIZED.inc(result.canonicalized)
+            local_path = mapper.url_to_path(mapper.canonical(page.final_url))
+            await self._persist_q.put(
+                ParsedPage(
+                    page.url, page.depth, local_path,
+                    result.html, result.links, result.assets, page.info,
+                    page if self._ctx.archive is not None else None,
+                )
+            )
+
+    async def _rewrite(self, page: FetchedPage, rules: MapperRules) -> RewriteResult:
+        """Rewrite one page in the executor (a separate method so it can be profiled)."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, rewrite_page, page.text, page.final_url, rules, self._engine,
+        )
+
+    async def _persist_loop(self) -> None:
+        """
+        Persist stage: take whatever pages are queued (up to persist_batch),
+        write them in one thread hop, then update the frontier for the batch.
+        With a disk writer, the batch is only queued for writing: the
+        frontier is updated by a task once it is written, while this loop
+        moves on to the next batch.
+        """
+        ctx = self._ctx
+        settling: Set[asyncio.Task] = set()
+        done = False
+
+        try:
+            while not done:
+                first = await self._persist_q.get()
+                if first is None:
+                    break
+                batch = [first]
+                while len(batch) < self._persist_batch and not self._persist_q.empty():
+                    item = self._persist_q.get_nowait()
+                    if item is None:
+                        done = True
+                        break
+                    batch.append(item)
+
+                started = time.monotonic()
+                if ctx.archive is not None:
+                    failed = await ctx.archive.save_pages(_archive_row(page) for page in batch)
+                elif ctx.disk is not None:
+                    # Waits only while the writer's queue is full
+                    written = await ctx.disk.submit(_write_pages, self.pages, batch)
+                    task = asyncio.create_task(self._settle(batch, written, started))
+                    settling.add(task)
+                    task.add_done_callback(settling.discard)
+                    continue
+                else:
+                    failed = await asyncio.to_thread(_write_pages, self.pages, batch)
+                await self._settle(batch, failed, started)
+            if settling:
+                await asyncio.gather(*settling)
+        finally:
+            for task in settling:
+                task.cancel()
+
+    async def _settle(
+        self, batch: List[ParsedPage], failed: Union[Dict[str, str], asyncio.Future], started: float
+    ) -> None:
+        """Update the frontier for a written batch; `failed` is {url: error}, or a future of it."""
+        ctx = self._ctx
+        stats = self.stats["persist"]
+        if isinstance(failed, asyncio.Future):
+            failed = await failed
+        await ctx.db.set_validators(
+            _validator_row(page.url, page.info) for page in batch if page.url not in failed
+        )
+        for page in batch:
+            if page.url in failed:
+                await ctx.frontier.record_error(page.url, failed[page.url])
+                continue
+            links, assets = page.links, page.assets
+            if self.traps is not None:
+                links, assets = self.traps.filter(links), self.traps.filter(assets)
+            # Links first, so the frontier never sees the page finished without them.
+            # Assets are mirrored even past the depth limit, or the page would be broken.
+            if page.depth + 1 <= ctx.settings.depth_limit:
+                await ctx.frontier.add_seed_urls(links, page.depth + 1)
+                if page.info.revalidated:
+                    # A changed page may link to other changed pages: re-check them
+                    await ctx.frontier.requeue(
+                        link for link in links if link not in self._checked
+                    )
+            await ctx.frontier.add_seed_urls(assets, page.depth + 1)
+            await ctx.frontier.mark_done(page.url, str(page.local_path))
+        elapsed = time.monotonic() - started
+        stats.busy += elapsed
+        PERSIST_SECONDS.observe(elapsed)
+        stats.processed += len(batch)
+
+
+def _validator_row(url: str, info: PageInfo) -> tuple:
+    return url, info.etag, info.last_modified, info.content_hash, info.size
+
+
+def _archive_row(page: ParsedPage) -> tuple:
+    fetched, info = page.fetched, page.info
+    headers = [("ETag", info.etag), ("Last-Modified", info.last_modified)]
+    return (
+        page.url, fetched.final_url, fetched.text, info.content_hash,
+        [(name, value) for name, value in headers if value],
+    )
+
+
+def _write_pages(store: PageStore, batch: List[ParsedPage]) -> Dict[str, str]:
+    """Write a batch of pages; return {url: error} for pages that failed."""
+    failed = {}
+    for page in batch:
+        try:
+            store.write(page.local_path, page.html)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Could not write {page.local_path}: {e}")
+            failed[page.url] = str(e)
+    try:
+        store.flush()
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Could not write the page index: {e}")
+        failed.update((page.url, str(e)) for page in batch)
+    return failed
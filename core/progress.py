@@ -0,0 +1,129 @@
+# core/progress.py
+
+"""
+Crawl progress from the StateDB's per-status URL counts.
+
+The counts are kept by triggers (StateDB.status_counts), so reading
+them costs the same on a 5M-URL crawl as on a small one. Two readings
+give the rate URLs are finished at, and from it an ETA for what is
+still pending. Used by the pipeline's periodic report and by the
+status command, which reads a running crawl's DB read-only.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from forum_backup_crawler.storage.state_db import StateDB
+
+# (delay seconds, workers) per host
+LimiterStates = Dict[str, Tuple[float, int]]
+
+
+@dataclass
+class Progress:
+    """Counts at one reading, plus the rate since the previous one."""
+    counts: Dict[str, int]
+    per_sec: float = 0.0
+    interval: float = 0.0       # seconds the rate was measured over
+
+    @property
+    def finished(self) -> int:
+        return self.counts["done"] + self.counts["error"]
+
+    @property
+    def remaining(self) -> int:
+        return self.counts["pending"] + self.counts["in_progress"]
+
+    @property
+    def error_rate(self) -> float:
+        """Share of finished URLs that ended in an error."""
+        return self.counts["error"] / self.finished if self.finished else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until nothing is pending at the current rate (None = unknown)."""
+        if not self.remaining:
+            return 0.0
+        return self.remaining / self.per_sec if self.per_sec > 0 else None
+
+    def summary(self) -> str:
+        counts = self.counts
+        return (
+            f"{counts['done']} done, {counts['pending']} pending, "
+            f"{counts['in_progress']} in progress, {counts['error']} errors "
+            f"({self.error_rate:.1%}) | {self.per_sec:.1f} pages/s, ETA {format_eta(self.eta)}"
+        )
+
+
+class ProgressTracker:
+    """Turns successive status_counts() readings into Progress."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self._clock = clock
+        self._last: Optional[Tuple[float, int]] = None
+
+    def update(self, counts: Dict[str, int]) -> Progress:
+        now = self._clock()
+        progress = Progress(counts)
+        if self._last is not None:
+            then, finished = self._last
+            progress.interval = now - then
+            if progress.interval > 0:
+                progress.per_sec = max(progress.finished - finished, 0) / progress.interval
+        self._last = (now, progress.finished)
+        return progress
+
+
+async def read_progress(db_path: Path, sample: float = 2.0) -> Progress:
+    """
+    Progress of the crawl whose DB is at `db_path`, which may be running:
+    the DB is opened read-only and the rate measured over `sample` seconds.
+
+    :raises FileNotFoundError: if there is no DB at `db_path`
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(f"State DB not found: {db_path}")
+    db = StateDB(db_path)
+    await db.connect(read_only=True)
+    tracker = ProgressTracker()
+    try:
+        progress = tracker.update(await db.status_counts())
+        if sample > 0:
+            await asyncio.sleep(sample)
+            progress = tracker.update(await db.status_counts())
+    finally:
+        await db.close()
+    return progress
+
+
+def read_limiters(metrics_path: Path) -> LimiterStates:
+    """Each host's limiter delay and workers, from a MetricsExporter snapshot ({} if none)."""
+    try:
+        metrics = json.loads(metrics_path.read_text(encoding="utf-8"))["metrics"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    delays = metrics.get("fbc_limiter_delay_seconds") or {}
+    workers = metrics.get("fbc_limiter_workers") or {}
+    return {
+        labels.partition("=")[2]: (delay, int(workers.get(labels, 0)))
+        for labels, delay in delays.items()
+    }
+
+
+def format_limiters(limiters: LimiterStates) -> str:
+    return ", ".join(
+        f"{host} {delay:.2f}s x{workers}" for host, (delay, workers) in sorted(limiters.items())
+    ) or "none yet"
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "unknown"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
@@ -2,50 +2,117 @@
 
 from __future__ import annotations
 import asyncio
+import logging
+from contextlib import AsyncExitStack
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, Optional
 
 from forum_backup_crawler.config import Settings
-from forum_backup_crawler.network.rate_limit import get_limiter, RateLimiter
-from forum_backup_crawler.network.http_client import HTTPClient
+from forum_backup_crawler.network.rate_limit import (
+    get_limiter, AdaptiveLimiter, FixedLimiter, HostLimiterRegistry, TokenBucketLimiter,
+)
+from forum_backup_crawler.network.http_client import HTTPClient, connection_reuse_rate
 from forum_backup_crawler.network.auth import load_cookies, CookieNotFoundError
 from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.seen_filter import open_seen_filter, save_seen_filter
 from forum_backup_crawler.storage.path_mapper import PathMapper
-from forum_backup_crawler.core.worker import worker
+from forum_backup_crawler.storage.assets import AssetStore
+from forum_backup_crawler.storage.disk_writer import DiskWriter
+from forum_backup_crawler.storage.page_store import PageStore
+from forum_backup_crawler.storage.warc import WarcStore
+from forum_backup_crawler.processing.parse_pool import create_parse_pool, parse_pool_size
+from forum_backup_crawler.core.checkpoint import (
+    Checkpointer, load_checkpoint, restore, verify_checkpoint,
+)
+from forum_backup_crawler.core.pipeline import Pipeline
+from forum_backup_crawler.core.metrics import MetricsExporter
+from forum_backup_crawler.core.incremental import IncrementalStats, prepare_recrawl
+from forum_backup_crawler.utils.profiler import Profiler, hook_all
+
+if TYPE_CHECKING:
+    from forum_backup_crawler.core.sharding import ShardLink
+
+logger = logging.getLogger(__name__)
+
+# Hot paths whose calls are timed when settings.profile is on
+PROFILED_CALLS = (
+    (HTTPClient, ["fetch"]),
+    (AdaptiveLimiter, ["before_request"]),
+    (TokenBucketLimiter, ["before_request"]),
+    (FixedLimiter, ["before_request"]),
+    (StateDB, [
+        "claim_pending", "apply_batch", "add_redirect",
+        "get_validators", "set_validators", "record_asset",
+    ]),
+    (Pipeline, ["_rewrite"]),
+    (PathMapper, ["url_to_path"]),
+)
 
 
 @dataclass
 class Context:
     """
-    Carries shared components for each worker:
+    Carries shared components for the pipeline stages:
       - settings: global config
       - db:        the SQLite-backed state store
+      - frontier:  in-memory URL queue with batched write-back to db
       - client:    the HTTP client with throttling
-      - limiter:   the RateLimiter strategy
+      - limiters:  one RateLimiter per host
       - mapper:    URL ↔ filesystem-path logic
+      - assets:    content-addressed store for binary downloads
+      - pages:     where rewritten pages are written (None = plain files)
+      - archive:   WARC backend that takes pages and assets instead
+                   (None = write the mirror)
+      - disk:      thread pool the persist stage hands page writes to
+                   (None = write each batch before the next one)
     """
     settings: Settings
     db: StateDB
+    frontier: Frontier
     client: HTTPClient
-    limiter: RateLimiter
+    limiters: HostLimiterRegistry
     mapper: PathMapper
+    assets: AssetStore
+    pages: Optional[PageStore] = None
+    archive: Optional[WarcStore] = None
+    disk: Optional[DiskWriter] = None
 
 
-async def run(settings: Settings) -> None:
+async def run(settings: Settings, shard: Optional["ShardLink"] = None) -> Dict[str, Dict[str, float]]:
     """
     Orchestrate the entire crawl:
       1. Prepare directories
       2. Load cookies & build HTTP client
       3. Initialize state database
       4. Seed starting URLs
-      5. Spawn worker tasks
+      5. Run the fetch / parse / persist pipeline
       6. Wait for completion and clean up
+
+    Returns the pipeline's final per-stage stats (Pipeline.snapshot()).
+
+    With settings.processes > 1 this hands over to sharding.run_sharded,
+    which runs it once per shard process with `shard` set: the shard then
+    only seeds and stores the URLs it owns.
+
+    With settings.coordinator_port set, this serves the URL queue to
+    remote workers instead (coordinator.run_coordinator); with
+    settings.coordinator_url set, it crawls as one of those workers.
     """
+    if settings.coordinator_port is not None and settings.coordinator_url is None:
+        from forum_backup_crawler.core.coordinator import run_coordinator
+        return await run_coordinator(settings)
+    if shard is None and settings.processes > 1:
+        from forum_backup_crawler.core.sharding import run_sharded
+        return await run_sharded(settings)
 
     # 1. Ensure output & temp folders exist
     settings.output_dir.mkdir(parents=True, exist_ok=True)
     settings.temp_dir.mkdir(parents=True, exist_ok=True)
+    disk = settings.disk_writer()
+    await disk.start()
+    pages = settings.page_store(disk)
 
     # 2. Load cookies for auth (if provided)
     try:
@@ -53,40 +120,175 @@ async def run(settings: Settings) -> None:
     except CookieNotFoundError:
         cookies = {}
 
-    # 3. Build rate limiter strategy
-    limiter = get_limiter(
-        settings.rate_limiter,
-        base_delay=0.5,
-        min_delay=0.1,
-        max_delay=5.0,
-        max_workers=settings.concurrency,
+    # 3. Build the rate limiter strategy, one instance per host
+    def make_limiter(host: str):
+        return get_limiter(
+            settings.rate_limiter,
+            base_delay=0.5,
+            min_delay=0.1,
+            max_delay=5.0,
+            max_workers=settings.concurrency,
+            rate=settings.rate_limit_rate,
+            burst=settings.rate_limit_burst,
+            latency_factor=settings.adaptive_latency_factor,
+        )
+
+    limiters = HostLimiterRegistry(
+        shard.limiter_factory(make_limiter) if shard else make_limiter
     )
 
     # 4. Start HTTP client with headers & cookies
-    client = HTTPClient(limiter, settings.user_agent, cookies)
+    client = HTTPClient(limiters, settings.user_agent, cookies, settings.pool_config())
     await client.start()
 
     # 5. Initialize the SQLite-backed state DB
     db_path = settings.temp_dir / "state.db"
-    db = StateDB(db_path)
+    db = StateDB(db_path, settings.scheduling_policy())
     await db.connect()
     await db.reset_in_progress()           # clear any crashed runs
-    await db.add_seed_urls(settings.start_urls)  # enqueue the first URLs
+    checkpoint = load_checkpoint(settings.temp_dir)
+    if checkpoint is not None:
+        await restore(checkpoint, db, limiters)
+    archive = settings.warc_store(db)
+    start_urls = settings.seed_urls()
+    if shard is not None:
+        start_urls = shard.owned(start_urls)
+    incremental = None
+    if settings.coordinator_url is None:
+        await db.add_seed_urls(start_urls)     # enqueue the first URLs
+        # Incremental mode: re-check known topic lists first
+        if settings.incremental:
+            incremental = await prepare_recrawl(db, start_urls)
+    elif settings.incremental:
+        # The coordinator seeds and requeues; validators stay in this worker's DB
+        incremental = IncrementalStats(*await db.validator_totals())
 
-    # 6. Prepare path-mapping logic
-    mapper = PathMapper(settings.output_dir)
+    # Load (or rebuild) the seen-URL filter, then put the frontier in front of the DB
+    seen = None
+    seen_path = settings.temp_dir / "state.seen"
+    if settings.seen_filter:
+        seen = await open_seen_filter(
+            db, seen_path, settings.seen_filter_capacity, settings.seen_filter_fp_rate
+        )
+
+    frontier_options = dict(
+        block_size=settings.frontier_block_size,
+        flush_interval=settings.frontier_flush_interval,
+        seen=seen,
+    )
+    if settings.coordinator_url is not None:
+        from forum_backup_crawler.core.coordinator import RemoteFrontier
+        frontier_options["block_size"] = settings.lease_size
+        frontier = RemoteFrontier(settings.coordinator_url, **frontier_options)
+    elif shard is not None:
+        frontier = shard.frontier(db, **frontier_options)
+    else:
+        frontier = Frontier(db, **frontier_options)
+    await frontier.start()
+    # A local frontier's seen filter is saved with each checkpoint; check
+    # a restored one against the DB while the crawl gets going
+    local = isinstance(frontier, Frontier)
+    checkpointer = Checkpointer(
+        settings.temp_dir, db, frontier, limiters,
+        seen_path=seen_path if seen is not None and local else None,
+        interval=settings.checkpoint_interval,
+    )
+    await checkpointer.start()
+    verify = None
+    if checkpoint is not None and local:
+        verify = asyncio.create_task(verify_checkpoint(db, frontier, seen_path), name="checkpoint-verify")
+
+    # 6. Prepare path-mapping logic, scoped to the start URLs' hosts
+    mapper = settings.path_mapper()
 
     # 7. Bundle everything into our Context
-    ctx = Context(settings, db, client, limiter, mapper)
+    ctx = Context(
+        settings, db, frontier, client, limiters, mapper, AssetStore(settings.output_dir),
+        pages, archive, disk,
+    )
+
+    # 8. Run the fetch → parse → persist pipeline until the frontier is drained
+    executor = create_parse_pool(settings.parse_workers)
+    pipeline = Pipeline(
+        ctx,
+        executor,
+        fetchers=settings.concurrency,
+        parsers=max(parse_pool_size(settings.parse_workers), 1),
+        queue_size=settings.pipeline_queue_size,
+        engine=settings.rewriter_engine,
+        report_interval=settings.pipeline_report_interval,
+        incremental=incremental,
+        traps=settings.trap_detector(),
+    )
+    metrics = MetricsExporter(
+        pipeline, frontier, limiters,
+        snapshot_path=settings.temp_dir / "metrics.json",
+        interval=settings.metrics_snapshot_interval,
+        port=settings.metrics_port,
+        host=settings.metrics_host,
+    )
+    await metrics.start()
+    profiler = None
+    if settings.profile:
+        profiler = Profiler(
+            settings.temp_dir / "profiles",
+            dump_interval=settings.profile_interval,
+            sample_interval=settings.profile_sample_interval,
+        )
+        hook_all(profiler, PROFILED_CALLS)
+        profiler.start()
+
+    # 9. Wait for all stages to finish
+    try:
+        try:
+            await pipeline.run()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            await metrics.close()
+            if profiler is not None:
+                await profiler.close()
+    finally:
+        # 10. Even if they failed: write back buffered state, close the DB and
+        # the HTTP session. Callbacks run last-in first-out (the frontier is
+        # closed first), each one even if an earlier one raised
+        async def close_pages() -> None:
+            await asyncio.to_thread(pages.close)
+            if pages.pages:
+                logger.info(f"Pages: {pages.stats()}, disk writer: {disk.stats()}")
 
-    # 8. Launch async workers
-    tasks = [
-        asyncio.create_task(worker(ctx, idx + 1), name=f"worker-{idx+1}")
-        for idx in range(settings.concurrency)
-    ]
+        async def close_archive() -> None:
+            await archive.close()
+            logger.info(f"WARC: {archive.stats()}")
 
-    # 9. Wait for all workers to finish
-    await asyncio.gather(*tasks)
+        async def log_summary() -> None:
+            if incremental is not None:
+                logger.info(incremental.summary())
+            trapped = pipeline.traps.stats()["trapped"] if pipeline.traps is not None else {}
+            logger.info(
+                f"URL filters: {pipeline.canonicalized} links canonicalized, "
+                f"{sum(trapped.values())} dropped as traps {trapped}"
+            )
+            if seen is not None:
+                if not local:
+                    await save_seen_filter(db, seen, seen_path)
+                logger.info(f"Seen filter stats: {seen.stats()}")
+            asset_urls, blobs, blob_bytes = await db.blob_stats()
+            logger.info(f"Assets: {asset_urls} URLs stored as {blobs} blobs ({blob_bytes} bytes)")
+            reuse = connection_reuse_rate()
+            if reuse is not None:
+                logger.info(f"HTTP connections: {reuse:.1%} of requests reused a kept-alive connection")
 
-    # 10. Clean up the HTTP session
-    await client.close()
+        async with AsyncExitStack() as cleanup:
+            cleanup.push_async_callback(client.close)
+            cleanup.push_async_callback(db.close)
+            cleanup.push_async_callback(log_summary)
+            if archive is not None:
+                cleanup.push_async_callback(close_archive)
+            cleanup.push_async_callback(close_pages)
+            cleanup.push_async_callback(disk.close)
+            cleanup.push_async_callback(checkpointer.close)
+            cleanup.push_async_callback(frontier.close)
+            if verify is not None:
+                cleanup.callback(verify.cancel)
+    return pipeline.snapshot()
@@ -0,0 +1,339 @@
+# core/sharding.py
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import zlib
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.network.rate_limit import (
+    RateLimiter, SharedTokenBucket, TokenBucketLimiter, host_key,
+)
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.state_db import StateDB
+
+logger = logging.getLogger(__name__)
+
+# Foreign URLs remembered per shard as already forwarded (exact, LRU)
+FORWARDED_CACHE = 100_000
+# Seconds between the coordinator's termination checks
+POLL_INTERVAL = 0.2
+
+
+def shard_of(url: str, shards: int) -> int:
+    """The shard that owns `url` (stable across processes and runs)."""
+    return zlib.crc32(url.encode("utf-8")) % shards
+
+
+@dataclass
+class ShardLink:
+    """
+    What a shard process shares with the coordinator and the other shards.
+    Created by run_sharded and passed to each process at start:
+      - inboxes:  one queue per shard for (kind, items) batches of routed URLs
+      - sent / received: batches put in / taken out of any inbox
+      - idle:     per shard, 1 while its frontier is drained
+      - buckets:  cross-process token buckets for the start URLs' hosts
+      - results:  where each shard puts (index, pipeline snapshot) at the end
+    """
+    index: int
+    count: int
+    inboxes: list
+    sent: object
+    received: object
+    idle: object
+    results: object
+    buckets: Dict[str, SharedTokenBucket] = field(default_factory=dict)
+    log_level: int = logging.INFO
+
+    def owns(self, url: str) -> bool:
+        return shard_of(url, self.count) == self.index
+
+    def owned(self, urls: Iterable[str]) -> List[str]:
+        return [url for url in urls if self.owns(url)]
+
+    def limiter_factory(self, local: Callable[[str], RateLimiter]) -> Callable[[str], RateLimiter]:
+        """
+        Wrap a per-host limiter factory: hosts with a shared bucket draw
+        from it (one rate over all shards); other hosts use `local`.
+        """
+        def make(host: str) -> RateLimiter:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                return local(host)
+            return TokenBucketLimiter(bucket.rate, bucket.burst, local(host).current_workers, shared=bucket)
+        return make
+
+    def frontier(self, db: StateDB, **kwargs) -> "ShardedFrontier":
+        return ShardedFrontier(db, self, **kwargs)
+
+
+class ShardedFrontier(Frontier):
+    """
+    Frontier of one shard: URLs owned by other shards are forwarded to
+    them in batches (on every flush, and before going idle) instead of
+    being stored, and batches forwarded here are fed in like local seeds.
+
+    A shard's crawl is over only when every shard is drained and no batch
+    is in flight; until the coordinator says so, a drained shard waits for
+    more URLs instead of ending its pipeline.
+    """
+
+    def __init__(self, db: StateDB, link: ShardLink, **kwargs) -> None:
+        super().__init__(db, **kwargs)
+        self._link = link
+        self._outbox: Dict[Tuple[str, int], Dict[int, List[str]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        self._forwarded: "OrderedDict[str, None]" = OrderedDict()
+        self._arrivals = 0
+        self._finished = False
+        self._work = asyncio.Condition()
+        self._receiver: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await super().start()
+        if self._receiver is None:
+            self._receiver = asyncio.create_task(self._receive_loop(), name="shard-inbox")
+
+    async def close(self) -> None:
+        if self._receiver is not None:
+            # Cancelling would leave a thread blocked in inbox.get (and drop
+            # the batch it may hold): wake it with an end marker instead, so
+            # batches already queued are still added before the flush
+            if not self._receiver.done():
+                self._link.inboxes[self._link.index].put(None)
+            await self._receiver
+            self._receiver = None
+        await super().close()
+
+    async def pop_pending(self) -> Optional[Tuple[str, int]]:
+        while True:
+            arrivals = self._arrivals
+            item = await super().pop_pending()
+            if item is not None:
+                return item
+            # Drained: hand foreign links over first, then wait for more or the end
+            self._send_outbox()
+            self._link.idle[self._link.index] = 1
+            async with self._work:
+                await self._work.wait_for(lambda: self._arrivals != arrivals or self._finished)
+            if self._finished and self._arrivals == arrivals:
+                return None
+
+    async def add_seed_urls(self, urls: Iterable[str], depth: int = 0) -> None:
+        own = []
+        for url in urls:
+            shard = shard_of(url, self._link.count)
+            if shard == self._link.index:
+                own.append(url)
+            elif self._forward_once(url):
+                self._outbox[("seed", shard)][depth].append(url)
+        await super().add_seed_urls(own, depth)
+
+    async def requeue(self, urls: Iterable[str], priority: int = 0) -> None:
+        own = []
+        for url in urls:
+            shard = shard_of(url, self._link.count)
+            if shard == self._link.index:
+                own.append(url)
+            else:
+                self._outbox[("requeue", shard)][priority].append(url)
+        await super().requeue(own, priority)
+
+    async def flush(self) -> None:
+        await super().flush()
+        self._send_outbox()
+
+    def _forward_once(self, url: str) -> bool:
+        """False if `url` was forwarded recently (the owner has it already)."""
+        if url in self._forwarded:
+            self._forwarded.move_to_end(url)
+            return False
+        self._forwarded[url] = None
+        if len(self._forwarded) > FORWARDED_CACHE:
+            self._forwarded.popitem(last=False)
+        return True
+
+    def _send_outbox(self) -> None:
+        outbox, self._outbox = self._outbox, defaultdict(lambda: defaultdict(list))
+        for (kind, shard), groups in outbox.items():
+            # Count before sending, so the coordinator never sees more
+            # batches received than sent
+            with self._link.sent.get_lock():
+                self._link.sent.value += 1
+            self._link.inboxes[shard].put((kind, dict(groups)))
+
+    async def _receive_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        inbox = self._link.inboxes[self._link.index]
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            if message is None:
+                break
+            kind, groups = message
+            for key, urls in groups.items():
+                if kind == "seed":
+                    await Frontier.add_seed_urls(self, urls, key)
+                else:
+                    await Frontier.requeue(self, urls, key)
+            # Busy again before the batch counts as received (see _quiescent);
+            # a fetcher may have gone idle while the URLs were being added
+            self._link.idle[self._link.index] = 0
+            with self._link.received.get_lock():
+                self._link.received.value += 1
+            async with self._work:
+                self._arrivals += 1
+                self._work.notify_all()
+        async with self._work:
+            self._finished = True
+            self._work.notify_all()
+
+
+def shard_settings(settings: Settings, index: int, count: int) -> Settings:
+    """
+    Settings for one of `count` shard processes: its own temp dir, and an
+    equal share of the fetchers, parse workers and per-host budgets.
+    """
+    return settings.copy(update={
+        "temp_dir": settings.temp_dir / "shards" / f"shard-{index}",
+        "concurrency": max(1, math.ceil(settings.concurrency / count)),
+        # The shard processes replace the parse pool unless one was asked for
+        "parse_workers": 0 if settings.parse_workers is None else settings.parse_workers // count,
+        "rate_limit_rate": settings.rate_limit_rate / count,
+        "rate_limit_burst": max(1, settings.rate_limit_burst // count),
+        "seen_filter_capacity": max(1, settings.seen_filter_capacity // count),
+        "metrics_port": settings.metrics_port + index if settings.metrics_port else settings.metrics_port,
+    })
+
+
+async def run_sharded(settings: Settings) -> Dict[str, Dict[str, float]]:
+    """
+    Crawl with settings.processes shard processes, each running the normal
+    pipeline (own event loop, HTTPClient and parse work) on the URLs that
+    hash to it, with its own state DB under temp_dir/shards/. Discovered
+    links are routed to their owner in batches. With the token_bucket
+    strategy the start URLs' hosts share one bucket across processes, so
+    rate_limit_rate stays a global limit; for other strategies, each shard
+    gets an equal share of the concurrency.
+
+    When all shards are done, their DBs are merged into temp_dir/state.db.
+    Returns the shards' pipeline snapshots combined.
+    """
+    count = settings.processes
+    shards_dir = settings.temp_dir / "shards"
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    _check_layout(shards_dir / "shards.json", count)
+
+    ctx = multiprocessing.get_context("spawn")
+    buckets = {}
+    if settings.rate_limiter == "token_bucket":
+        buckets = {
+            host_key(url): SharedTokenBucket(settings.rate_limit_rate, settings.rate_limit_burst, ctx)
+            for url in settings.start_urls
+        }
+    link = ShardLink(
+        index=-1,
+        count=count,
+        inboxes=[ctx.Queue() for _ in range(count)],
+        sent=ctx.Value("q", 0),
+        received=ctx.Value("q", 0),
+        idle=ctx.Array("b", count),
+        results=ctx.Queue(),
+        buckets=buckets,
+        log_level=logging.getLogger().getEffectiveLevel(),
+    )
+    processes = [
+        ctx.Process(
+            target=_shard_main,
+            args=(shard_settings(settings, i, count), replace(link, index=i)),
+            name=f"shard-{i}",
+        )
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Crawling with {count} shard processes")
+
+    snapshots = []
+    try:
+        while not _quiescent(link):
+            failed = [p.name for p in processes if p.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"Shard process failed: {', '.join(failed)}")
+            await asyncio.sleep(POLL_INTERVAL)
+        for inbox in link.inboxes:
+            inbox.put(None)
+        for _ in processes:
+            snapshots.append(await asyncio.to_thread(link.results.get))
+        for process in processes:
+            await asyncio.to_thread(process.join)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    db = StateDB(settings.temp_dir / "state.db", settings.scheduling_policy())
+    await db.connect()
+    for i in range(count):
+        await db.merge_from(shards_dir / f"shard-{i}" / "state.db")
+    await db.close()
+    logger.info(f"Merged {count} shard DBs into {settings.temp_dir / 'state.db'}")
+    return combine_snapshots([snap for _, snap in sorted(snapshots)])
+
+
+def combine_snapshots(snapshots: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Sum the shards' per-stage counters (utilization is averaged)."""
+    combined: Dict[str, Dict[str, float]] = {}
+    for snapshot in snapshots:
+        for stage, stats in snapshot.items():
+            into = combined.setdefault(stage, dict.fromkeys(stats, 0))
+            for key, value in stats.items():
+                into[key] += value
+    for stats in combined.values():
+        stats["utilization"] /= max(len(snapshots), 1)
+    return combined
+
+
+def _quiescent(link: ShardLink) -> bool:
+    """
+    True when every shard is drained and no batch is in flight. A shard is
+    marked busy before a received batch is counted, and batches are
+    counted as sent before they are put, so equal, unchanged counters
+    around an all-idle reading mean nothing can wake a shard any more.
+    """
+    sent, received = link.sent.value, link.received.value
+    if sent != received or not all(link.idle):
+        return False
+    return (link.sent.value, link.received.value) == (sent, received)
+
+
+def _check_layout(path: Path, count: int) -> None:
+    """URLs are assigned by hash, so a resumed run needs the same shard count."""
+    if path.exists():
+        previous = json.loads(path.read_text(encoding="utf-8"))["processes"]
+        if previous != count:
+            raise ValueError(
+                f"This crawl was started with processes={previous}; resume it with the same value"
+            )
+    else:
+        path.write_text(json.dumps({"processes": count}), encoding="utf-8")
+
+
+def _shard_main(settings: Settings, link: ShardLink) -> None:
+    """Entry point of a shard process."""
+    from forum_backup_crawler.core.scheduler import run
+
+    logging.basicConfig(
+        level=link.log_level,
+        format=f"%(asctime)s [shard {link.index}] %(levelname)s %(name)s: %(message)s",
+    )
+    snapshot = asyncio.run(run(settings, shard=link))
+    link.results.put((link.index, snapshot))
@@ -0,0 +1,129 @@
+# core/viewer.py
+
+"""
+Browse a mirror whose pages are compressed or packed into segments.
+
+Serves output_dir over HTTP, decompressing pages on the fly (gzip pages
+are passed through to browsers that accept gzip). Plain files, assets
+included, are served as they are, so this works for any mirror.
+
+Usage (the same as the CLI's view command):
+    python -m forum_backup_crawler.core.viewer path/to/output_dir [--port 8800]
+"""
+
+from __future__ import annotations
+import asyncio
+import html
+import logging
+import mimetypes
+import sys
+from pathlib import Path, PurePosixPath
+from typing import List, Optional
+
+from aiohttp import web
+
+from forum_backup_crawler.storage.assets import BLOB_DIR
+from forum_backup_crawler.storage.page_store import PAGES_DIR, PageReader
+
+logger = logging.getLogger(__name__)
+
+# Folders of output_dir that are not mirrored hosts
+_INTERNAL = {BLOB_DIR, PAGES_DIR, "temp"}
+
+
+class MirrorViewer:
+    """
+    Local HTTP server for a mirror: GET /<host>/<mirror path>. Segments
+    and dictionaries written after start() are not seen until a restart.
+    """
+
+    def __init__(self, output_dir: Path, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        :param output_dir: Base folder of the mirror
+        :param port: Port to listen on (0 = any free port)
+        """
+        self.output_dir = output_dir
+        self._host = host
+        self._port = port
+        self._reader: Optional[PageReader] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self) -> None:
+        self._reader = await asyncio.to_thread(PageReader, self.output_dir)
+        app = web.Application()
+        app.router.add_get("/", self._handle_root)
+        app.router.add_get("/{path:.+}", self._handle_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.url = f"http://{self._host}:{port}"
+        logger.info(f"Serving {self.output_dir} at {self.url}/")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    async def _handle_root(self, request: web.Request) -> web.Response:
+        hosts = sorted(
+            p.name for p in self.output_dir.iterdir() if p.is_dir() and p.name not in _INTERNAL
+        )
+        items = "".join(
+            f'<li><a href="{html.escape(host)}/">{html.escape(host)}</a></li>' for host in hosts
+        )
+        return web.Response(text=f"<ul>{items}</ul>", content_type="text/html")
+
+    async def _handle_file(self, request: web.Request) -> web.StreamResponse:
+        path = request.match_info["path"]
+        parts = PurePosixPath(path).parts
+        if any(part in ("..", ".") for part in parts) or parts[0] in _INTERNAL:
+            raise web.HTTPNotFound()
+        if path.endswith("/"):
+            parts += ("index.html",)
+        local_path = Path(*parts)
+
+        content_type, _ = mimetypes.guess_type(local_path.name)
+        headers = {"Content-Type": content_type or "application/octet-stream"}
+        if content_type == "text/html":
+            headers["Content-Type"] += "; charset=utf-8"
+        stored = await asyncio.to_thread(self._reader.read_stored, local_path)
+        if stored is None:
+            target = self.output_dir / local_path
+            if not target.is_file():
+                raise web.HTTPNotFound()
+            return web.FileResponse(target, headers=headers)
+
+        data, codec = stored
+        if codec == "gzip" and "gzip" in request.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            data = await asyncio.to_thread(self._reader.decompress, data, codec)
+        return web.Response(body=data, headers=headers)
+
+
+async def serve(output_dir: Path, host: str, port: int) -> None:
+    """Serve the mirror until cancelled."""
+    viewer = MirrorViewer(output_dir, host, port)
+    await viewer.start()
+    print(f"Browse the mirror at {viewer.url}/ (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await viewer.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the CLI's view command with `argv` (default: the command line)."""
+    from forum_backup_crawler.cli import main as cli_main
+
+    cli_main(["view", *(sys.argv[1:] if argv is None else argv)])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,36 @@
 
 """
 The `network` package handles all HTTP-related functionality for the crawler:
-  - Throttling and rate limiting (adaptive, fixed, etc.)
+  - Throttling and rate limiting (adaptive, fixed, token bucket; per host)
   - HTTP session management and wrappers
   - Authentication via cookies
 """
 
-from .http_client import HTTPClient
-from .rate_limit import (
-    RateLimiter,
-    get_limiter,
-    AdaptiveLimiter,
-    FixedLimiter,
-)
-from .auth import (
-    load_cookies,
-    is_logged_in,
-    CookieNotFoundError,
-    CookieInvalidError,
-)
+# Re-exports, imported on first use (PEP 562) so that importing one
+# submodule, e.g. rate_limit, does not pull in aiohttp and BeautifulSoup
+_EXPORTS = {
+    "HTTPClient": "http_client",
+    "RateLimiter": "rate_limit",
+    "get_limiter": "rate_limit",
+    "AdaptiveLimiter": "rate_limit",
+    "FixedLimiter": "rate_limit",
+    "TokenBucketLimiter": "rate_limit",
+    "SharedTokenBucket": "rate_limit",
+    "HostLimiterRegistry": "rate_limit",
+    "load_cookies": "auth",
+    "is_logged_in": "auth",
+    "CookieNotFoundError": "auth",
+    "CookieInvalidError": "auth",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
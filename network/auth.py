@@ -3,13 +3,13 @@
 from __future__ import annotations
 import json
 from pathlib import Path
-from typing import Optional
-
-import aiohttp
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING, Optional
 
 from forum_backup_crawler.config import Settings
 
+if TYPE_CHECKING:
+    import aiohttp
+
 
 class CookieNotFoundError(Exception):
     """Raised when the cookies JSON file cannot be found."""
@@ -67,6 +67,8 @@ async def is_logged_in(
         # On network errors, presume not logged in
         return False
 
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     # Look for any <a href="/profile...">
     for a in soup.find_all("a", href=True):
@@ -2,40 +2,160 @@
 
 from __future__ import annotations
 import asyncio
-from typing import Optional, Tuple
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
 import aiohttp
+from aiohttp.compression_utils import HAS_BROTLI
 
-from forum_backup_crawler.network.rate_limit import RateLimiter
+from forum_backup_crawler.network.rate_limit import HostLimiterRegistry
+from forum_backup_crawler.utils.timeit import REGISTRY, SIZE_BUCKETS
+
+# Content types returned as text; anything else can be streamed to a sink
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# Read size for streamed bodies
+CHUNK_SIZE = 256 * 1024
+# Time out a stalled connection or read, but not a long, steady download
+TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+
+# sink(final_url, chunks): consumes a streamed response body
+BinarySink = Callable[[str, AsyncIterator[bytes]], Awaitable[None]]
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "fbc_fetch_seconds", "Time from sending a request to having read its body"
+)
+RESPONSES = REGISTRY.counter(
+    "fbc_responses_total", "Responses by HTTP status (0 = network error)", ["status"]
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    "fbc_response_bytes", "Body bytes received per response", buckets=SIZE_BUCKETS
+)
+CONNECTIONS = REGISTRY.counter(
+    "fbc_connections_total",
+    "Connections taken from the pool: newly opened or a reused keep-alive one",
+    ["kind"],
+)
+DNS_LOOKUPS = REGISTRY.counter("fbc_dns_lookups_total", "Host lookups by DNS cache result", ["cache"])
+
+
+class PoolConfig(NamedTuple):
+    """
+    Connection-pool settings of the crawler's aiohttp session:
+      - limit / limit_per_host: open connections overall and per host
+        (0 = unlimited); per host matches the limiters' worker count
+      - keepalive: seconds an idle connection is kept for reuse
+      - dns_ttl: seconds a resolved host is cached (None = forever)
+      - compression: ask for gzip/deflate (and brotli, when installed)
+    """
+    limit: int = 100
+    limit_per_host: int = 8
+    keepalive: float = 30.0
+    dns_ttl: Optional[int] = 300
+    compression: bool = True
+
+
+def create_session(
+    user_agent: str,
+    cookies: Optional[dict] = None,
+    pool: PoolConfig = PoolConfig(),
+) -> aiohttp.ClientSession:
+    """
+    The crawler's aiohttp session: one pooled TCPConnector with keep-alive
+    and a DNS cache, the shared TIMEOUT, and connection / DNS-cache
+    metrics. Must be called from the running event loop.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=pool.limit,
+        limit_per_host=pool.limit_per_host,
+        keepalive_timeout=pool.keepalive,
+        use_dns_cache=True,
+        ttl_dns_cache=pool.dns_ttl,
+    )
+    encodings = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+    headers = {
+        "User-Agent": user_agent,
+        "Accept-Encoding": encodings if pool.compression else "identity",
+    }
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=headers,
+        cookies=cookies,
+        timeout=TIMEOUT,
+        trace_configs=[_pool_trace()],
+    )
+
+
+def _pool_trace() -> aiohttp.TraceConfig:
+    """Count new vs. reused connections and DNS cache hits vs. misses."""
+    new, reused = CONNECTIONS.labels("new"), CONNECTIONS.labels("reused")
+    hits, misses = DNS_LOOKUPS.labels("hit"), DNS_LOOKUPS.labels("miss")
+
+    async def on_create(session, ctx, params) -> None:
+        new.inc()
+
+    async def on_reuse(session, ctx, params) -> None:
+        reused.inc()
+
+    async def on_dns_hit(session, ctx, params) -> None:
+        hits.inc()
+
+    async def on_dns_miss(session, ctx, params) -> None:
+        misses.inc()
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    trace.on_dns_cache_hit.append(on_dns_hit)
+    trace.on_dns_cache_miss.append(on_dns_miss)
+    return trace
+
+
+def connection_reuse_rate() -> Optional[float]:
+    """Share of requests so far that reused a kept-alive connection."""
+    new = CONNECTIONS.labels("new").value
+    reused = CONNECTIONS.labels("reused").value
+    return reused / (new + reused) if new + reused else None
+
+
+class FetchResult(NamedTuple):
+    """Outcome of HTTPClient.fetch."""
+    status: int                    # HTTP status (0 = network error)
+    text: Optional[str]            # decoded body, None if streamed or on error
+    final_url: str                 # URL after redirects
+    etag: Optional[str] = None     # validators for a later conditional GET
+    last_modified: Optional[str] = None
 
 
 class HTTPClient:
     """
-    HTTP client wrapper that integrates with our RateLimiter
-    to throttle requests and manage a persistent aiohttp session.
+    HTTP client wrapper that throttles each request with the RateLimiter
+    of its host and owns the crawl's pooled aiohttp session.
     """
 
     def __init__(
         self,
-        limiter: RateLimiter,
+        limiters: HostLimiterRegistry,
         user_agent: str,
         cookies: Optional[dict] = None,
+        pool: PoolConfig = PoolConfig(),
     ) -> None:
         """
-        :param limiter: RateLimiter instance to call before/after requests
+        :param limiters: Per-host RateLimiters to call before/after requests
         :param user_agent: User-Agent header string
         :param cookies: Optional dict of cookies for the session
+        :param pool: Connection-pool settings (see PoolConfig)
         """
-        self._limiter = limiter
-        self._headers = {"User-Agent": user_agent}
+        self._limiters = limiters
+        self._user_agent = user_agent
         self._cookies = cookies
+        self._pool = pool
         self._session: Optional[aiohttp.ClientSession] = None
 
     async def start(self) -> None:
         """Initialize the aiohttp session."""
         if self._session is None:
-            self._session = aiohttp.ClientSession(
-                headers=self._headers, cookies=self._cookies
-            )
+            self._session = create_session(self._user_agent, self._cookies, self._pool)
 
     async def close(self) -> None:
         """Close the aiohttp session."""
@@ -44,27 +164,88 @@ class HTTPClient:
             self._session = None
 
     async def fetch_text(
-        self, url: str, allow_redirects: bool = True
+        self,
+        url: str,
+        allow_redirects: bool = True,
+        sink: Optional[BinarySink] = None,
     ) -> Tuple[int, Optional[str], str]:
         """
         Fetch a URL expecting text (HTML, JSON, etc.).
 
         :param url: URL to GET
         :param allow_redirects: whether to follow 3xx redirects
+        :param sink: If given, a successful non-HTML response is not decoded:
+                     its body is streamed to `sink` in CHUNK_SIZE chunks and
+                     text is None
         :returns: (status_code, text or None on error, final_url)
         """
-        await self._limiter.before_request()
+        result = await self.fetch(url, allow_redirects, sink)
+        return result.status, result.text, result.final_url
+
+    async def fetch(
+        self,
+        url: str,
+        allow_redirects: bool = True,
+        sink: Optional[BinarySink] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> FetchResult:
+        """
+        fetch_text, plus conditional GET: with `etag` / `last_modified` from
+        an earlier download, the request carries If-None-Match /
+        If-Modified-Since, and an unchanged page comes back as a bodiless
+        304. The response's own validators are returned for next time.
+
+        :raises OSError: if `sink` cannot store the body (the response
+                         still counts as a success for the host's limiter)
+        """
+        headers: Dict[str, str] = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        limiter = self._limiters.for_url(url)
+        await limiter.before_request()
+        result = FetchResult(0, None, url)
+        status = 0
+        retry_after = None
+        size = 0
+        started = time.monotonic()
+        latency = None
         try:
             assert self._session is not None, "Session not started"
-            async with self._session.get(url, allow_redirects=allow_redirects, timeout=30) as resp:
-                text = await resp.text()
-                final = str(resp.url)
+            async with self._session.get(
+                url, allow_redirects=allow_redirects, headers=headers
+            ) as resp:
+                # What the server took; streaming a large body to disk is not
+                latency = time.monotonic() - started
                 status = resp.status
-        except Exception:
-            # Network error or timeout
-            status, text, final = 0, None, url
-        await self._limiter.after_response(status)
-        return status, text, final
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                final = str(resp.url)
+                text = None
+                if resp.status == 304:
+                    pass
+                elif sink is not None and resp.status < 300 and resp.content_type not in HTML_TYPES:
+                    await sink(final, resp.content.iter_chunked(CHUNK_SIZE))
+                else:
+                    text = await resp.text()
+                size = resp.content.total_bytes
+                result = FetchResult(
+                    resp.status, text, final,
+                    resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError):
+            # Network error, timeout or undecodable text; a sink's own
+            # errors (disk full...) are not the server's and propagate
+            result = FetchResult(0, None, url)
+            status = 0
+        finally:
+            # Always hand the concurrency slot back, even when cancelled
+            elapsed = time.monotonic() - started
+            _record(status, size, elapsed)
+            await limiter.after_response(status, retry_after, elapsed if latency is None else latency)
+        return result
 
     async def fetch_bytes(self, url: str) -> Tuple[int, Optional[bytes]]:
         """
@@ -73,13 +254,46 @@ class HTTPClient:
         :param url: URL to GET
         :returns: (status_code, bytes or None on error)
         """
-        await self._limiter.before_request()
+        limiter = self._limiters.for_url(url)
+        await limiter.before_request()
+        status, data, retry_after = 0, None, None
+        started = time.monotonic()
         try:
             assert self._session is not None, "Session not started"
-            async with self._session.get(url, allow_redirects=True, timeout=30) as resp:
+            async with self._session.get(url, allow_redirects=True) as resp:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
                 data = await resp.read()
                 status = resp.status
         except Exception:
             status, data = 0, None
-        await self._limiter.after_response(status)
+        finally:
+            elapsed = time.monotonic() - started
+            _record(status, len(data) if data else 0, elapsed)
+            await limiter.after_response(status, retry_after, elapsed)
         return status, data
+
+
+def _record(status: int, size: int, elapsed: float) -> None:
+    FETCH_SECONDS.observe(elapsed)
+    RESPONSES.labels(status).inc()
+    if status:
+        RESPONSE_BYTES.observe(size)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP date. Returns None if absent or unparseable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
@@ -1,16 +1,35 @@
 from __future__ import annotations
 import asyncio
-from typing import Protocol, Literal
+import multiprocessing
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterator, Literal, Optional, Protocol, Tuple
+from urllib.parse import urlsplit
+
+Clock = Callable[[], float]
+Sleep = Callable[[float], Awaitable[None]]
 
 
 class RateLimiter(Protocol):
     """Protocol for any rate limiter strategy."""
 
     async def before_request(self) -> None:
-        """Pause before making an HTTP request."""
+        """Pause before making an HTTP request (and take a concurrency slot)."""
+
+    async def after_response(
+        self,
+        status: int,
+        retry_after: Optional[float] = None,
+        latency: Optional[float] = None,
+    ) -> None:
+        """
+        Adjust internal state based on the HTTP response, and release the
+        slot taken by before_request. Must be called once per before_request.
 
-    async def after_response(self, status: int) -> None:
-        """Adjust internal state based on the HTTP response status."""
+        :param status: HTTP status (0 = network error)
+        :param retry_after: Seconds from the Retry-After header, if any
+        :param latency: Seconds the server took to respond (to the headers)
+        """
 
     @property
     def current_delay(self) -> float:
@@ -28,19 +47,259 @@ def get_limiter(
     min_delay: float,
     max_delay: float,
     max_workers: int,
+    rate: float = 2.0,
+    burst: int = 1,
+    latency_factor: Optional[float] = None,
 ) -> RateLimiter:
     """
     Factory that returns an instance of a RateLimiter based on the chosen strategy.
+
+    :param rate: token_bucket only: sustained requests per second
+    :param burst: token_bucket only: requests allowed back-to-back after idling
+    :param latency_factor: adaptive only: back off when p95 latency exceeds
+                           this multiple of its baseline (None = off)
     """
     if strategy == "adaptive":
-        return AdaptiveLimiter(base_delay, min_delay, max_delay, max_workers)
-    # For now, ignore token_bucket and default to FixedLimiter
+        return AdaptiveLimiter(
+            base_delay, min_delay, max_delay, max_workers, latency_factor=latency_factor
+        )
+    if strategy == "token_bucket":
+        return TokenBucketLimiter(rate, burst, max_workers)
     return FixedLimiter(base_delay, max_workers)
 
 
+def host_key(url: str) -> str:
+    """The key HostLimiterRegistry throttles `url` under: host, plus :port if given."""
+    parts = urlsplit(url)
+    return (parts.hostname or "") + (f":{parts.port}" if parts.port else "")
+
+
+class HostLimiterRegistry:
+    """
+    Keeps one RateLimiter per host, created on first use, so each host is
+    throttled on its own (e.g. the forum's image/CSS CDN doesn't eat into
+    the page host's budget, and a 429 from one doesn't slow the other).
+    """
+
+    def __init__(self, factory: Callable[[str], RateLimiter]) -> None:
+        """
+        :param factory: Builds the limiter for a host name
+        """
+        self._factory = factory
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def get(self, host: str) -> RateLimiter:
+        """Return the limiter for `host`, creating it if needed."""
+        host = host.lower()
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = self._factory(host)
+        return limiter
+
+    def for_url(self, url: str) -> RateLimiter:
+        """Return the limiter for the host of `url`."""
+        return self.get(host_key(url))
+
+    def items(self) -> Iterator[Tuple[str, RateLimiter]]:
+        """(host, limiter) pairs for every host seen so far."""
+        return iter(list(self._limiters.items()))
+
+    def __len__(self) -> int:
+        return len(self._limiters)
+
+    def state(self) -> Dict[str, dict]:
+        """What each host's limiter has learned (limiters without a state() are skipped)."""
+        return {
+            host: limiter.state()
+            for host, limiter in self.items() if hasattr(limiter, "state")
+        }
+
+    async def restore(self, states: Dict[str, dict]) -> None:
+        """Create the limiters of a state() snapshot and give them back what they had learned."""
+        for host, state in states.items():
+            limiter = self.get(host)
+            if hasattr(limiter, "restore"):
+                await limiter.restore(state)
+
+
+class TokenBucketLimiter:
+    """
+    Token-bucket rate limiter: tokens refill at `rate` per second up to
+    `burst`, and each request takes one.
+
+    Unlike the delay-based limiters, the wait is only as long as needed to
+    keep the average at `rate`: an idle host gets `burst` requests at once,
+    and concurrent workers share the budget instead of each sleeping a full
+    delay. Tokens are reserved on entry (the balance may go negative), so
+    waiting requests are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 1,
+        workers: int = 8,
+        clock: Clock = time.monotonic,
+        sleep: Sleep = asyncio.sleep,
+        shared: Optional["SharedTokenBucket"] = None,
+    ) -> None:
+        """
+        :param rate: Sustained requests per second (> 0)
+        :param burst: Bucket capacity (>= 1)
+        :param workers: Reported concurrency level
+        :param clock: Monotonic time source, replaceable in tests
+        :param sleep: Async sleep, replaceable in tests
+        :param shared: Take tokens from this cross-process bucket instead
+                       (its rate and burst apply; `rate`/`burst` are ignored)
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self._rate = shared.rate if shared else rate
+        self._burst = shared.burst if shared else burst
+        self._workers = workers
+        self._clock = clock
+        self._sleep = sleep
+        self._shared = shared
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    @property
+    def current_delay(self) -> float:
+        return 1.0 / self._rate
+
+    @property
+    def current_workers(self) -> int:
+        return self._workers
+
+    @property
+    def tokens(self) -> float:
+        """Tokens available now (negative when requests are queued)."""
+        if self._shared is not None:
+            return self._shared.tokens
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token; return how many seconds to wait before using it."""
+        if self._shared is not None:
+            return self._shared.reserve()
+        self._refill()
+        self._tokens -= 1
+        return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+    async def before_request(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await self._sleep(wait)
+
+    async def after_response(
+        self,
+        status: int,
+        retry_after: Optional[float] = None,
+        latency: Optional[float] = None,
+    ) -> None:
+        # Fixed budget: no dynamic adjustment
+        return
+
+
+class SharedTokenBucket:
+    """
+    Token-bucket state in shared memory, for one budget across processes
+    (e.g. one forum-wide rate for every shard of a multi-process crawl).
+    Pass it to the processes when they are created; each one wraps it in
+    a TokenBucketLimiter(shared=...).
+    """
+
+    def __init__(self, rate: float, burst: int = 1, ctx=multiprocessing) -> None:
+        """
+        :param rate: Sustained requests per second, over all processes (> 0)
+        :param burst: Bucket capacity (>= 1)
+        :param ctx: multiprocessing context the processes are started from
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self.rate = rate
+        self.burst = burst
+        # [tokens, last refill]; time.monotonic is system-wide
+        self._state = ctx.Array("d", [float(burst), time.monotonic()])
+
+    @property
+    def tokens(self) -> float:
+        """Tokens available now, over all processes (negative when requests are queued)."""
+        return self._take(0)
+
+    def reserve(self) -> float:
+        """Take a token; return how many seconds to wait before using it."""
+        tokens = self._take(1)
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def _take(self, count: int) -> float:
+        with self._state.get_lock():
+            now = time.monotonic()
+            tokens = min(self.burst, self._state[0] + (now - self._state[1]) * self.rate) - count
+            self._state[0] = tokens
+            self._state[1] = now
+        return tokens
+
+
+class ResizableSemaphore:
+    """
+    asyncio semaphore whose limit can change while slots are held.
+    Shrinking never interrupts holders: new acquirers just wait until
+    enough slots are released to get back under the limit.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = max(limit, 1)
+        self._in_use = 0
+        self._cond = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_use < self._limit)
+            self._in_use += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    async def resize(self, limit: int) -> None:
+        async with self._cond:
+            self._limit = max(limit, 1)
+            self._cond.notify_all()
+
+
 class AdaptiveLimiter:
     """
-    Adaptive rate limiter with exponential back-off on errors and gradual speed-up on successes.
+    Adaptive rate limiter that gates both pacing and concurrency (AIMD):
+
+      - every request holds a slot of a ResizableSemaphore from
+        before_request to after_response, so `current_workers` is the real
+        number of requests in flight
+      - on 429/5xx: halve the workers and double the delay (multiplicative
+        decrease), at most once per `cooldown` so one burst of errors from
+        requests already in flight counts as a single signal
+      - on a streak of successes: one more worker and a shorter delay
+        (additive increase)
+      - a Retry-After header pauses new requests until it has passed
+      - with `latency_factor`, a p95 latency rising above `latency_factor`
+        × its baseline (the lowest p95 since the last latency back-off)
+        counts as a back-off signal, so the limiter slows down before the
+        server starts failing
     """
 
     def __init__(
@@ -49,13 +308,40 @@ class AdaptiveLimiter:
         min_delay: float = 0.1,
         max_delay: float = 5.0,
         max_workers: int = 8,
+        *,
+        success_streak: int = 30,
+        cooldown: float = 1.0,
+        latency_factor: Optional[float] = None,
+        latency_window: int = 50,
+        max_retry_after: float = 300.0,
+        clock: Clock = time.monotonic,
+        sleep: Sleep = asyncio.sleep,
     ) -> None:
+        """
+        :param success_streak: Successes needed for each additive increase
+        :param cooldown: Minimum seconds between two decreases
+        :param latency_factor: p95 / baseline ratio that triggers a decrease (None = off)
+        :param latency_window: Number of recent latencies the p95 is computed over
+        :param max_retry_after: Cap on a server-requested pause, in seconds
+        :param clock: Monotonic time source, replaceable in tests
+        :param sleep: Async sleep, replaceable in tests
+        """
         self._delay = base_delay
         self._min_delay = min_delay
         self._max_delay = max_delay
         self._max_workers = max_workers
+        self._streak_needed = success_streak
+        self._cooldown = cooldown
+        self._latency_factor = latency_factor
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._baseline_p95: Optional[float] = None
+        self._max_retry_after = max_retry_after
+        self._clock = clock
+        self._sleep = sleep
         self._success_streak = 0
-        self._workers = max_workers
+        self._last_decrease = float("-inf")
+        self._paused_until = float("-inf")
+        self._slots = ResizableSemaphore(max_workers)
 
     @property
     def current_delay(self) -> float:
@@ -63,26 +349,86 @@ class AdaptiveLimiter:
 
     @property
     def current_workers(self) -> int:
-        return self._workers
+        return self._slots.limit
+
+    @property
+    def in_flight(self) -> int:
+        """Requests currently holding a slot."""
+        return self._slots.in_use
+
+    @property
+    def p95_latency(self) -> Optional[float]:
+        """p95 of the recent latency window (None until the window is full)."""
+        window = self._latencies
+        if len(window) < (window.maxlen or 0):
+            return None
+        ordered = sorted(window)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def state(self) -> dict:
+        """The learned delay and workers, for a checkpoint."""
+        return {"delay": self._delay, "workers": self._slots.limit}
+
+    async def restore(self, state: dict) -> None:
+        """Resume from a state() snapshot (clamped to this limiter's bounds)."""
+        self._delay = min(max(float(state["delay"]), self._min_delay), self._max_delay)
+        await self._slots.resize(min(max(int(state["workers"]), 1), self._max_workers))
 
     async def before_request(self) -> None:
-        await asyncio.sleep(self._delay)
+        wait = max(self._delay, self._paused_until - self._clock())
+        if wait > 0:
+            await self._sleep(wait)
+        await self._slots.acquire()
+
+    async def after_response(
+        self,
+        status: int,
+        retry_after: Optional[float] = None,
+        latency: Optional[float] = None,
+    ) -> None:
+        await self._slots.release()
+        if retry_after is not None and retry_after > 0:
+            pause = min(retry_after, self._max_retry_after)
+            self._paused_until = max(self._paused_until, self._clock() + pause)
 
-    async def after_response(self, status: int) -> None:
         if status == 429 or 500 <= status < 600:
-            # Exponential back-off
-            self._delay = min(self._delay * 2, self._max_delay)
-            self._workers = max(self._workers - 1, 1)
-            self._success_streak = 0
+            await self._decrease()
         elif 200 <= status < 300:
+            if latency is not None and self._latency_factor and self._latency_rising(latency):
+                await self._decrease()
+                # Re-learn the baseline at the new level, so a server that
+                # stays slower doesn't pin the limiter at one worker
+                self._baseline_p95 = None
+                return
             # Success: gradually speed up
             self._success_streak += 1
-            if self._success_streak >= 30:
+            if self._success_streak >= self._streak_needed:
                 self._delay = max(self._delay - 0.1, self._min_delay)
-                self._workers = min(self._workers + 1, self._max_workers)
+                await self._slots.resize(min(self._slots.limit + 1, self._max_workers))
                 self._success_streak = 0
         # Other status codes => no change
 
+    def _latency_rising(self, latency: float) -> bool:
+        self._latencies.append(latency)
+        p95 = self.p95_latency
+        if p95 is None:
+            return False
+        if self._baseline_p95 is None or p95 < self._baseline_p95:
+            self._baseline_p95 = p95
+            return False
+        return p95 > self._baseline_p95 * (self._latency_factor or 0)
+
+    async def _decrease(self) -> None:
+        self._success_streak = 0
+        now = self._clock()
+        if now - self._last_decrease < self._cooldown:
+            return
+        self._last_decrease = now
+        self._delay = min(self._delay * 2, self._max_delay)
+        await self._slots.resize(self._slots.limit // 2)
+        # Measure latency afresh at the new level
+        self._latencies.clear()
+
 
 class FixedLimiter:
     """
@@ -104,6 +450,11 @@ class FixedLimiter:
     async def before_request(self) -> None:
         await asyncio.sleep(self._delay)
 
-    async def after_response(self, status: int) -> None:
+    async def after_response(
+        self,
+        status: int,
+        retry_after: Optional[float] = None,
+        latency: Optional[float] = None,
+    ) -> None:
         # No dynamic adjustment
         return
@@ -0,0 +1,172 @@
+# processing/html_rewriter.py
+
+from __future__ import annotations
+import re
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin, urldefrag
+
+from bs4 import BeautifulSoup
+
+from forum_backup_crawler.storage.path_mapper import MapperRules, PathMapper, shared_mapper
+
+# Tag → attributes holding a page link (followed only when in scope)
+PAGE_ATTRS = {"a": ("href",), "area": ("href",)}
+# Tag → attributes holding a resource (always mirrored)
+RESOURCE_ATTRS = {
+    "img": ("src",),
+    "script": ("src",),
+    "iframe": ("src",),
+    "embed": ("src",),
+    "source": ("src",),
+    "video": ("src", "poster"),
+    "audio": ("src",),
+    "input": ("src",),
+}
+SRCSET_TAGS = ("img", "source")
+# <link rel=...> values that point to a resource rather than a page
+RESOURCE_RELS = {"stylesheet", "icon", "shortcut", "apple-touch-icon", "preload"}
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""", re.IGNORECASE)
+_SKIP_SCHEMES = ("javascript:", "mailto:", "data:", "tel:", "about:")
+
+
+class RewriteResult(NamedTuple):
+    """Output of rewrite_page."""
+    html: str           # page with links pointing into the mirror
+    links: List[str]    # in-scope pages to crawl next
+    assets: List[str]   # resources (images, CSS, scripts) to mirror
+    canonicalized: int = 0  # links rewritten to their page's canonical URL
+
+
+def rewrite_page(
+    html: str, url: str, rules: MapperRules, engine: str = "soup"
+) -> RewriteResult:
+    """
+    Rewrite every link and resource reference in `html` to a relative path
+    inside the mirror, and collect the absolute URLs to crawl next.
+
+    This is a pure function of picklable arguments, so it can run in a
+    worker process (see processing/parse_pool.py).
+
+    :param html: HTML of the page
+    :param url: URL the page was served from (after redirects)
+    :param rules: PathMapper rules snapshot (PathMapper.rules)
+    :param engine: "soup" (BeautifulSoup tree) or "stream" (single tokenizer
+                   pass, see processing/stream_rewriter.py)
+    """
+    mapper = shared_mapper(rules)
+    if engine == "stream":
+        from forum_backup_crawler.processing.stream_rewriter import rewrite_stream
+        return rewrite_stream(html, url, mapper)
+    if engine != "soup":
+        raise ValueError(f"Unknown rewriter engine: {engine!r}")
+    return rewrite_with(html, url, mapper)
+
+
+class LinkLocalizer:
+    """
+    The rewriting rules shared by every engine: turns the URLs found in one
+    page into relative mirror paths and records what to crawl next.
+    """
+
+    def __init__(self, final_url: str, mapper: PathMapper) -> None:
+        self._final_url = final_url
+        self._mapper = mapper
+        self._page_path = mapper.url_to_path(mapper.canonical(final_url))
+        # dicts as ordered sets
+        self._pages: Dict[str, None] = {}
+        self._assets: Dict[str, None] = {}
+        self._canonicalized = 0
+
+    def localize(self, value: str, is_page: bool) -> Optional[str]:
+        """
+        Return the relative mirror link for `value`, or None to leave it as is.
+        """
+        value = value.strip()
+        if not value or value.startswith("#") or value.lower().startswith(_SKIP_SCHEMES):
+            return None
+        absolute, fragment = urldefrag(urljoin(self._final_url, value))
+        if not absolute.startswith(("http://", "https://")):
+            return None
+        mapper = self._mapper
+        canonical = mapper.canonical(absolute)
+        if is_page and not mapper.in_scope(canonical):
+            return None
+        if canonical != absolute:
+            self._canonicalized += 1
+            absolute = canonical
+        (self._pages if is_page else self._assets)[absolute] = None
+        return mapper.relative_link(self._page_path, mapper.url_to_path(absolute), fragment)
+
+    def css(self, css: str) -> str:
+        """Rewrite every url(...) in a stylesheet or style attribute."""
+        def repl(m: re.Match) -> str:
+            local = self.localize(m.group(2), is_page=False)
+            return f"url({m.group(1)}{local}{m.group(1)})" if local else m.group(0)
+        return CSS_URL.sub(repl, css)
+
+    def srcset(self, srcset: str) -> str:
+        """Rewrite each candidate URL of a srcset attribute."""
+        candidates = []
+        for candidate in srcset.split(","):
+            parts = candidate.strip().split(None, 1)
+            if not parts:
+                continue
+            local = self.localize(parts[0], is_page=False)
+            if local:
+                parts[0] = local
+            candidates.append(" ".join(parts))
+        return ", ".join(candidates)
+
+    def attributes(self, name: str, attrs: Dict[str, str]) -> Dict[str, str]:
+        """
+        Return the new values of the attributes of tag `name` that change.
+
+        :param name: Lower-case tag name
+        :param attrs: Attribute name → (unescaped) value
+        """
+        changed: Dict[str, str] = {}
+        for attr in PAGE_ATTRS.get(name, ()):
+            if attrs.get(attr):
+                local = self.localize(attrs[attr], is_page=True)
+                if local:
+                    changed[attr] = local
+        for attr in RESOURCE_ATTRS.get(name, ()):
+            if attrs.get(attr):
+                local = self.localize(attrs[attr], is_page=False)
+                if local:
+                    changed[attr] = local
+        if name == "link" and attrs.get("href"):
+            rels = set((attrs.get("rel") or "").lower().split())
+            local = self.localize(attrs["href"], is_page=not rels & RESOURCE_RELS)
+            if local:
+                changed["href"] = local
+        if name in SRCSET_TAGS and attrs.get("srcset"):
+            srcset = self.srcset(attrs["srcset"])
+            if srcset != attrs["srcset"]:
+                changed["srcset"] = srcset
+        if attrs.get("style"):
+            style = self.css(attrs["style"])
+            if style != attrs["style"]:
+                changed["style"] = style
+        return changed
+
+    def result(self, html: str) -> RewriteResult:
+        return RewriteResult(html, list(self._pages), list(self._assets), self._canonicalized)
+
+
+def rewrite_with(text: str, final_url: str, mapper: PathMapper) -> RewriteResult:
+    """The "soup" engine: rewrite_page with an already built PathMapper."""
+    soup = BeautifulSoup(text, "html.parser")
+    localizer = LinkLocalizer(final_url, mapper)
+
+    for tag in soup.find_all(True):
+        attrs = {
+            k: " ".join(v) if isinstance(v, list) else v for k, v in tag.attrs.items()
+        }
+        for attr, value in localizer.attributes(tag.name, attrs).items():
+            tag[attr] = value
+        if tag.name == "style" and tag.string:
+            tag.string.replace_with(localizer.css(str(tag.string)))
+
+    return localizer.result(str(soup))
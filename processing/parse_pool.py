@@ -0,0 +1,39 @@
+# processing/parse_pool.py
+
+from __future__ import annotations
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_pool_size(workers: Optional[int]) -> int:
+    """
+    Resolve the configured number of parse processes: None means one per
+    CPU core, 0 means no processes (parse in the loop's default thread pool).
+    """
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(workers, 0)
+
+
+def create_parse_pool(workers: Optional[int]) -> Optional[Executor]:
+    """
+    Build the process pool that runs `rewrite_page`, or None for the loop's
+    default thread pool.
+
+    :param workers: Number of processes (see parse_pool_size)
+    """
+    size = parse_pool_size(workers)
+    if size == 0:
+        return None
+    logger.debug(f"Starting parse pool with {size} processes")
+    return ProcessPoolExecutor(max_workers=size, initializer=_warm_up)
+
+
+def _warm_up() -> None:
+    # Import the parsers up front so the first page doesn't pay for it
+    import forum_backup_crawler.processing.html_rewriter  # noqa: F401
+    import forum_backup_crawler.processing.stream_rewriter  # noqa: F401
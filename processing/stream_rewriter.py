@@ -0,0 +1,93 @@
+# processing/stream_rewriter.py
+
+from __future__ import annotations
+from html import escape
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from forum_backup_crawler.processing.html_rewriter import LinkLocalizer, RewriteResult
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+
+def rewrite_stream(text: str, final_url: str, mapper: PathMapper) -> RewriteResult:
+    """
+    The "stream" engine: rewrite `text` in a single tokenizer pass without
+    building a DOM.
+
+    Source text is copied through verbatim; only start tags with a rewritten
+    attribute and the contents of <style> elements are re-emitted. It uses
+    the same tokenizer (html.parser) and the same LinkLocalizer rules as the
+    "soup" engine, so both find the same links and produce equivalent HTML.
+    """
+    rewriter = _StreamRewriter(text, LinkLocalizer(final_url, mapper))
+    rewriter.feed(text)
+    rewriter.close()
+    return rewriter.localizer.result(rewriter.output())
+
+
+class _StreamRewriter(HTMLParser):
+    """
+    HTMLParser that records (start, end, replacement) edits against the
+    source text instead of building a tree.
+    """
+
+    def __init__(self, source: str, localizer: LinkLocalizer) -> None:
+        super().__init__(convert_charrefs=False)
+        self.localizer = localizer
+        self._source = source
+        self._edits: List[Tuple[int, int, str]] = []
+        self._in_style = False
+        # Offsets of each line start, to turn getpos() into a string index
+        self._line_starts = [0]
+        find = source.find
+        pos = find("\n")
+        while pos != -1:
+            self._line_starts.append(pos + 1)
+            pos = find("\n", pos + 1)
+
+    def _offset(self) -> int:
+        line, col = self.getpos()
+        return self._line_starts[line - 1] + col
+
+    def output(self) -> str:
+        pieces = []
+        last = 0
+        for start, end, replacement in self._edits:
+            pieces.append(self._source[last:start])
+            pieces.append(replacement)
+            last = end
+        pieces.append(self._source[last:])
+        return "".join(pieces)
+
+    def _tag(self, tag: str, attrs: List[Tuple[str, Optional[str]]], closed: bool) -> None:
+        self._in_style = tag == "style" and not closed
+        values = {k: v for k, v in attrs if v is not None}
+        changed = self.localizer.attributes(tag, values)
+        if not changed:
+            return
+        raw = self.get_starttag_text() or ""
+        start = self._offset()
+        parts = [f"<{tag}"]
+        for name, value in attrs:
+            value = changed.get(name, value)
+            parts.append(f" {name}" if value is None else f' {name}="{escape(value)}"')
+        parts.append("/>" if closed else ">")
+        self._edits.append((start, start + len(raw), "".join(parts)))
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self._tag(tag, attrs, closed=False)
+
+    def handle_startendtag(self, tag, attrs) -> None:
+        self._tag(tag, attrs, closed=True)
+
+    def handle_endtag(self, tag) -> None:
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data) -> None:
+        if not self._in_style:
+            return
+        css = self.localizer.css(data)
+        if css != data:
+            start = self._offset()
+            self._edits.append((start, start + len(data), css))
@@ -0,0 +1,101 @@
+# storage/assets.py
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import AsyncIterable, BinaryIO, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Folder inside output_dir that holds the content-addressed blobs
+BLOB_DIR = "_blobs"
+
+
+class StoredAsset(NamedTuple):
+    """Result of AssetStore.save."""
+    content_hash: str   # sha256 hex digest of the bytes
+    size: int           # bytes written
+    local_path: Path    # mirror path (relative to output_dir) the asset is linked at
+
+
+class AssetStore:
+    """
+    Content-addressed storage for binary assets (images, attachments, CSS...).
+
+    A download is streamed chunk by chunk into a temp file and hashed on the
+    way, so memory stays bounded by the chunk size whatever the file size.
+    The file is then kept once under its hash, `_blobs/ab/abcdef...`, and
+    hard-linked at its mirror path: an avatar served under a hundred URLs
+    takes the disk space of one. Where hard links aren't supported, the
+    blob is copied instead.
+    """
+
+    def __init__(self, output_dir: Path) -> None:
+        """
+        :param output_dir: Base folder of the mirror
+        """
+        self.output_dir = output_dir
+        self.blob_dir = output_dir / BLOB_DIR
+        self._tmp_dir = self.blob_dir / "tmp"
+
+    def blob_path(self, content_hash: str) -> Path:
+        """Absolute path of the blob holding the bytes with this hash."""
+        return self.blob_dir / content_hash[:2] / content_hash
+
+    async def save(self, chunks: AsyncIterable[bytes], local_path: Path) -> StoredAsset:
+        """
+        Stream `chunks` to disk and make them available at `local_path`.
+
+        :param chunks: Body of the download
+        :param local_path: Mirror path, relative to output_dir
+        """
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp_dir)
+        tmp = Path(tmp_name)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    # Hashing and writing both release the GIL: keep them off the loop
+                    await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+                    size += len(chunk)
+            content_hash = hasher.hexdigest()
+            await asyncio.to_thread(self._commit, tmp, content_hash, local_path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return StoredAsset(content_hash, size, local_path)
+
+    def _commit(self, tmp: Path, content_hash: str, local_path: Path) -> None:
+        blob = self.blob_path(content_hash)
+        if blob.exists():
+            # Same bytes already stored: drop the duplicate
+            tmp.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, blob)
+        _link(blob, self.output_dir / local_path)
+
+
+def _write_chunk(f: BinaryIO, hasher: "hashlib._Hash", chunk: bytes) -> None:
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+def _link(blob: Path, target: Path) -> None:
+    """Make `target` a hard link to `blob` (or a copy, if linking fails)."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if target.exists() and os.path.samefile(blob, target):
+            return
+        target.unlink(missing_ok=True)
+        os.link(blob, target)
+    except OSError as e:
+        logger.debug(f"Hard link to {target} failed ({e}), copying instead")
+        shutil.copyfile(blob, target)
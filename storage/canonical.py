@@ -0,0 +1,193 @@
+# storage/canonical.py
+
+"""
+URL canonicalization and crawler-trap detection, applied to links before
+they are queued.
+
+Forums serve the same page under many URLs: search-term highlighting
+(?highlight=), session ids, a `start=0` first page, query parameters in
+any order. canonicalize() folds those into one URL, so each page is
+fetched (and stored in the mirror) once. TrapDetector then drops URLs
+that only lead into endless generated pages: repeating paths, parameter
+explosions, calendars paging through the centuries, runaway pagination.
+"""
+
+from __future__ import annotations
+import collections
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Counter, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+from forum_backup_crawler.utils.timeit import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TRAPPED = REGISTRY.counter(
+    "fbc_links_trapped_total", "Links dropped as likely crawler traps", ["reason"]
+)
+
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+# Query parameters holding a page offset or number
+_PAGING_PARAMS = frozenset({"start", "page", "offset"})
+# Query parameters holding a calendar year (or a date starting with one)
+_YEAR_PARAMS = frozenset({"y", "year", "date"})
+_YEAR = re.compile(r"^(\d{4})(?:\D|$)")
+
+
+@dataclass(frozen=True)
+class CanonicalRules:
+    """
+    How URLs are canonicalized (picklable and hashable, so it can be part
+    of MapperRules):
+      - strip_params:   query parameters always removed (lower-case names)
+      - strip_defaults: (name, value) pairs removed because they are the
+                        default anyway, e.g. ("start", "0")
+      - sort_query:     sort the remaining parameters by name
+    """
+    strip_params: FrozenSet[str] = frozenset()
+    strip_defaults: FrozenSet[Tuple[str, str]] = frozenset()
+    sort_query: bool = True
+
+    @classmethod
+    def build(
+        cls,
+        strip_params: Iterable[str] = (),
+        strip_defaults: Iterable[Tuple[str, str]] = (),
+        sort_query: bool = True,
+    ) -> "CanonicalRules":
+        """Rules from plain iterables, parameter names in any case."""
+        return cls(
+            frozenset(name.lower() for name in strip_params),
+            frozenset((name.lower(), value) for name, value in strip_defaults),
+            sort_query,
+        )
+
+
+def canonicalize(url: str, rules: CanonicalRules) -> str:
+    """
+    The canonical form of `url`: lower-case scheme and host, no default
+    port, no fragment, "/" for an empty path, and the query without the
+    parameters `rules` strip, sorted by name if `rules` say so. Kept
+    parameters are not re-encoded.
+    """
+    try:
+        scheme, netloc, path, query, _ = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    port = _DEFAULT_PORTS.get(scheme)
+    if port and netloc.endswith(port):
+        netloc = netloc[: -len(port)]
+    if query:
+        kept = []
+        for pair in query.split("&"):
+            if not pair:
+                continue
+            name, _, value = pair.partition("=")
+            name = unquote_plus(name).lower()
+            if name in rules.strip_params or (name, value) in rules.strip_defaults:
+                continue
+            kept.append(pair)
+        if rules.sort_query:
+            # By name only: the order of repeated parameters may matter
+            kept.sort(key=lambda pair: unquote_plus(pair.partition("=")[0]).lower())
+        query = "&".join(kept)
+    return urlunsplit((scheme, netloc, path or "/", query, ""))
+
+
+class TrapDetector:
+    """
+    Recognises URLs of crawler traps with cheap per-URL checks (each limit
+    can be turned off with None):
+      - url_length:     URLs longer than max_url_length characters
+      - path_depth:     more than max_path_depth path segments
+      - path_repeat:    a path segment repeated more than max_segment_repeat
+                        times (/a/b/a/b/a/b, relative links resolved wrongly)
+      - query_params:   more than max_query_params query parameters
+      - page_offset:    a start/page/offset parameter above max_page_offset
+      - calendar:       a y/year/date parameter after next year, or more
+                        than calendar_years before this one
+    Counts what it drops per reason, and how many URLs it checked.
+    """
+
+    def __init__(
+        self,
+        max_url_length: Optional[int] = 2000,
+        max_path_depth: Optional[int] = 16,
+        max_segment_repeat: Optional[int] = 3,
+        max_query_params: Optional[int] = 10,
+        max_page_offset: Optional[int] = 100_000,
+        calendar_years: Optional[int] = 30,
+        year: Optional[int] = None,
+    ) -> None:
+        """
+        :param year: The current year for the calendar check (None = today's)
+        """
+        self.max_url_length = max_url_length
+        self.max_path_depth = max_path_depth
+        self.max_segment_repeat = max_segment_repeat
+        self.max_query_params = max_query_params
+        self.max_page_offset = max_page_offset
+        self.calendar_years = calendar_years
+        self.year = year if year is not None else time.localtime().tm_year
+
+        self.checked = 0
+        self.trapped: Counter[str] = collections.Counter()
+
+    def check(self, url: str) -> Optional[str]:
+        """The reason `url` looks like a trap, or None if it looks fine."""
+        if self.max_url_length is not None and len(url) > self.max_url_length:
+            return "url_length"
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return None
+        if self.max_path_depth is not None or self.max_segment_repeat is not None:
+            segments = [s for s in parts.path.split("/") if s]
+            if self.max_path_depth is not None and len(segments) > self.max_path_depth:
+                return "path_depth"
+            if (
+                self.max_segment_repeat is not None
+                and len(segments) > self.max_segment_repeat
+                and max(collections.Counter(segments).values()) > self.max_segment_repeat
+            ):
+                return "path_repeat"
+        if not parts.query:
+            return None
+        pairs = [pair.partition("=") for pair in parts.query.split("&") if pair]
+        if self.max_query_params is not None and len(pairs) > self.max_query_params:
+            return "query_params"
+        for name, _, value in pairs:
+            name = name.lower()
+            if (
+                self.max_page_offset is not None and name in _PAGING_PARAMS
+                and value.isdigit() and int(value) > self.max_page_offset
+            ):
+                return "page_offset"
+            if self.calendar_years is not None and name in _YEAR_PARAMS:
+                m = _YEAR.match(value)
+                if m and not self.year - self.calendar_years <= int(m.group(1)) <= self.year + 1:
+                    return "calendar"
+        return None
+
+    def filter(self, urls: Iterable[str]) -> List[str]:
+        """The URLs of `urls` that are not traps; counts the dropped ones."""
+        kept = []
+        for url in urls:
+            self.checked += 1
+            reason = self.check(url)
+            if reason is None:
+                kept.append(url)
+            else:
+                self.trapped[reason] += 1
+                TRAPPED.labels(reason).inc()
+                logger.debug(f"Skipping likely crawler trap ({reason}): {url}")
+        return kept
+
+    def stats(self) -> dict:
+        """Counters for reporting: URLs checked and dropped per reason."""
+        return {"checked": self.checked, "trapped": dict(self.trapped)}
@@ -0,0 +1,191 @@
+# storage/disk_writer.py
+
+"""
+Mirror writes off the event loop and off the crawl's critical path.
+
+The persist stage hands each batch of pages to a DiskWriter: a bounded
+queue of jobs drained by a small thread pool. It only waits when the
+queue is full, so a slow disk costs throughput only once it is slower
+than the crawl for a whole queue's worth of batches, and several
+threads keep several writes in flight. Files are written to a temp
+file and renamed into place, so a crash never leaves a half-written
+page behind. Directories already created are remembered instead of
+being mkdir'ed for every file.
+
+Durability is left to the OS by default; with an fsync interval, the
+files written since the last sync are fsynced in one group (then their
+directories), on that interval and on close.
+"""
+
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, Set, Tuple
+
+from forum_backup_crawler.utils.timeit import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "fbc_disk_queue_wait_seconds", "Time a batch waited for room in the disk writer queue"
+)
+FSYNC_SECONDS = REGISTRY.histogram("fbc_fsync_seconds", "Time to fsync the files of one sync group")
+
+
+class DiskWriter:
+    """
+    Runs write jobs in `threads` threads, at most `queue_size` of them
+    queued or running. write_file() is the atomic, mkdir-cached file
+    write the jobs use; it is thread-safe.
+    """
+
+    def __init__(self, threads: int = 4, queue_size: int = 16, fsync_interval: float = 0.0) -> None:
+        """
+        :param threads: Threads running write jobs
+        :param queue_size: Jobs queued or running before submit() waits
+        :param fsync_interval: Seconds between grouped fsyncs (0 = never fsync)
+        """
+        self.fsync_interval = fsync_interval
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="disk-writer")
+        self._slots = asyncio.Semaphore(queue_size)
+        self._jobs: Set[asyncio.Future] = set()
+        self._dirs: Set[Path] = set()
+        self._dirty: Set[Path] = set()
+        self._lock = threading.Lock()
+        self._sync_task: Optional[asyncio.Task] = None
+        self.files = 0
+        self.bytes = 0
+        self.syncs = 0
+        self.waited = 0.0
+
+    async def start(self) -> None:
+        if self.fsync_interval > 0:
+            self._sync_task = asyncio.create_task(self._sync_loop(), name="disk-sync")
+
+    async def submit(self, job: Callable[..., Any], *args: Any) -> asyncio.Future:
+        """
+        Queue `job(*args)` to run in a writer thread, waiting only while
+        the queue is full. Returns the future of its result.
+        """
+        started = time.monotonic()
+        await self._slots.acquire()
+        waited = time.monotonic() - started
+        self.waited += waited
+        QUEUE_WAIT_SECONDS.observe(waited)
+        future = asyncio.get_running_loop().run_in_executor(self._pool, job, *args)
+        self._jobs.add(future)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: asyncio.Future) -> None:
+        self._jobs.discard(future)
+        self._slots.release()
+
+    def write_file(self, path: Path, data: bytes) -> None:
+        """Write `data` to `path` atomically, creating its folder if needed."""
+        parent = path.parent
+        if parent not in self._dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(parent)
+        tmp = parent / f".{path.name}.{threading.get_ident()}.tmp"
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self.files += 1
+            self.bytes += len(data)
+        self.dirty(path)
+
+    def dirty(self, path: Path) -> None:
+        """Include `path` in the next fsync group (no-op unless fsyncing)."""
+        if self.fsync_interval > 0:
+            with self._lock:
+                self._dirty.add(path)
+
+    def sync(self) -> int:
+        """
+        fsync the files written since the last sync, then their folders;
+        returns the count. Blocks: the writer runs it in a pool thread
+        (see _sync), this is for callers on the event loop thread.
+        """
+        return self._record(*self._fsync_group())
+
+    async def _sync(self) -> int:
+        """sync() in a writer thread; the timing is recorded back on the loop."""
+        group = await asyncio.get_running_loop().run_in_executor(self._pool, self._fsync_group)
+        return self._record(*group)
+
+    def _fsync_group(self) -> Tuple[int, float]:
+        """fsync the dirty files and folders; returns (files, seconds). Thread-safe."""
+        with self._lock:
+            paths, self._dirty = self._dirty, set()
+        if not paths:
+            return 0, 0.0
+        started = time.monotonic()
+        for path in paths:
+            _fsync(path, os.O_RDONLY)
+        if os.name != "nt":
+            # Windows cannot open folders to fsync them (nor needs to)
+            for folder in {path.parent for path in paths}:
+                _fsync(folder, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        return len(paths), time.monotonic() - started
+
+    def _record(self, files: int, seconds: float) -> int:
+        # REGISTRY is only updated from the event loop thread
+        if files:
+            FSYNC_SECONDS.observe(seconds)
+            self.syncs += 1
+        return files
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            await self._sync()
+
+    async def drain(self) -> None:
+        """Wait for every queued job."""
+        if self._jobs:
+            await asyncio.gather(*self._jobs, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Finish queued jobs, fsync what is left and stop the threads."""
+        await self.drain()
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self.fsync_interval > 0:
+            await self._sync()
+        self._pool.shutdown()
+
+    def stats(self) -> dict:
+        """Counters for reporting: files and bytes written, fsync groups, seconds spent waiting for the queue."""
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "syncs": self.syncs,
+            "queue_wait_s": round(self.waited, 3),
+        }
+
+
+def _fsync(path: Path, flags: int) -> None:
+    try:
+        fd = os.open(path, flags)
+    except FileNotFoundError:
+        return  # replaced or removed since: nothing of ours left to sync
+    except OSError as e:
+        logger.debug(f"Cannot open {path} to fsync it: {e}")
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logger.debug(f"fsync {path}: {e}")
+    finally:
+        os.close(fd)
@@ -0,0 +1,229 @@
+# storage/frontier.py
+
+from __future__ import annotations
+import asyncio
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Deque, Iterable, List, Optional, Tuple
+
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.seen_filter import SeenFilter, save_seen_filter
+
+logger = logging.getLogger(__name__)
+
+
+class Frontier:
+    """
+    In-memory front for the StateDB URL queue.
+
+    Pending URLs are claimed from the DB in blocks and handed out in claim
+    order (see the DB's scheduling policy), while mark_done / record_error /
+    add_seed_urls / requeue calls are buffered and written back in periodic
+    batched transactions.
+
+    Crash safety relies on the StateDB status column: claimed URLs are stored
+    as 'in_progress' before they are handed out, so anything whose completion
+    was still buffered at crash time is put back by `reset_in_progress()` on
+    the next run. Seeds and completions are flushed in the same transaction,
+    so links discovered on a page are never lost while the page is done.
+
+    With a SeenFilter, seeds the filter already knows are dropped before they
+    are buffered. Seeds are added to the filter only after their batch has
+    been committed, so the filter never hides a URL missing from the DB.
+    """
+
+    def __init__(
+        self,
+        db: StateDB,
+        block_size: int = 256,
+        flush_interval: float = 1.0,
+        max_buffered: int = 1000,
+        seen: Optional[SeenFilter] = None,
+    ) -> None:
+        """
+        :param db: The StateDB to claim from and write back to
+        :param block_size: Number of pending URLs to claim per DB round-trip
+        :param flush_interval: Seconds between background flushes
+        :param max_buffered: Flush immediately once this many changes are buffered
+        :param seen: Optional filter of URLs already in the DB
+        """
+        self._db = db
+        self._seen = seen
+        self._block_size = block_size
+        self._flush_interval = flush_interval
+        self._max_buffered = max_buffered
+
+        self._queue: Deque[Tuple[str, int]] = deque()
+        self._seeds: List[Tuple[str, int]] = []
+        self._done: List[Tuple[str, str]] = []
+        self._errors: List[Tuple[str, str]] = []
+        self._requeue: List[Tuple[str, int]] = []
+
+        self._in_flight = 0
+        self._version = 0
+        self._refill_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._changed = asyncio.Condition()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight(self) -> int:
+        """Number of URLs handed out but not yet marked done or errored."""
+        return self._in_flight
+
+    @property
+    def seen_filter(self) -> Optional[SeenFilter]:
+        """The filter of URLs known to the DB, if one is in use."""
+        return self._seen
+
+    @property
+    def buffered(self) -> int:
+        """Number of changes waiting to be flushed to the DB."""
+        return len(self._seeds) + len(self._done) + len(self._errors) + len(self._requeue)
+
+    async def start(self) -> None:
+        """Start the background flush task."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(
+                self._flush_loop(), name="frontier-flush"
+            )
+
+    async def close(self) -> None:
+        """Stop the background flush task and write back everything buffered."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def pop_pending(self) -> Optional[Tuple[str, int]]:
+        """
+        Return the next (url, depth) to crawl, or None once the crawl is over.
+
+        When the in-memory deques run dry, buffered seeds are flushed and a new
+        block is claimed. If nothing is pending but other URLs are still in
+        flight, this waits for them, since they may discover more links.
+        """
+        while True:
+            item = self._take()
+            if item is not None:
+                return item
+
+            version = self._version
+            async with self._refill_lock:
+                # Another caller may have refilled while we waited for the lock
+                if self._queue:
+                    continue
+                await self.flush()
+                claimed = await self._db.claim_pending(self._block_size)
+                self._queue.extend((url, depth) for url, depth, _ in claimed)
+                if claimed:
+                    continue
+
+            async with self._changed:
+                # Something finished while we were refilling: try again
+                if (
+                    self._version != version
+                    or self._seeds
+                    or self._requeue
+                    or self._queue
+                ):
+                    continue
+                if self._in_flight == 0:
+                    return None
+                await self._changed.wait()
+
+    async def mark_done(self, url: str, local_path: str) -> None:
+        """Buffer a 'done' status update for a URL handed out by pop_pending."""
+        self._done.append((url, local_path))
+        await self._finish_one()
+
+    async def record_error(self, url: str, error_text: str) -> None:
+        """Buffer an 'error' status update for a URL handed out by pop_pending."""
+        self._errors.append((url, error_text))
+        await self._finish_one()
+
+    async def add_seed_urls(self, urls: Iterable[str], depth: int = 0) -> None:
+        """Buffer newly discovered URLs for insertion at the given depth."""
+        if self._seen is not None:
+            urls = self._seen.filter_new(urls)
+        self._seeds.extend((url, depth) for url in urls)
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+
+    async def requeue(self, urls: Iterable[str], priority: int = 0) -> None:
+        """
+        Buffer done URLs to be crawled again (see StateDB.requeue_done).
+        Written back after the batch's completions, so a URL finished in
+        the same batch is requeued too.
+        """
+        self._requeue.extend((url, priority) for url in urls)
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all buffered changes to the DB in a single transaction."""
+        async with self._flush_lock:
+            if not self.buffered:
+                return
+            seeds, self._seeds = self._seeds, []
+            done, self._done = self._done, []
+            errors, self._errors = self._errors, []
+            requeue, self._requeue = self._requeue, []
+            try:
+                await self._db.apply_batch(seeds, done, errors, requeue)
+            except BaseException:
+                # Keep the batch (in order, ahead of anything buffered since)
+                # for the next flush; applying it twice is harmless
+                self._seeds[:0] = seeds
+                self._done[:0] = done
+                self._errors[:0] = errors
+                self._requeue[:0] = requeue
+                raise
+            if self._seen is not None:
+                self._seen.update(url for url, _ in seeds)
+            logger.debug(
+                f"Frontier flushed {len(seeds)} seeds, {len(done)} done, "
+                f"{len(errors)} errors, {len(requeue)} requeued"
+            )
+
+    async def save_seen(self, path: Path) -> None:
+        """
+        Flush, then write the seen filter (if any) to `path` before the next
+        flush, so it covers every URL up to the DB's current max id.
+        """
+        if self._seen is None:
+            return
+        await self.flush()
+        async with self._flush_lock:
+            await save_seen_filter(self._db, self._seen, path)
+
+    def drop_seen_filter(self) -> None:
+        """Stop using the seen filter, e.g. once it is found inconsistent with the DB."""
+        self._seen = None
+
+    def _take(self) -> Optional[Tuple[str, int]]:
+        if not self._queue:
+            return None
+        self._in_flight += 1
+        return self._queue.popleft()
+
+    async def _finish_one(self) -> None:
+        self._in_flight -= 1
+        self._version += 1
+        if self.buffered >= self._max_buffered:
+            await self.flush()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Frontier background flush failed")
@@ -0,0 +1,70 @@
+# storage/migrate.py
+
+"""
+Upgrade an existing state.db in place to the current StateDB schema.
+
+Opening a StateDB already migrates it on connect; this tool does it ahead of
+a crawl and then VACUUMs the file so the space freed by dropping the old
+URL-keyed tables is returned to the filesystem.
+
+Usage:
+    python -m forum_backup_crawler.storage.migrate path/to/state.db [--no-vacuum]
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+
+from forum_backup_crawler.storage.state_db import StateDB, SCHEMA_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(db_path: Path, vacuum: bool = True) -> tuple[int, int]:
+    """
+    Migrate the database at `db_path` to SCHEMA_VERSION.
+
+    :param db_path: Path to an existing state.db
+    :param vacuum: Whether to VACUUM the file after migrating
+    :returns: (schema version before, schema version after)
+    :raises FileNotFoundError: if `db_path` does not exist
+    """
+    if not db_path.exists():
+        raise FileNotFoundError(f"State DB not found: {db_path}")
+
+    db = StateDB(db_path)
+    await db.connect(migrate=False)
+    try:
+        before = await db.schema_version()
+        await db.migrate()
+        after = await db.schema_version()
+        if vacuum and before != after:
+            await db.vacuum()
+    finally:
+        await db.close()
+    return before, after
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("db_path", type=Path)
+    parser.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    size_before = args.db_path.stat().st_size if args.db_path.exists() else 0
+    before, after = asyncio.run(migrate(args.db_path, vacuum=not args.no_vacuum))
+    if before == after:
+        print(f"{args.db_path} is already at schema {SCHEMA_VERSION}")
+        return
+    size_after = args.db_path.stat().st_size
+    print(
+        f"{args.db_path}: schema {before} → {after}, "
+        f"{size_before / 1e6:.1f} MB → {size_after / 1e6:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# storage/page_store.py
+
+"""
+How rewritten pages are stored in the mirror.
+
+  files     one file per page at its mirror path, as is (`t1-topic.html`)
+            or compressed (`t1-topic.html.gz`, `t1-topic.html.zst`)
+  segments  pages packed into large append-only segment files, each page
+            compressed on its own so it can be read back alone, with a
+            SQLite index of mirror path → (segment, offset, length)
+
+Each writing process keeps its segments, index and zstd dictionary under
+_pages/<writer>/, so shard processes and remote workers never share a
+file. PageReader finds a page in any of these layouts; core/viewer.py
+serves a compressed mirror through it. Assets are not affected (see
+storage/assets.py).
+"""
+
+from __future__ import annotations
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from forum_backup_crawler.storage.disk_writer import DiskWriter
+
+try:
+    import zstandard
+except ImportError:     # optional: only needed for the zstd codec
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Folder inside output_dir that holds segments, indexes and dictionaries
+PAGES_DIR = "_pages"
+# File-name suffix of a compressed page, per codec
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    path    TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset  INTEGER NOT NULL,
+    length  INTEGER NOT NULL,
+    codec   TEXT NOT NULL,
+    written REAL NOT NULL
+);
+"""
+
+
+class Codec:
+    """Page compression of a store; this base class stores pages as they are."""
+    name = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+
+    def __init__(self, level: Optional[int] = None) -> None:
+        self.level = 6 if level is None else level
+
+    def compress(self, data: bytes) -> bytes:
+        # mtime=0: the same page always compresses to the same bytes
+        return gzip.compress(data, self.level, mtime=0)
+
+
+class ZstdCodec(Codec):
+    """
+    zstd, optionally with a dictionary trained on the first `dict_samples`
+    pages. Forum pages share most of their markup (header, menus, post
+    templates), which a dictionary holds once instead of in every page.
+    The sample pages are kept in memory until the dictionary is trained;
+    they are compressed without it.
+    """
+    name = "zstd"
+
+    def __init__(
+        self,
+        level: Optional[int] = None,
+        dict_path: Optional[Path] = None,
+        dict_samples: int = 0,
+        dict_size: int = 112_640,
+    ) -> None:
+        """
+        :param level: Compression level (None = zstd's default, 3)
+        :param dict_path: Where the trained dictionary is kept; if it exists,
+                          it is used instead of training a new one
+        :param dict_samples: Pages to train a dictionary on (0 = no dictionary)
+        :param dict_size: Dictionary size in bytes
+        """
+        if zstandard is None:
+            raise RuntimeError("The zstd page codec needs the zstandard package")
+        self.level = 3 if level is None else level
+        self._dict_path = dict_path
+        self._dict_size = dict_size
+        self._samples: Optional[List[bytes]] = [] if dict_path and dict_samples > 0 else None
+        self._dict_samples = dict_samples
+        self._compressor = zstandard.ZstdCompressor(level=self.level)
+        if dict_path is not None and dict_path.exists():
+            self._use_dict(zstandard.ZstdCompressionDict(dict_path.read_bytes()))
+
+    def _use_dict(self, dictionary: "zstandard.ZstdCompressionDict") -> None:
+        self._samples = None
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+
+    def _train(self) -> None:
+        samples, self._samples = self._samples, None
+        try:
+            dictionary = zstandard.train_dictionary(self._dict_size, samples)
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train a zstd dictionary on {len(samples)} pages: {e}")
+            return
+        self._dict_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._dict_path.with_name(self._dict_path.name + ".tmp")
+        tmp.write_bytes(dictionary.as_bytes())
+        os.replace(tmp, self._dict_path)
+        logger.info(f"Trained a {len(dictionary.as_bytes())}-byte zstd dictionary on {len(samples)} pages")
+        self._use_dict(dictionary)
+
+    def compress(self, data: bytes) -> bytes:
+        compressed = self._compressor.compress(data)
+        if self._samples is not None:
+            self._samples.append(data)
+            if len(self._samples) >= self._dict_samples:
+                self._train()
+        return compressed
+
+
+def get_codec(
+    name: str,
+    level: Optional[int] = None,
+    dict_path: Optional[Path] = None,
+    dict_samples: int = 0,
+    dict_size: int = 112_640,
+) -> Codec:
+    """Build the page codec called `name` ("none", "gzip" or "zstd")."""
+    if name == "none":
+        return Codec()
+    if name == "gzip":
+        return GzipCodec(level)
+    if name == "zstd":
+        return ZstdCodec(level, dict_path, dict_samples, dict_size)
+    raise ValueError(f"Unknown page codec {name!r}; expected one of {sorted(SUFFIXES)}")
+
+
+class PageStore:
+    """
+    The "files" store: each page at its mirror path, with the codec's
+    suffix appended when it is compressed. Methods are blocking; the
+    pipeline calls them from writer threads, a batch per call. Pages are
+    compressed one at a time (codecs keep state), but written in parallel.
+    """
+
+    def __init__(
+        self, output_dir: Path, codec: Optional[Codec] = None, disk: Optional[DiskWriter] = None
+    ) -> None:
+        """
+        :param output_dir: Base folder of the mirror
+        :param codec: Page compression (None = plain UTF-8 files)
+        :param disk: Writes files atomically and tracks them for fsync
+                     (None = plain writes)
+        """
+        self.output_dir = output_dir
+        self.codec = codec or Codec()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def write(self, local_path: Path, html: str) -> None:
+        """Store the page at mirror path `local_path` (relative to output_dir)."""
+        data = html.encode("utf-8")
+        with self._lock:
+            stored = self.codec.compress(data)
+            self.pages += 1
+            self.raw_bytes += len(data)
+            self.stored_bytes += len(stored)
+        self._put(local_path, stored)
+
+    def _put(self, local_path: Path, data: bytes) -> None:
+        target = self.output_dir / local_path
+        target = target.with_name(target.name + SUFFIXES[self.codec.name])
+        if self.disk is not None:
+            self.disk.write_file(target, data)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+
+    def flush(self) -> None:
+        """Make the pages written so far findable (called after each batch)."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def stats(self) -> dict:
+        """Counters for reporting: pages written, and their size before and after."""
+        return {
+            "pages": self.pages,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "ratio": round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else None,
+        }
+
+
+class SegmentStore(PageStore):
+    """
+    The "segments" store: pages appended to _pages/<writer>/seg-NNNNN.dat,
+    a new segment once one reaches `segment_size` bytes. A page written
+    again is appended again and re-indexed; the old copy is left behind.
+    The index is committed by flush(), after the batch's data is flushed,
+    so it never points past the end of a segment. Segments are appended
+    by one thread at a time.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        codec: Optional[Codec] = None,
+        writer: str = "main",
+        segment_size: int = 256 * 1024 * 1024,
+        disk: Optional[DiskWriter] = None,
+    ) -> None:
+        """
+        :param writer: Name of this writing process's folder under _pages/
+        :param segment_size: Bytes after which a new segment is started
+        """
+        super().__init__(output_dir, codec, disk)
+        self._segment_lock = threading.Lock()
+        self.dir = output_dir / PAGES_DIR / writer
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self._index = sqlite3.connect(str(self.dir / "index.db"), check_same_thread=False)
+        self._index.execute("PRAGMA journal_mode=WAL;")
+        self._index.executescript(_INDEX_SCHEMA)
+        segments = sorted(self.dir.glob("seg-*.dat"))
+        # Append to the last segment after a restart (anything it holds past
+        # the indexed pages is unreferenced)
+        self._segment = int(segments[-1].stem[4:]) if segments else 1
+        self._file = open(self._segment_path(self._segment), "ab")
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.dir / f"seg-{segment:05d}.dat"
+
+    def _put(self, local_path: Path, data: bytes) -> None:
+        with self._segment_lock:
+            if self._file.tell() >= self.segment_size:
+                self._file.close()
+                self._segment += 1
+                self._file = open(self._segment_path(self._segment), "ab")
+            offset = self._file.tell()
+            self._file.write(data)
+            self._index.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?);",
+                (local_path.as_posix(), self._segment, offset, len(data), self.codec.name, time.time()),
+            )
+
+    def flush(self) -> None:
+        with self._segment_lock:
+            self._file.flush()
+            self._index.commit()
+            if self.disk is not None:
+                self.disk.dirty(self._segment_path(self._segment))
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+
+def open_page_store(
+    output_dir: Path,
+    layout: str = "files",
+    codec: str = "none",
+    writer: str = "main",
+    level: Optional[int] = None,
+    dict_samples: int = 0,
+    dict_size: int = 112_640,
+    segment_size: int = 256 * 1024 * 1024,
+    disk: Optional[DiskWriter] = None,
+) -> PageStore:
+    """
+    Build the page store for `layout` ("files" or "segments") and `codec`.
+    A trained zstd dictionary is kept as _pages/<writer>/zstd.dict.
+    """
+    dict_path = output_dir / PAGES_DIR / writer / "zstd.dict"
+    page_codec = get_codec(codec, level, dict_path, dict_samples, dict_size)
+    if layout == "files":
+        return PageStore(output_dir, page_codec, disk)
+    if layout == "segments":
+        return SegmentStore(output_dir, page_codec, writer, segment_size, disk)
+    raise ValueError(f"Unknown page store layout {layout!r}; expected 'files' or 'segments'")
+
+
+class PageReader:
+    """
+    Reads pages back from a mirror, whatever store wrote them: segment
+    indexes first, then compressed files, then plain files at the mirror
+    path.
+    """
+
+    def __init__(self, output_dir: Path) -> None:
+        self.output_dir = output_dir
+        pages_dir = output_dir / PAGES_DIR
+        self._indexes: List[Tuple[Path, sqlite3.Connection]] = [
+            (index.parent, sqlite3.connect(f"file:{index}?mode=ro", uri=True, check_same_thread=False))
+            for index in sorted(pages_dir.glob("*/index.db"))
+        ]
+        self._dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        if zstandard is not None:
+            for path in pages_dir.glob("*/zstd.dict"):
+                dictionary = zstandard.ZstdCompressionDict(path.read_bytes())
+                self._dicts[dictionary.dict_id()] = dictionary
+
+    def read_stored(self, local_path: Path) -> Optional[Tuple[bytes, str]]:
+        """
+        The bytes stored for `local_path` in a segment or a compressed
+        file, and their codec name; None if it is a plain file or missing.
+        Compressed data is returned as is, e.g. for serving gzip directly.
+        """
+        path = local_path.as_posix()
+        found = None
+        for folder, index in self._indexes:
+            row = index.execute(
+                "SELECT segment, offset, length, codec, written FROM pages WHERE path = ?;", (path,)
+            ).fetchone()
+            if row and (found is None or row[4] > found[1][4]):
+                found = folder, row
+        if found is not None:
+            folder, (segment, offset, length, codec, _) = found
+            with open(folder / f"seg-{segment:05d}.dat", "rb") as f:
+                f.seek(offset)
+                return f.read(length), codec
+        target = self.output_dir / local_path
+        for codec in ("zstd", "gzip"):
+            candidate = target.with_name(target.name + SUFFIXES[codec])
+            if candidate.is_file():
+                return candidate.read_bytes(), codec
+        return None
+
+    def decompress(self, data: bytes, codec: str) -> bytes:
+        """The page bytes of `data` stored with `codec`."""
+        if codec == "gzip":
+            return gzip.decompress(data)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Reading zstd pages needs the zstandard package")
+            dict_id = zstandard.get_frame_parameters(data).dict_id
+            dictionary = self._dicts.get(dict_id) if dict_id else None
+            if dict_id and dictionary is None:
+                raise ValueError(f"Missing zstd dictionary {dict_id}")
+            return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+        return data
+
+    def read(self, local_path: Path) -> Optional[bytes]:
+        """The page stored for `local_path`, decompressed, or None."""
+        stored = self.read_stored(local_path)
+        if stored is not None:
+            return self.decompress(*stored)
+        target = self.output_dir / local_path
+        return target.read_bytes() if target.is_file() else None
+
+    def close(self) -> None:
+        for _, index in self._indexes:
+            index.close()
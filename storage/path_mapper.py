@@ -0,0 +1,212 @@
+# storage/path_mapper.py
+
+from __future__ import annotations
+import hashlib
+import posixpath
+import re
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from urllib.parse import quote, urlsplit, unquote
+
+from forum_backup_crawler.storage.canonical import CanonicalRules, canonicalize
+
+# Extensions kept as-is; anything else is a page and gets ".html"
+ASSET_EXTENSIONS = frozenset({
+    ".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico",
+    ".bmp", ".woff", ".woff2", ".ttf", ".eot", ".otf", ".mp3", ".mp4", ".webm",
+    ".pdf", ".zip", ".rar", ".7z", ".txt", ".xml", ".json",
+})
+
+# Characters not allowed in Windows file names, URL delimiters and control characters
+_UNSAFE = re.compile(r'[<>:"\\|?*#%\x00-\x1f]')
+_MAX_NAME = 120
+
+
+@dataclass(frozen=True)
+class MapperRules:
+    """
+    Picklable snapshot of the rules a PathMapper maps URLs with, so a
+    mapper can be rebuilt inside a worker process.
+      - hosts: hosts whose pages are mirrored (None = every host)
+      - canonical: how links are canonicalized (None = taken as they are)
+      - shard_levels, shard_fanout: hashed subdirectories files are put in
+      - cache_size: URLs (and links) whose mapping is memoized
+    """
+    hosts: Optional[FrozenSet[str]] = None
+    canonical: Optional[CanonicalRules] = None
+    shard_levels: int = 0
+    shard_fanout: int = 256
+    cache_size: int = 65536
+
+
+class PathMapper:
+    """
+    Maps URLs to relative filesystem paths inside `output_dir`, laid out as
+    `<host>/<url path>` so pages can link to each other with relative paths.
+
+    Pages get an ".html" suffix and the query string folded into the file
+    name (`/viewforum?f=1&start=50` → `viewforum_f=1&start=50.html`);
+    over-long names are shortened with a hash so they stay unique.
+
+    With shard_levels > 0, files are spread over hashed subdirectories of
+    their folder (`f.example/3a/t1234-topic.html` for one level of 256),
+    so no directory grows to hundreds of thousands of entries. Changing
+    the sharding of an existing mirror moves every file.
+
+    url_to_path and relative_link are memoized in LRU caches: a forum page
+    links to the same navigation, member and avatar URLs as its neighbours.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        hosts: Optional[Iterable[str]] = None,
+        canonical: Optional[CanonicalRules] = None,
+        shard_levels: int = 0,
+        shard_fanout: int = 256,
+        cache_size: int = 65536,
+    ) -> None:
+        """
+        :param output_dir: Base folder of the mirror
+        :param hosts: Hosts whose pages are mirrored (the crawl scope).
+                      None means every host is in scope.
+        :param canonical: Rules folding URL variants of a page into one URL
+                          (see canonical()); None keeps URLs as they are
+        :param shard_levels: Levels of hashed subdirectories (0 = none)
+        :param shard_fanout: Subdirectories per level
+        :param cache_size: Entries of each memo (0 disables memoizing)
+        :raises ValueError: if the levels need more than 32 bits of hash
+        """
+        if shard_levels and (shard_fanout < 2 or shard_fanout ** shard_levels > 1 << 32):
+            raise ValueError(
+                f"Cannot shard into {shard_levels} levels of {shard_fanout} directories"
+            )
+        self.output_dir = output_dir
+        self.hosts = frozenset(h.lower() for h in hosts) if hosts is not None else None
+        self.canonical_rules = canonical
+        self.shard_levels = shard_levels
+        self.shard_fanout = shard_fanout
+        self.cache_size = cache_size
+        self._width = len(f"{shard_fanout - 1:x}")
+        self._cached_path = lru_cache(maxsize=cache_size)(self._map)
+        self._cached_link = lru_cache(maxsize=cache_size)(_relpath)
+
+    @property
+    def rules(self) -> MapperRules:
+        """Snapshot of this mapper's rules, for use in another process."""
+        return MapperRules(
+            hosts=self.hosts,
+            canonical=self.canonical_rules,
+            shard_levels=self.shard_levels,
+            shard_fanout=self.shard_fanout,
+            cache_size=self.cache_size,
+        )
+
+    @classmethod
+    def from_rules(cls, rules: MapperRules, output_dir: Path = Path(".")) -> "PathMapper":
+        """Rebuild a mapper from a rules snapshot."""
+        return cls(
+            output_dir,
+            hosts=rules.hosts,
+            canonical=rules.canonical,
+            shard_levels=rules.shard_levels,
+            shard_fanout=rules.shard_fanout,
+            cache_size=rules.cache_size,
+        )
+
+    def canonical(self, url: str) -> str:
+        """
+        The URL `url` is crawled and stored as. Map canonical URLs only, so
+        every variant of a page links to the same file.
+        """
+        if self.canonical_rules is None:
+            return url
+        return canonicalize(url, self.canonical_rules)
+
+    def in_scope(self, url: str) -> bool:
+        """True if `url` is an http(s) URL on a mirrored host."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return False
+        return self.hosts is None or parts.hostname in self.hosts
+
+    def url_to_path(self, url: str) -> Path:
+        """
+        Return the path (relative to output_dir) where `url` is stored.
+        """
+        return self._cached_path(url)
+
+    def _map(self, url: str) -> Path:
+        parts = urlsplit(url)
+        host = (parts.hostname or "_") + (f"_{parts.port}" if parts.port else "")
+        segments = [s for s in unquote(parts.path).split("/") if s not in ("", ".", "..")]
+        if not segments or parts.path.endswith("/"):
+            segments.append("index")
+
+        name = segments[-1]
+        stem, ext = posixpath.splitext(name)
+        if ext.lower() not in ASSET_EXTENSIONS:
+            stem, ext = name, ".html"
+        if parts.query:
+            stem = f"{stem}_{unquote(parts.query)}"
+        segments[-1] = _shorten(_UNSAFE.sub("_", stem), ext) + ext
+
+        safe = [_shorten(_UNSAFE.sub("_", s), "") for s in segments[:-1]]
+        return Path(host, *safe, *self._shards(segments[-1]), segments[-1])
+
+    def _shards(self, name: str) -> List[str]:
+        """Hashed subdirectories for file `name` (none unless sharding)."""
+        shards = []
+        h = zlib.crc32(name.encode("utf-8"))
+        for _ in range(self.shard_levels):
+            h, bucket = divmod(h, self.shard_fanout)
+            shards.append(f"{bucket:0{self._width}x}")
+        return shards
+
+    def relative_link(self, from_path: Path, to_path: Path, fragment: str = "") -> str:
+        """
+        Return a relative POSIX link from the file `from_path` to `to_path`,
+        both relative to output_dir, as used inside rewritten HTML.
+        """
+        start = PurePosixPath(from_path.as_posix()).parent.as_posix()
+        rel = self._cached_link(start, to_path.as_posix())
+        return rel + (f"#{fragment}" if fragment else "")
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hits, misses and size of the url_to_path and relative_link memos."""
+        return {
+            name: {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+            for name, info in (
+                ("paths", self._cached_path.cache_info()),
+                ("links", self._cached_link.cache_info()),
+            )
+        }
+
+
+# Mappers rebuilt from rules, one per process and rules, so every page
+# rewritten in a process shares their memos
+_shared: Dict[MapperRules, PathMapper] = {}
+
+
+def shared_mapper(rules: MapperRules) -> PathMapper:
+    """This process's mapper for `rules`."""
+    mapper = _shared.get(rules)
+    if mapper is None:
+        mapper = _shared[rules] = PathMapper.from_rules(rules)
+    return mapper
+
+
+def _relpath(start: str, to: str) -> str:
+    rel = posixpath.relpath(to, start or ".")
+    return quote(rel, safe="/=&;,+@!$'()~")
+
+
+def _shorten(name: str, ext: str) -> str:
+    limit = _MAX_NAME - len(ext)
+    if len(name) <= limit:
+        return name
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+    return f"{name[: limit - 13]}-{digest}"
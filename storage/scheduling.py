@@ -0,0 +1,162 @@
+# storage/scheduling.py
+
+"""
+Scheduling policies: the order in which StateDB.claim_pending hands out
+pending URLs.
+
+Each URL gets a class when it is first seeded (a small int, lower pops
+first), stored in urls.url_class next to the URL's host, so claims are
+index range scans however many URLs are queued. A claim then:
+
+  - walks the hosts with pending URLs round-robin, giving each an equal
+    share of the block (if the policy asks for host fairness)
+  - fills each share class by class, by priority, depth and id within a
+    class, each class getting at most its quota of the share while lower
+    classes are waiting; unused room then goes to capped classes again
+"""
+
+from __future__ import annotations
+import math
+import re
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Classes of ForumPolicy, in pop order
+INDEX, TOPIC, TOPIC_PAGE, OTHER, PROFILE, SEARCH = range(6)
+CLASS_NAMES = ("index", "topic", "topic_page", "other", "profile", "search")
+
+# Pages listing forums or topics: the board index, Forumeiros categories
+# (/c1-...) and forums (/f1-..., paginated as /f1p50-...), phpBB index.php
+# and viewforum.php
+_LIST_PATH = re.compile(
+    r"^/(?:|index\.php|forum|viewforum\.php|[cf]\d+-[^/]*|f\d+p\d+-[^/]*)$", re.IGNORECASE
+)
+_TOPIC_PATH = re.compile(r"^/(?:t\d+-[^/]*|viewtopic\.php|showthread\.php)$", re.IGNORECASE)
+_TOPIC_PAGE_PATH = re.compile(r"^/t\d+p\d+-[^/]*$", re.IGNORECASE)
+_PROFILE_PATH = re.compile(
+    r"^/(?:u\d+[^/]*|memberlist(?:\.php)?|profile(?:\.php)?|g\d+-[^/]*|groups|team)$",
+    re.IGNORECASE,
+)
+# Search results and other generated views: endless, and rarely archived content
+_SEARCH_PATH = re.compile(
+    r"^/(?:search(?:\.php)?|privmsg|post|posting\.php|ucp\.php|login|register)$",
+    re.IGNORECASE,
+)
+
+Row = Tuple[int, str, int, int]   # (id, url, depth, priority) of a pending URL
+
+
+def is_topic_list(url: str) -> bool:
+    """True if `url` looks like a page listing forums or topics."""
+    return bool(_LIST_PATH.match(urlsplit(url).path))
+
+
+class SchedulingPolicy:
+    """
+    Plain depth order: one class, no quotas, no host fairness, i.e. claim
+    by priority, depth and id (the order before URL classes existed).
+    Subclasses override classify() and set the attributes.
+    """
+    name = "depth"
+    # Class names, in pop order; classify() returns an index into this
+    classes: Sequence[str] = ("all",)
+
+    def __init__(
+        self,
+        quotas: Optional[Mapping[str, float]] = None,
+        host_fairness: bool = False,
+    ) -> None:
+        """
+        :param quotas: Max share (0..1] of each claimed block per class name;
+                       classes not listed are unlimited
+        :param host_fairness: Split each block evenly between hosts
+        """
+        unknown = set(quotas or {}) - set(self.classes)
+        if unknown:
+            raise ValueError(f"Unknown URL classes {sorted(unknown)}; expected {list(self.classes)}")
+        self.quotas: Dict[int, float] = {
+            self.classes.index(name): share for name, share in (quotas or {}).items()
+        }
+        if any(not 0 < share <= 1 for share in self.quotas.values()):
+            raise ValueError("quotas must be in (0, 1]")
+        self.host_fairness = host_fairness
+
+    def classify(self, url: str) -> int:
+        """The class of `url`: an index into `classes`."""
+        return 0
+
+    def caps(self, size: int) -> List[int]:
+        """Per-class limit within a share of `size` URLs (first pass of a claim)."""
+        return [
+            max(1, math.floor(self.quotas[cls] * size)) if cls in self.quotas else size
+            for cls in range(len(self.classes))
+        ]
+
+    def allocate(self, size: int, candidates: List[List[Row]]) -> List[Row]:
+        """
+        Pick up to `size` rows from `candidates` (per class, in pop order):
+        first up to each class's cap in class order, then, if room is left,
+        more from capped classes in class order.
+        """
+        caps = self.caps(size)
+        picked: List[Row] = []
+        taken = [0] * len(candidates)
+        for cls, rows in enumerate(candidates):
+            n = min(caps[cls], len(rows), size - len(picked))
+            picked.extend(rows[:n])
+            taken[cls] = n
+        for cls, rows in enumerate(candidates):
+            if len(picked) >= size:
+                break
+            extra = rows[taken[cls]:taken[cls] + size - len(picked)]
+            picked.extend(extra)
+        return picked
+
+
+class ForumPolicy(SchedulingPolicy):
+    """
+    Forum content first: board and forum indexes, then topics, then later
+    pages of topics, then everything else (assets included), then member
+    profiles and lists, then search results and other generated views.
+    Recognises Forumeiros/phpBB-style URLs; others are "other".
+    """
+    name = "forum"
+    classes = CLASS_NAMES
+
+    def classify(self, url: str) -> int:
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return OTHER
+        path = parts.path or "/"
+        if _LIST_PATH.match(path):
+            return INDEX
+        if _TOPIC_PAGE_PATH.match(path):
+            return TOPIC_PAGE
+        if _TOPIC_PATH.match(path):
+            start = parse_qs(parts.query).get("start", ["0"])[0]
+            return TOPIC_PAGE if start not in ("", "0") else TOPIC
+        if _PROFILE_PATH.match(path) or "mode=viewprofile" in parts.query:
+            return PROFILE
+        if _SEARCH_PATH.match(path):
+            return SEARCH
+        return OTHER
+
+
+POLICIES = {"depth": SchedulingPolicy, "forum": ForumPolicy}
+
+
+def get_policy(
+    name: str,
+    quotas: Optional[Mapping[str, float]] = None,
+    host_fairness: bool = False,
+) -> SchedulingPolicy:
+    """Build the scheduling policy called `name` ("depth" or "forum")."""
+    try:
+        cls = POLICIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown scheduling policy {name!r}; expected one of {sorted(POLICIES)}")
+    if cls is SchedulingPolicy:
+        # One class: quotas mean nothing
+        quotas = None
+    return cls(quotas, host_fairness)
@@ -0,0 +1,182 @@
+# storage/seen_filter.py
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import struct
+from pathlib import Path
+from typing import Iterable
+
+from forum_backup_crawler.storage.state_db import StateDB
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"FBCSEEN1"
+# magic, capacity, fp_rate, num_bits, num_hashes, count, last_id
+_HEADER = struct.Struct("<8sQdQIQQ")
+
+
+class SeenFilter:
+    """
+    Bloom filter of URLs already known to the StateDB.
+
+    A negative answer is always right; a positive one is wrong with
+    probability ~fp_rate while fewer than `capacity` URLs have been added.
+    Callers should only add URLs once they are committed to the DB, so the
+    filter never claims to know a URL the DB does not have.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        """
+        :param capacity: Expected number of distinct URLs
+        :param fp_rate: Target false-positive rate at `capacity` entries
+        """
+        if capacity <= 0 or not 0 < fp_rate < 1:
+            raise ValueError("capacity must be > 0 and 0 < fp_rate < 1")
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+        self.count = 0      # URLs added
+        self.last_id = 0    # highest urls.id known to be covered
+        self.checked = 0    # lookups through filter_new()
+        self.skipped = 0    # lookups answered "seen", i.e. inserts saved
+
+    def _positions(self, url: str) -> Iterable[int]:
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return ((h1 + i * h2) % m for i in range(self.num_hashes))
+
+    def add(self, url: str) -> None:
+        """Record `url` as seen."""
+        bits = self._bits
+        for pos in self._positions(url):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, urls: Iterable[str]) -> None:
+        """Record every URL in `urls` as seen."""
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(url))
+
+    def filter_new(self, urls: Iterable[str]) -> list[str]:
+        """
+        Return the URLs from `urls` not yet seen, updating the hit counters.
+        """
+        fresh = []
+        for url in urls:
+            self.checked += 1
+            if url in self:
+                self.skipped += 1
+            else:
+                fresh.append(url)
+        return fresh
+
+    def stats(self) -> dict:
+        """Counters for reporting: entries, lookups and inserts saved."""
+        return {
+            "entries": self.count,
+            "capacity": self.capacity,
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "size_bytes": len(self._bits),
+        }
+
+    def dumps(self) -> bytes:
+        """The filter as save() writes it (a copy, safe to write from another thread)."""
+        return _HEADER.pack(
+            _MAGIC, self.capacity, self.fp_rate, self.num_bits,
+            self.num_hashes, self.count, self.last_id,
+        ) + self._bits
+
+    def save(self, path: Path) -> None:
+        """Atomically write the filter to `path`."""
+        _write_atomic(path, self.dumps())
+
+    @classmethod
+    def load(cls, path: Path) -> "SeenFilter":
+        """
+        Read a filter written by save().
+
+        :raises ValueError: if the file is not a valid filter
+        """
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError(f"Truncated seen-filter file: {path}")
+            magic, capacity, fp_rate, num_bits, num_hashes, count, last_id = (
+                _HEADER.unpack(header)
+            )
+            if magic != _MAGIC:
+                raise ValueError(f"Not a seen-filter file: {path}")
+            bits = f.read()
+        seen = cls(capacity, fp_rate)
+        if (seen.num_bits, seen.num_hashes) != (num_bits, num_hashes) or len(bits) != len(seen._bits):
+            raise ValueError(f"Corrupt seen-filter file: {path}")
+        seen._bits = bytearray(bits)
+        seen.count = count
+        seen.last_id = last_id
+        return seen
+
+
+async def open_seen_filter(
+    db: StateDB, path: Path, capacity: int, fp_rate: float
+) -> SeenFilter:
+    """
+    Load the filter stored at `path`, or rebuild it from the DB if it is
+    missing, unreadable or was built with different parameters. A loaded
+    filter is caught up with URLs added to the DB after it was saved.
+    """
+    seen = None
+    if path.exists():
+        try:
+            seen = SeenFilter.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring seen filter {path}: {e}")
+        else:
+            if (seen.capacity, seen.fp_rate) != (capacity, fp_rate):
+                logger.info(f"Seen filter parameters changed, rebuilding {path}")
+                seen = None
+            elif seen.last_id > await db.max_url_id():
+                # The DB is older than the filter (e.g. restored from a
+                # backup): the filter would hide URLs the DB does not have
+                logger.warning(f"Seen filter {path} is ahead of the DB, rebuilding it")
+                seen = None
+
+    if seen is None:
+        seen = SeenFilter(capacity, fp_rate)
+    loaded = 0
+    async for url_id, url in db.iter_urls(after_id=seen.last_id):
+        seen.add(url)
+        seen.last_id = url_id
+        loaded += 1
+    logger.info(f"Seen filter ready: {seen.count} URLs ({loaded} loaded from DB)")
+    return seen
+
+
+async def save_seen_filter(db: StateDB, seen: SeenFilter, path: Path) -> None:
+    """
+    Persist `seen` next to the DB. Call after the frontier has flushed, so
+    every URL up to the DB's current max id is covered by the filter
+    (Frontier.save_seen does both). The filter is copied on the event
+    loop and written from a thread.
+    """
+    seen.last_id = await db.max_url_id()
+    await asyncio.to_thread(_write_atomic, path, seen.dumps())
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
@@ -2,55 +2,429 @@
 
 from __future__ import annotations
 import asyncio
+import logging
+import math
+from itertools import zip_longest
 from pathlib import Path
-from typing import Iterable, Optional, Tuple
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 
 import aiosqlite
 
+from forum_backup_crawler.storage.scheduling import Row, SchedulingPolicy
+from forum_backup_crawler.utils.timeit import REGISTRY, timed
+
+logger = logging.getLogger(__name__)
+
+# Time per call of the methods the crawl loop uses (wrappers such as
+# mark_done are counted under the method they call)
+DB_SECONDS = REGISTRY.histogram("fbc_db_seconds", "Time per StateDB call", ["op"])
+
+# Version stored in PRAGMA user_version. Version 1 is the original layout
+# with the URL text as primary key of every table (it never set user_version).
+# Version 3 adds content-addressed asset blobs, version 4 HTTP validators
+# and a pop priority, version 5 the URL class and host used by scheduling
+# policies, version 6 the offset index of WARC output, version 7 the
+# per-status URL counts kept up to date by triggers.
+SCHEMA_VERSION = 7
+
+STATUSES = ("pending", "in_progress", "done", "error")
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS hosts (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS url_keys (
+        id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL UNIQUE,
+        host_id INTEGER REFERENCES hosts(id)
+    );
+    CREATE TABLE IF NOT EXISTS urls (
+        id INTEGER PRIMARY KEY REFERENCES url_keys(id),
+        status TEXT CHECK(status IN ('pending','in_progress','done','error')),
+        local_path TEXT,
+        depth INTEGER,
+        error_text TEXT,
+        priority INTEGER NOT NULL DEFAULT 0,
+        url_class INTEGER NOT NULL DEFAULT 0,
+        host_id INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS urls_class_claim_idx
+        ON urls(status, url_class, priority, depth, id);
+    CREATE INDEX IF NOT EXISTS urls_host_claim_idx
+        ON urls(status, host_id, url_class, priority, depth, id);
+    CREATE TABLE IF NOT EXISTS validators (
+        url_id INTEGER PRIMARY KEY REFERENCES url_keys(id),
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        size INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS assets (
+        url_id INTEGER PRIMARY KEY REFERENCES url_keys(id),
+        local_path TEXT,
+        content_hash TEXT REFERENCES blobs(hash)
+    );
+    CREATE TABLE IF NOT EXISTS redirects (
+        src_id INTEGER PRIMARY KEY REFERENCES url_keys(id),
+        dst_id INTEGER REFERENCES url_keys(id)
+    );
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS archive (
+        url_id INTEGER PRIMARY KEY REFERENCES url_keys(id),
+        file TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        content_hash TEXT
+    );
+    CREATE INDEX IF NOT EXISTS archive_hash_idx ON archive(content_hash);
+    CREATE TABLE IF NOT EXISTS status_counts (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO status_counts (status)
+        VALUES ('pending'), ('in_progress'), ('done'), ('error');
+"""
+
+# Keep status_counts in step with urls, so progress is read without
+# scanning the table. Trigger bodies contain ';', hence not in _SCHEMA.
+# (INSERT OR REPLACE into urls deletes without firing the delete
+# trigger: callers recount afterwards, see merge_from.)
+_STATUS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS urls_count_insert AFTER INSERT ON urls BEGIN
+        UPDATE status_counts SET count = count + 1 WHERE status = NEW.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS urls_count_delete AFTER DELETE ON urls BEGIN
+        UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS urls_count_update AFTER UPDATE OF status ON urls
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+        UPDATE status_counts SET count = count + 1 WHERE status = NEW.status;
+    END
+    """,
+)
+_RECOUNT_STATUSES = """
+    UPDATE status_counts SET count = (
+        SELECT COUNT(*) FROM urls WHERE urls.status = status_counts.status
+    );
+"""
+
+# Interns a URL (and its host) so it can be referenced by integer id
+_INTERN_HOST = "INSERT OR IGNORE INTO hosts (name) VALUES (?);"
+_INTERN_URL = """
+    INSERT OR IGNORE INTO url_keys (url, host_id)
+    VALUES (?, (SELECT id FROM hosts WHERE name = ?));
+"""
+_URL_ID = "(SELECT id FROM url_keys WHERE url = ?)"
+
+# Hosts with pending URLs, one index seek per host
+_PENDING_HOSTS = """
+    WITH RECURSIVE h(id) AS (
+        SELECT (SELECT host_id FROM urls WHERE status = 'pending' ORDER BY host_id LIMIT 1)
+        UNION ALL
+        SELECT (SELECT host_id FROM urls WHERE status = 'pending' AND host_id > h.id
+                ORDER BY host_id LIMIT 1)
+        FROM h WHERE h.id IS NOT NULL
+    )
+    SELECT id FROM h WHERE id IS NOT NULL;
+"""
+
+
+class Validators(NamedTuple):
+    """What is known about the last download of a page, for conditional GETs."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+    size: Optional[int]
+    local_path: Optional[str]
+
+
+def url_host(url: str) -> Optional[str]:
+    """
+    Return the lower-cased host of `url`, or None for relative/opaque strings.
+    """
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
 
 class StateDB:
     """
-    SQLite-backed persistent state for URLs, assets, and redirects.
+    SQLite-backed persistent state for URLs, assets, asset blobs and redirects.
+
+    URLs are interned once in `url_keys` (with their host in `hosts`) and
+    every other table refers to them by integer id. The public API still
+    takes and returns URL strings.
+
+    Pending URLs are claimed in the order of a SchedulingPolicy (see
+    storage/scheduling.py); each URL's class is computed once, when it is
+    seeded, and recomputed for every URL if the policy changes.
     """
 
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, policy: Optional[SchedulingPolicy] = None) -> None:
         """
         :param db_path: Path to the SQLite database file.
+        :param policy: Claim order; defaults to plain depth order
         """
         self._db_path = db_path
+        self._policy = policy or SchedulingPolicy()
         self._conn: Optional[aiosqlite.Connection] = None
         self._lock = asyncio.Lock()
+        self._host_cursor = 0
 
-    async def connect(self) -> None:
+    async def connect(self, migrate: bool = True, read_only: bool = False) -> None:
         """
-        Open the SQLite connection, initialize tables, and set WAL mode.
+        Open the SQLite connection, set WAL mode, and create or upgrade
+        the schema to SCHEMA_VERSION.
+
+        :param migrate: If False, leave an older schema untouched (for tools
+                        that only inspect the file before calling migrate()).
+        :param read_only: Open the file read-only and leave it as it is, e.g.
+                          to report on a crawl that is running (WAL lets it
+                          read while the crawl writes).
         """
+        if read_only:
+            self._conn = await aiosqlite.connect(
+                f"{self._db_path.resolve().as_uri()}?mode=ro", uri=True
+            )
+            return
         self._conn = await aiosqlite.connect(str(self._db_path))
         await self._conn.execute("PRAGMA journal_mode=WAL;")
+        await self._conn.create_function("url_host", 1, url_host, deterministic=True)
+        await self._conn.create_function(
+            "url_class", 1, self._policy.classify, deterministic=True
+        )
+        if migrate:
+            await self.migrate()
+            await self._apply_policy()
+
+    @property
+    def host_cursor(self) -> int:
+        """Where host round-robin claiming resumes (kept in checkpoints)."""
+        return self._host_cursor
+
+    @host_cursor.setter
+    def host_cursor(self, value: int) -> None:
+        self._host_cursor = value
+
+    async def close(self) -> None:
+        """
+        Close the SQLite connection.
+        """
+        if self._conn:
+            await self._conn.close()
+            self._conn = None
+
+    async def schema_version(self) -> int:
+        """
+        Return the schema version of the open database: 0 for an empty file,
+        1 for the original URL-keyed layout, SCHEMA_VERSION when up to date.
+        """
+        assert self._conn
+        cursor = await self._conn.execute("PRAGMA user_version;")
+        (version,) = await cursor.fetchone()
+        if version:
+            return version
+        cursor = await self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='urls';"
+        )
+        return 1 if await cursor.fetchone() else 0
+
+    async def migrate(self) -> None:
+        """
+        Bring the schema up to SCHEMA_VERSION in one transaction.
+        Does nothing if it is already current.
+        """
+        assert self._conn
+        version = await self.schema_version()
+        if version >= SCHEMA_VERSION:
+            return
+        async with self._lock:
+            await self._conn.execute("BEGIN;")
+            try:
+                if version == 0:
+                    await self._create_schema()
+                elif version == 1:
+                    # Builds the current schema directly
+                    logger.info(f"Migrating {self._db_path} from schema 1 to {SCHEMA_VERSION}")
+                    await self._migrate_v1_to_v2()
+                else:
+                    # Steps alter existing tables; new tables and indexes
+                    # are then created from the current schema
+                    for step in range(version, SCHEMA_VERSION):
+                        logger.info(f"Migrating {self._db_path} from schema {step} to {step + 1}")
+                        await getattr(self, f"_migrate_v{step}_to_v{step + 1}")()
+                    await self._create_schema()
+                await self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
+
+    async def vacuum(self) -> None:
+        """
+        Rebuild the database file, returning space freed by a migration.
+        """
+        assert self._conn
+        async with self._lock:
+            await self._conn.execute("VACUUM;")
+
+    async def _create_schema(self) -> None:
+        assert self._conn
+        for statement in _SCHEMA.split(";"):
+            if statement.strip():
+                await self._conn.execute(statement)
+        for trigger in _STATUS_TRIGGERS:
+            await self._conn.execute(trigger)
+
+    async def _migrate_v1_to_v2(self) -> None:
+        """
+        Move URL-keyed tables to interned integer ids. Pop order is kept by
+        interning the old URLs in their former (depth, url) order.
+        """
+        assert self._conn
+        for table in ("urls", "assets", "redirects"):
+            await self._conn.execute(f"ALTER TABLE {table} RENAME TO {table}_v1;")
+        await self._conn.execute("DROP INDEX IF EXISTS urls_status_idx;")
+        await self._create_schema()
+
+        await self._conn.execute(
+            "INSERT OR IGNORE INTO url_keys (url) SELECT url FROM urls_v1 ORDER BY depth, url;"
+        )
         await self._conn.execute("""
-            CREATE TABLE IF NOT EXISTS urls (
-                url TEXT PRIMARY KEY,
-                status TEXT CHECK(status IN ('pending','in_progress','done','error')),
-                local_path TEXT,
-                depth INTEGER,
-                error_text TEXT
-            );
+            INSERT OR IGNORE INTO url_keys (url)
+            SELECT url FROM assets_v1
+            UNION ALL SELECT src FROM redirects_v1
+            UNION ALL SELECT dst FROM redirects_v1 WHERE dst IS NOT NULL;
         """)
-        await self._conn.execute("CREATE INDEX IF NOT EXISTS urls_status_idx ON urls(status);")
         await self._conn.execute("""
-            CREATE TABLE IF NOT EXISTS assets (
-                url TEXT PRIMARY KEY,
-                local_path TEXT
-            );
+            INSERT OR IGNORE INTO hosts (name)
+            SELECT DISTINCT url_host(url) FROM url_keys WHERE url_host(url) IS NOT NULL;
         """)
+        await self._conn.execute(
+            "UPDATE url_keys SET host_id = (SELECT id FROM hosts WHERE name = url_host(url));"
+        )
         await self._conn.execute("""
-            CREATE TABLE IF NOT EXISTS redirects (
-                src TEXT PRIMARY KEY,
-                dst TEXT
-            );
+            INSERT INTO urls (id, status, local_path, depth, error_text)
+            SELECT k.id, o.status, o.local_path, o.depth, o.error_text
+            FROM urls_v1 o JOIN url_keys k ON k.url = o.url;
         """)
-        await self._conn.commit()
+        await self._conn.execute("""
+            INSERT INTO assets (url_id, local_path)
+            SELECT k.id, o.local_path FROM assets_v1 o JOIN url_keys k ON k.url = o.url;
+        """)
+        await self._conn.execute("""
+            INSERT INTO redirects (src_id, dst_id)
+            SELECT s.id, d.id FROM redirects_v1 o
+            JOIN url_keys s ON s.url = o.src
+            LEFT JOIN url_keys d ON d.url = o.dst;
+        """)
+        for table in ("urls", "assets", "redirects"):
+            await self._conn.execute(f"DROP TABLE {table}_v1;")
+        await self._fill_url_hosts()
+
+    async def _migrate_v2_to_v3(self) -> None:
+        """
+        Add the blobs table and the asset → blob reference. Assets cached
+        before v3 keep a NULL content_hash.
+        """
+        assert self._conn
+        await self._conn.execute("ALTER TABLE assets ADD COLUMN content_hash TEXT;")
+
+    async def _apply_policy(self) -> None:
+        """Reclassify every URL if the DB was last used with another policy."""
+        assert self._conn
+        cursor = await self._conn.execute("SELECT value FROM meta WHERE key = 'policy';")
+        row = await cursor.fetchone()
+        if row is not None and row[0] == self._policy.name:
+            return
+        logger.info(f"Classifying URLs for the {self._policy.name!r} scheduling policy")
+        async with self._lock:
+            await self._conn.execute(
+                "UPDATE urls SET url_class = url_class((SELECT url FROM url_keys WHERE id = urls.id));"
+            )
+            await self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('policy', ?);",
+                (self._policy.name,),
+            )
+            await self._conn.commit()
 
+    async def _fill_url_hosts(self) -> None:
+        """Copy each URL's host id into urls (0 when it has none)."""
+        assert self._conn
+        await self._conn.execute(
+            "UPDATE urls SET host_id = IFNULL((SELECT host_id FROM url_keys WHERE id = urls.id), 0);"
+        )
+
+    async def _migrate_v3_to_v4(self) -> None:
+        """
+        Add the pop priority (claims now order by priority, depth, id) and
+        the validators table.
+        """
+        assert self._conn
+        await self._conn.execute(
+            "ALTER TABLE urls ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;"
+        )
+        await self._conn.execute("DROP INDEX IF EXISTS urls_status_depth_idx;")
+
+    async def _migrate_v4_to_v5(self) -> None:
+        """
+        Add the URL class and host of scheduling policies (classes are
+        filled in on connect, by _apply_policy) and the meta table.
+        """
+        assert self._conn
+        await self._conn.execute(
+            "ALTER TABLE urls ADD COLUMN url_class INTEGER NOT NULL DEFAULT 0;"
+        )
+        await self._conn.execute(
+            "ALTER TABLE urls ADD COLUMN host_id INTEGER NOT NULL DEFAULT 0;"
+        )
+        await self._fill_url_hosts()
+        await self._conn.execute("DROP INDEX IF EXISTS urls_claim_idx;")
+
+    async def _migrate_v5_to_v6(self) -> None:
+        """Nothing to alter: the archive table is created from the schema."""
+
+    async def _migrate_v6_to_v7(self) -> None:
+        """Count the existing URLs per status; the triggers take over from here."""
+        await self._create_schema()
+        await self._recount_statuses()
+
+    async def _recount_statuses(self) -> None:
+        """
+        Rebuild status_counts from a full scan of urls.
+        Must be called with the lock held, inside the caller's transaction.
+        """
+        assert self._conn
+        await self._conn.execute(_RECOUNT_STATUSES)
+
+    async def _intern(self, urls: Iterable[str]) -> None:
+        """
+        Make sure every URL (and its host) has a row in url_keys.
+        Must be called with the lock held, inside the caller's transaction.
+        """
+        assert self._conn
+        pairs = [(url, url_host(url)) for url in urls]
+        hosts = {host for _, host in pairs if host is not None}
+        await self._conn.executemany(_INTERN_HOST, [(host,) for host in hosts])
+        await self._conn.executemany(_INTERN_URL, pairs)
+
+    @timed(DB_SECONDS, "reset_in_progress")
     async def reset_in_progress(self) -> None:
         """
         Reset any URLs left in 'in_progress' back to 'pending'.
@@ -66,65 +440,173 @@ class StateDB:
         """
         Add seed URLs at the given depth, without overwriting existing entries.
         """
-        assert self._conn
-        async with self._lock:
-            await self._conn.executemany(
-                "INSERT OR IGNORE INTO urls (url, status, depth) VALUES (?, 'pending', ?);",
-                [(url, depth) for url in urls],
-            )
-            await self._conn.commit()
+        await self.apply_batch(seeds=[(url, depth) for url in urls])
 
     async def pop_pending(self) -> Optional[Tuple[str, int]]:
         """
         Atomically pop the next pending URL and mark it in_progress.
         Returns a tuple (url, depth), or None if no pending URLs.
         """
+        claimed = await self.claim_pending(1)
+        return claimed[0][:2] if claimed else None
+
+    @timed(DB_SECONDS, "claim_pending")
+    async def claim_pending(self, limit: int) -> List[Tuple[str, int, int]]:
+        """
+        Atomically claim up to `limit` pending URLs in one transaction,
+        marking them in_progress. Returns a list of (url, depth, priority)
+        in pop order, as chosen by the scheduling policy: by URL class
+        (within quotas), then lowest priority value, depth and id; with
+        host fairness, hosts take turns.
+        """
         assert self._conn
         async with self._lock:
-            cursor = await self._conn.execute(
-                "SELECT url, depth FROM urls WHERE status='pending' ORDER BY depth, url LIMIT 1;"
+            try:
+                if self._policy.host_fairness:
+                    rows = await self._claim_round_robin(limit)
+                else:
+                    rows = await self._claim_block(limit)
+                await self._conn.commit()
+            except Exception:
+                await self._conn.rollback()
+                raise
+        return [(url, depth, priority) for _, url, depth, priority in rows]
+
+    async def _claim_block(self, limit: int, host: Optional[int] = None) -> List[Row]:
+        """
+        Mark up to `limit` pending URLs (of `host`, if given) in_progress,
+        picked by the policy from the first `limit` of each class.
+        Must be called with the lock held.
+        """
+        assert self._conn
+        classes = range(len(self._policy.classes))
+        where = "u.status = 'pending' AND u.url_class = ?" + (
+            "" if host is None else " AND u.host_id = ?"
+        )
+        # One index range per class, each read in pop order
+        part = f"""
+            SELECT * FROM (
+                SELECT u.id, k.url, u.depth, u.priority, u.url_class
+                FROM urls u JOIN url_keys k ON k.id = u.id
+                WHERE {where} ORDER BY u.priority, u.depth, u.id LIMIT ?
             )
-            row = await cursor.fetchone()
-            if row is None:
-                return None
-            url, depth = row
-            await self._conn.execute(
-                "UPDATE urls SET status='in_progress' WHERE url = ?;", (url,)
+        """
+        params: List[object] = []
+        for cls in classes:
+            params += [cls, limit] if host is None else [cls, host, limit]
+        cursor = await self._conn.execute(" UNION ALL ".join([part] * len(classes)), params)
+        candidates: List[List[Row]] = [[] for _ in classes]
+        for id_, url, depth, priority, cls in await cursor.fetchall():
+            candidates[cls].append((id_, url, depth, priority))
+        rows = self._policy.allocate(limit, candidates)
+        await self._conn.executemany(
+            "UPDATE urls SET status='in_progress' WHERE id = ?;", [(row[0],) for row in rows]
+        )
+        return rows
+
+    async def _claim_round_robin(self, limit: int) -> List[Row]:
+        """
+        Claim up to `limit` URLs in equal shares per host with pending URLs,
+        starting one host further on each call; hosts that fill their share
+        split what the others left. Rows are interleaved host by host.
+        Must be called with the lock held.
+        """
+        assert self._conn
+        cursor = await self._conn.execute(_PENDING_HOSTS)
+        hosts = [host for (host,) in await cursor.fetchall()]
+        if not hosts:
+            return []
+        start = self._host_cursor % len(hosts)
+        active = (hosts[start:] + hosts[:start])[:limit]
+        self._host_cursor = start + len(active)
+
+        claimed: Dict[int, List[Row]] = {host: [] for host in active}
+        remaining = limit
+        while active and remaining > 0:
+            share = math.ceil(remaining / len(active))
+            full = []
+            for host in active:
+                want = min(share, remaining)
+                if want <= 0:
+                    break
+                rows = await self._claim_block(want, host)
+                claimed[host] += rows
+                remaining -= len(rows)
+                if len(rows) == want:
+                    full.append(host)
+            active = full
+        return [row for turn in zip_longest(*claimed.values()) for row in turn if row is not None]
+
+    @timed(DB_SECONDS, "apply_batch")
+    async def apply_batch(
+        self,
+        seeds: Iterable[Tuple[str, int]] = (),
+        done: Iterable[Tuple[str, str]] = (),
+        errors: Iterable[Tuple[str, str]] = (),
+        requeue: Iterable[Tuple[str, int]] = (),
+    ) -> None:
+        """
+        Apply buffered frontier changes in a single transaction.
+
+        :param seeds: (url, depth) pairs to enqueue, ignoring known URLs
+        :param done: (url, local_path) pairs to mark done
+        :param errors: (url, error_text) pairs to mark errored
+        :param requeue: (url, priority) pairs of done URLs to crawl again
+        """
+        assert self._conn
+        seeds = list(seeds)
+        async with self._lock:
+            await self._intern(url for url, _ in seeds)
+            classify = self._policy.classify
+            await self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO urls (id, status, depth, url_class, host_id)
+                SELECT id, 'pending', ?, ?, IFNULL(host_id, 0) FROM url_keys WHERE url = ?;
+                """,
+                [(depth, classify(url), url) for url, depth in seeds],
+            )
+            await self._conn.executemany(
+                f"UPDATE urls SET status='done', local_path = ? WHERE id = {_URL_ID};",
+                [(local_path, url) for url, local_path in done],
+            )
+            await self._conn.executemany(
+                f"UPDATE urls SET status='error', error_text = ? WHERE id = {_URL_ID};",
+                [(error_text, url) for url, error_text in errors],
+            )
+            await self._conn.executemany(
+                f"""
+                UPDATE urls SET status='pending', priority = ?
+                WHERE id = {_URL_ID} AND status = 'done';
+                """,
+                [(priority, url) for url, priority in requeue],
             )
             await self._conn.commit()
-            return url, depth
 
     async def mark_done(self, url: str, local_path: str) -> None:
         """
         Mark the URL as done and record its local file path.
         """
-        assert self._conn
-        await self._conn.execute(
-            "UPDATE urls SET status='done', local_path = ? WHERE url = ?;",
-            (local_path, url),
-        )
-        await self._conn.commit()
+        await self.apply_batch(done=[(url, local_path)])
 
     async def record_error(self, url: str, error_text: str) -> None:
         """
         Mark the URL as errored and record the error message.
         """
-        assert self._conn
-        await self._conn.execute(
-            "UPDATE urls SET status='error', error_text = ? WHERE url = ?;",
-            (error_text, url),
-        )
-        await self._conn.commit()
+        await self.apply_batch(errors=[(url, error_text)])
 
+    @timed(DB_SECONDS, "add_redirect")
     async def add_redirect(self, src: str, dst: str) -> None:
         """
         Record a redirect from src → dst.
         """
         assert self._conn
-        await self._conn.execute(
-            "INSERT OR IGNORE INTO redirects (src, dst) VALUES (?, ?);", (src, dst)
-        )
-        await self._conn.commit()
+        async with self._lock:
+            await self._intern([src, dst])
+            await self._conn.execute(
+                f"INSERT OR IGNORE INTO redirects (src_id, dst_id) VALUES ({_URL_ID}, {_URL_ID});",
+                (src, dst),
+            )
+            await self._conn.commit()
 
     async def resolve(self, src: str) -> str:
         """
@@ -138,7 +620,11 @@ class StateDB:
                 break
             visited.add(current)
             cursor = await self._conn.execute(
-                "SELECT dst FROM redirects WHERE src = ?;", (current,)
+                f"""
+                SELECT d.url FROM redirects r JOIN url_keys d ON d.id = r.dst_id
+                WHERE r.src_id = {_URL_ID};
+                """,
+                (current,),
             )
             row = await cursor.fetchone()
             if row is None:
@@ -152,17 +638,134 @@ class StateDB:
         Returns False if the URL was already cached, True otherwise.
         """
         assert self._conn
+        async with self._lock:
+            await self._intern([url])
+            cursor = await self._conn.execute(
+                f"INSERT OR IGNORE INTO assets (url_id, local_path) VALUES ({_URL_ID}, ?);",
+                (url, local_path),
+            )
+            await self._conn.commit()
+            return cursor.rowcount > 0
+
+    @timed(DB_SECONDS, "release_claimed")
+    async def release_claimed(self, urls: Iterable[str]) -> None:
+        """
+        Put claimed (in_progress) URLs back to pending, e.g. when the
+        worker they were handed to is gone. Other URLs are left alone.
+        """
+        assert self._conn
+        async with self._lock:
+            await self._conn.executemany(
+                f"UPDATE urls SET status='pending' WHERE id = {_URL_ID} AND status = 'in_progress';",
+                [(url,) for url in urls],
+            )
+            await self._conn.commit()
+
+    async def requeue_done(self, urls: Iterable[str], priority: int = 0) -> None:
+        """
+        Put done URLs back in the queue with the given priority (lower
+        pops first). URLs that are not done are left alone.
+        """
+        await self.apply_batch(requeue=[(url, priority) for url in urls])
+
+    @timed(DB_SECONDS, "get_validators")
+    async def get_validators(self, url: str) -> Optional[Validators]:
+        """
+        Return the validators recorded for a page's last download, or None.
+        """
+        assert self._conn
         cursor = await self._conn.execute(
-            "SELECT 1 FROM assets WHERE url = ?;", (url,)
+            f"""
+            SELECT v.etag, v.last_modified, v.content_hash, v.size, u.local_path
+            FROM validators v LEFT JOIN urls u ON u.id = v.url_id
+            WHERE v.url_id = {_URL_ID};
+            """,
+            (url,),
         )
-        exists = await cursor.fetchone()
-        if exists:
-            return False
-        await self._conn.execute(
-            "INSERT INTO assets (url, local_path) VALUES (?, ?);", (url, local_path)
+        row = await cursor.fetchone()
+        return Validators(*row) if row else None
+
+    @timed(DB_SECONDS, "set_validators")
+    async def set_validators(
+        self, rows: Iterable[Tuple[str, Optional[str], Optional[str], str, int]]
+    ) -> None:
+        """
+        Record validators for downloaded pages in one transaction.
+
+        :param rows: (url, etag, last_modified, content_hash, size) tuples
+        """
+        assert self._conn
+        async with self._lock:
+            await self._conn.executemany(
+                f"""
+                INSERT OR REPLACE INTO validators
+                    (url_id, etag, last_modified, content_hash, size)
+                VALUES ({_URL_ID}, ?, ?, ?, ?);
+                """,
+                [(url, etag, modified, h, size) for url, etag, modified, h, size in rows],
+            )
+            await self._conn.commit()
+
+    async def validator_totals(self) -> Tuple[int, int]:
+        """
+        Return (pages with validators, sum of their sizes): what a full
+        re-crawl of the known pages would download.
+        """
+        assert self._conn
+        cursor = await self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM validators;"
         )
-        await self._conn.commit()
-        return True
+        return tuple(await cursor.fetchone())
+
+    @timed(DB_SECONDS, "record_asset")
+    async def record_asset(
+        self, url: str, local_path: str, content_hash: str, size: int
+    ) -> bool:
+        """
+        Record that an asset URL was saved to local_path with the given
+        content hash (replacing any earlier record for the URL).
+        Returns True if these bytes were not stored before.
+        """
+        assert self._conn
+        async with self._lock:
+            await self._intern([url])
+            cursor = await self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, size) VALUES (?, ?);",
+                (content_hash, size),
+            )
+            new_blob = cursor.rowcount > 0
+            await self._conn.execute(
+                f"""
+                INSERT OR REPLACE INTO assets (url_id, local_path, content_hash)
+                VALUES ({_URL_ID}, ?, ?);
+                """,
+                (url, local_path, content_hash),
+            )
+            await self._conn.commit()
+            return new_blob
+
+    async def get_asset_hash(self, url: str) -> Optional[str]:
+        """
+        Get the content hash recorded for an asset URL, or None.
+        """
+        assert self._conn
+        cursor = await self._conn.execute(
+            f"SELECT content_hash FROM assets WHERE url_id = {_URL_ID};", (url,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def blob_stats(self) -> Tuple[int, int, int]:
+        """
+        Return (asset URLs, distinct blobs, bytes stored in blobs).
+        """
+        assert self._conn
+        cursor = await self._conn.execute("""
+            SELECT (SELECT COUNT(*) FROM assets WHERE content_hash IS NOT NULL),
+                   COUNT(*), COALESCE(SUM(size), 0)
+            FROM blobs;
+        """)
+        return tuple(await cursor.fetchone())
 
     async def get_asset(self, url: str) -> Optional[str]:
         """
@@ -170,18 +773,189 @@ class StateDB:
         """
         assert self._conn
         cursor = await self._conn.execute(
-            "SELECT local_path FROM assets WHERE url = ?;", (url,)
+            f"SELECT local_path FROM assets WHERE url_id = {_URL_ID};", (url,)
         )
         row = await cursor.fetchone()
         return row[0] if row else None
 
-    async def pending_count(self) -> int:
+    @timed(DB_SECONDS, "record_archived")
+    async def record_archived(
+        self, rows: Iterable[Tuple[str, str, int, int, Optional[str]]]
+    ) -> None:
         """
-        Return the number of URLs still in 'pending' state.
+        Index archived responses: (url, WARC file, offset, length, content
+        hash) rows, replacing earlier records of the same URLs.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        assert self._conn
+        async with self._lock:
+            await self._intern(row[0] for row in rows)
+            await self._conn.executemany(
+                f"INSERT OR REPLACE INTO archive VALUES ({_URL_ID}, ?, ?, ?, ?);", rows
+            )
+            await self._conn.commit()
+
+    async def archive_location(self, url: str) -> Optional[Tuple[str, int, int]]:
+        """(WARC file, offset, length) of the archived response for `url`, or None."""
+        assert self._conn
+        cursor = await self._conn.execute(
+            f"SELECT file, offset, length FROM archive WHERE url_id = {_URL_ID};", (url,)
+        )
+        row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+    async def archived_by_hash(self, content_hash: str) -> Optional[Tuple[str, str, int, int]]:
+        """
+        (url, WARC file, offset, length) of an archived response with this
+        content hash, or None.
         """
         assert self._conn
         cursor = await self._conn.execute(
-            "SELECT COUNT(*) FROM urls WHERE status = 'pending';"
+            """
+            SELECT k.url, a.file, a.offset, a.length FROM archive a
+            JOIN url_keys k ON k.id = a.url_id WHERE a.content_hash = ? LIMIT 1;
+            """,
+            (content_hash,),
         )
-        (count,) = await cursor.fetchone()
-        return count
+        row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+    async def iter_urls(
+        self, after_id: int = 0, chunk_size: int = 10000
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Yield (id, url) for every row of the urls table with id > after_id,
+        in id order, reading `chunk_size` rows per query.
+        """
+        assert self._conn
+        last = after_id
+        while True:
+            cursor = await self._conn.execute(
+                """
+                SELECT u.id, k.url FROM urls u JOIN url_keys k ON k.id = u.id
+                WHERE u.id > ? ORDER BY u.id LIMIT ?;
+                """,
+                (last, chunk_size),
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            last = rows[-1][0]
+
+    async def iter_archived(
+        self, chunk_size: int = 10000
+    ) -> AsyncIterator[List[Tuple[str, str, bool, str, int, int]]]:
+        """
+        Yield the archive index of finished URLs in lists of up to
+        `chunk_size` (url, local path, is asset, WARC file, offset, length) rows.
+        """
+        assert self._conn
+        last = 0
+        while True:
+            cursor = await self._conn.execute(
+                """
+                SELECT a.url_id, k.url, u.local_path, s.url_id IS NOT NULL,
+                       a.file, a.offset, a.length
+                FROM archive a JOIN url_keys k ON k.id = a.url_id JOIN urls u ON u.id = a.url_id
+                LEFT JOIN assets s ON s.url_id = a.url_id
+                WHERE a.url_id > ? AND u.status = 'done' ORDER BY a.url_id LIMIT ?;
+                """,
+                (last, chunk_size),
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return
+            yield [(url, path, bool(asset), *location) for _, url, path, asset, *location in rows]
+            last = rows[-1][0]
+
+    async def max_url_id(self) -> int:
+        """
+        Return the highest id in the urls table, or 0 if it is empty.
+        """
+        assert self._conn
+        cursor = await self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM urls;")
+        (max_id,) = await cursor.fetchone()
+        return max_id
+
+    async def pending_count(self) -> int:
+        """
+        Return the number of URLs still in 'pending' state.
+        """
+        return (await self.status_counts())["pending"]
+
+    async def status_counts(self) -> Dict[str, int]:
+        """
+        Return the number of URLs in each status (every one of STATUSES).
+        Read from the trigger-maintained counts, so it does not scan urls;
+        a DB older than schema 7 (opened read-only) is counted the slow way.
+        """
+        assert self._conn
+        counts = dict.fromkeys(STATUSES, 0)
+        version = await self.schema_version()
+        if version >= 7:
+            query = "SELECT status, count FROM status_counts;"
+        elif version:
+            query = "SELECT status, COUNT(*) FROM urls GROUP BY status;"
+        else:
+            return counts
+        cursor = await self._conn.execute(query)
+        counts.update(await cursor.fetchall())
+        return counts
+
+    async def merge_from(self, other: Path) -> None:
+        """
+        Copy every row of another state DB (same schema version) into this
+        one, re-interning its URLs; rows for URLs already here are
+        replaced. Used to combine the per-shard DBs of a multi-process crawl.
+        """
+        assert self._conn
+        src = StateDB(other, self._policy)
+        await src.connect()   # brings it to the current schema (and policy) first
+        await src.close()
+        # url_keys ids differ per file: map them through the URL text
+        mapped = "JOIN src.url_keys k ON k.id = {col} JOIN url_keys m ON m.url = k.url"
+        async with self._lock:
+            await self._conn.execute("ATTACH DATABASE ? AS src;", (str(other),))
+            try:
+                await self._conn.executescript(
+                    f"""
+                    BEGIN;
+                    INSERT OR IGNORE INTO hosts (name) SELECT name FROM src.hosts;
+                    INSERT OR IGNORE INTO url_keys (url, host_id)
+                        SELECT k.url, (SELECT id FROM hosts WHERE name = h.name)
+                        FROM src.url_keys k LEFT JOIN src.hosts h ON h.id = k.host_id;
+                    INSERT OR REPLACE INTO urls
+                        (id, status, local_path, depth, error_text, priority, url_class, host_id)
+                        SELECT m.id, s.status, s.local_path, s.depth, s.error_text, s.priority,
+                               s.url_class, IFNULL(m.host_id, 0)
+                        FROM src.urls s {mapped.format(col="s.id")};
+                    INSERT OR REPLACE INTO validators
+                        (url_id, etag, last_modified, content_hash, size)
+                        SELECT m.id, s.etag, s.last_modified, s.content_hash, s.size
+                        FROM src.validators s {mapped.format(col="s.url_id")};
+                    INSERT OR IGNORE INTO blobs (hash, size) SELECT hash, size FROM src.blobs;
+                    INSERT OR REPLACE INTO assets (url_id, local_path, content_hash)
+                        SELECT m.id, s.local_path, s.content_hash
+                        FROM src.assets s {mapped.format(col="s.url_id")};
+                    INSERT OR REPLACE INTO archive (url_id, file, offset, length, content_hash)
+                        SELECT m.id, s.file, s.offset, s.length, s.content_hash
+                        FROM src.archive s {mapped.format(col="s.url_id")};
+                    INSERT OR REPLACE INTO redirects (src_id, dst_id)
+                        SELECT m.id, (SELECT d.id FROM url_keys d
+                                      JOIN src.url_keys sd ON sd.url = d.url
+                                      WHERE sd.id = s.dst_id)
+                        FROM src.redirects s {mapped.format(col="s.src_id")};
+                    {_RECOUNT_STATUSES}
+                    COMMIT;
+                    """
+                )
+            except Exception:
+                if self._conn.in_transaction:
+                    await self._conn.rollback()
+                raise
+            finally:
+                await self._conn.execute("DETACH DATABASE src;")
@@ -0,0 +1,328 @@
+# storage/warc.py
+
+"""
+WARC output: responses appended to rolling WARC files instead of being
+written into the mirror tree one file each.
+
+Each record is its own gzip member, so a record can be read back alone
+from its (file, offset, length), which the StateDB keeps in its archive
+table: reads mmap the file and decompress one slice, no scanning. Pages
+are archived as downloaded (before link rewriting), so any mirror layout
+can be produced from an archive later (see core/export.py). An asset
+whose bytes were archived before is written as a small revisit record
+and indexed at the first copy.
+
+Files are named <writer>-NNNNN.warc.gz, one writer per crawl process, and
+each run starts a new file, so a crash never leaves a half-written record
+in the middle of a file.
+"""
+
+from __future__ import annotations
+import asyncio
+import base64
+import hashlib
+import logging
+import mimetypes
+import mmap
+import os
+import tempfile
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterable, BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from forum_backup_crawler.storage.assets import StoredAsset, _write_chunk
+from forum_backup_crawler.storage.state_db import StateDB
+
+logger = logging.getLogger(__name__)
+
+# Folder inside output_dir that holds the WARC files
+WARC_DIR = "warc"
+CHUNK_SIZE = 1 << 20
+_REVISIT_PROFILE = "http://netpreserve.org/warc/1.1/revisit/identical-payload-digest"
+
+
+class ArchiveLocation(NamedTuple):
+    """Where a record is: WARC file name (in the WARC folder), offset and length."""
+    file: str
+    offset: int
+    length: int
+
+
+class WarcRecord(NamedTuple):
+    """A record read back by WarcReader."""
+    headers: Dict[str, str]         # WARC headers
+    status: int                     # HTTP status of the archived response
+    http_headers: Dict[str, str]
+    body: bytes                     # payload (empty for a revisit record)
+
+
+def payload_digest(content_hash: str) -> str:
+    """WARC-Payload-Digest value for a sha256 hex digest."""
+    return "sha256:" + base64.b32encode(bytes.fromhex(content_hash)).decode("ascii")
+
+
+def http_head(status: int, headers: Iterable[Tuple[str, str]]) -> bytes:
+    """The status line and header block of an archived HTTP response."""
+    lines = [f"HTTP/1.1 {status} {'OK' if status == 200 else ''}".rstrip()]
+    lines += [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", "replace")
+
+
+class WarcWriter:
+    """
+    Appends records to <directory>/<writer>-NNNNN.warc.gz, starting a new
+    file once one reaches `segment_size` bytes. Blocking; not thread-safe.
+    """
+
+    def __init__(self, directory: Path, writer: str, segment_size: int = 1 << 30) -> None:
+        """
+        :param directory: Folder of the WARC files
+        :param writer: File-name prefix of this writing process
+        :param segment_size: Bytes after which a new file is started
+        """
+        self.directory = directory
+        self.writer = writer
+        self.segment_size = segment_size
+        directory.mkdir(parents=True, exist_ok=True)
+        existing = sorted(directory.glob(f"{writer}-*.warc.gz"))
+        self._number = int(existing[-1].name[len(writer) + 1:].split(".")[0]) if existing else 0
+        self._file: Optional[BinaryIO] = None
+        self._name = ""
+
+    def _open_next(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._number += 1
+        self._name = f"{self.writer}-{self._number:05d}.warc.gz"
+        self._file = open(self.directory / self._name, "ab")
+        fields = b"software: forum-backup-crawler\r\nformat: WARC File Format 1.1\r\n"
+        self._write("warcinfo", None, fields, [], content_type="application/warc-fields")
+
+    def _write(
+        self,
+        warc_type: str,
+        url: Optional[str],
+        head: bytes,
+        extra: List[Tuple[str, str]],
+        body: Union[bytes, Path] = b"",
+        content_type: str = "application/http;msgtype=response",
+    ) -> ArchiveLocation:
+        body_size = body.stat().st_size if isinstance(body, Path) else len(body)
+        headers = [
+            ("WARC-Type", warc_type),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")),
+        ]
+        if url is not None:
+            headers.append(("WARC-Target-URI", url))
+        headers += extra
+        headers += [("Content-Type", content_type), ("Content-Length", str(len(head) + body_size))]
+        warc_head = "WARC/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers) + "\r\n"
+
+        f = self._file
+        offset = f.tell()
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+        f.write(gz.compress(warc_head.encode("utf-8") + head))
+        if isinstance(body, Path):
+            with open(body, "rb") as src:
+                while chunk := src.read(CHUNK_SIZE):
+                    f.write(gz.compress(chunk))
+        else:
+            f.write(gz.compress(body))
+        f.write(gz.compress(b"\r\n\r\n"))
+        f.write(gz.flush())
+        return ArchiveLocation(self._name, offset, f.tell() - offset)
+
+    def write_response(
+        self,
+        url: str,
+        status: int,
+        headers: Iterable[Tuple[str, str]],
+        body: Union[bytes, Path],
+        content_hash: str,
+    ) -> ArchiveLocation:
+        """
+        Archive a response.
+
+        :param headers: HTTP headers to record (Content-Length is added)
+        :param body: The payload, or a file holding it
+        :param content_hash: sha256 hex digest of the payload
+        """
+        if self._file is None or self._file.tell() >= self.segment_size:
+            self._open_next()
+        size = body.stat().st_size if isinstance(body, Path) else len(body)
+        head = http_head(status, [*headers, ("Content-Length", str(size))])
+        return self._write(
+            "response", url, head, [("WARC-Payload-Digest", payload_digest(content_hash))], body
+        )
+
+    def write_revisit(
+        self, url: str, refers_to: str, headers: Iterable[Tuple[str, str]], content_hash: str
+    ) -> ArchiveLocation:
+        """Archive a response whose payload is that of the earlier record for `refers_to`."""
+        if self._file is None or self._file.tell() >= self.segment_size:
+            self._open_next()
+        return self._write("revisit", url, http_head(200, headers), [
+            ("WARC-Profile", _REVISIT_PROFILE),
+            ("WARC-Refers-To-Target-URI", refers_to),
+            ("WARC-Payload-Digest", payload_digest(content_hash)),
+        ])
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class WarcReader:
+    """
+    Reads records by location. Files are mmapped and kept open (up to
+    `max_open`, least recently used closed first); a file that grew since
+    it was mapped is mapped again.
+    """
+
+    def __init__(self, directory: Path, max_open: int = 64) -> None:
+        self.directory = directory
+        self._max_open = max_open
+        self._maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+
+    def _map(self, name: str, end: int) -> mmap.mmap:
+        mapped = self._maps.get(name)
+        if mapped is not None and len(mapped) >= end:
+            self._maps.move_to_end(name)
+            return mapped
+        if mapped is not None:
+            mapped.close()
+        with open(self.directory / name, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[name] = mapped
+        self._maps.move_to_end(name)
+        while len(self._maps) > self._max_open:
+            self._maps.popitem(last=False)[1].close()
+        return mapped
+
+    def read(self, location: Tuple[str, int, int]) -> WarcRecord:
+        """The record at (file, offset, length)."""
+        name, offset, length = location
+        data = zlib.decompress(self._map(name, offset + length)[offset:offset + length], 31)
+        head, _, block = data.partition(b"\r\n\r\n")
+        lines = head.decode("utf-8").split("\r\n")
+        if not lines[0].startswith("WARC/"):
+            raise ValueError(f"No WARC record at {name}:{offset}")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        block = block[:int(headers["Content-Length"])]
+        if not headers.get("Content-Type", "").startswith("application/http"):
+            return WarcRecord(headers, 0, {}, block)
+        response_head, _, body = block.partition(b"\r\n\r\n")
+        response_lines = response_head.decode("latin-1").split("\r\n")
+        status = int(response_lines[0].split()[1])
+        http_headers = dict(line.split(": ", 1) for line in response_lines[1:])
+        return WarcRecord(headers, status, http_headers, body)
+
+    def close(self) -> None:
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps.clear()
+
+
+class WarcStore:
+    """
+    The "warc" output backend of a crawl: pages and assets go into WARC
+    files under `directory`, indexed in the StateDB's archive table.
+    Writes happen in a thread, one at a time.
+    """
+
+    def __init__(self, db: StateDB, directory: Path, writer: str, segment_size: int = 1 << 30) -> None:
+        self._db = db
+        self._writer = WarcWriter(directory, writer, segment_size)
+        self._tmp_dir = directory / "tmp"
+        self._lock = asyncio.Lock()
+        self.records = 0
+        self.revisits = 0
+
+    async def save_asset(
+        self, url: str, chunks: AsyncIterable[bytes], local_path: Path
+    ) -> StoredAsset:
+        """
+        Stream a download to a temp file, then archive it, or, if the same
+        bytes are archived already, a revisit record pointing to them.
+
+        :param local_path: Mirror path the asset is exported to
+        """
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp_dir)
+        tmp = Path(tmp_name)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    await asyncio.to_thread(_write_chunk, f, hasher, chunk)
+                    size += len(chunk)
+            content_hash = hasher.hexdigest()
+            content_type, _ = mimetypes.guess_type(local_path.name)
+            headers = [("Content-Type", content_type or "application/octet-stream")]
+            original = await self._db.archived_by_hash(content_hash)
+            async with self._lock:
+                if original is None:
+                    location = await asyncio.to_thread(
+                        self._writer.write_response, url, 200, headers, tmp, content_hash
+                    )
+                else:
+                    await asyncio.to_thread(
+                        self._writer.write_revisit, url, original[0], headers, content_hash
+                    )
+                    location = ArchiveLocation(*original[1:])
+                    self.revisits += 1
+                self.records += 1
+            await self._db.record_archived([(url, *location, content_hash)])
+        finally:
+            tmp.unlink(missing_ok=True)
+        return StoredAsset(content_hash, size, local_path)
+
+    async def save_pages(
+        self, pages: Iterable[Tuple[str, str, str, str, List[Tuple[str, str]]]]
+    ) -> Dict[str, str]:
+        """
+        Archive downloaded pages: (url, final URL, HTML, content hash, HTTP
+        headers) tuples, indexed under the requested URL. Returns
+        {url: error} for pages that could not be written.
+        """
+        pages = list(pages)
+        async with self._lock:
+            rows, failed = await asyncio.to_thread(self._write_pages, pages)
+        await self._db.record_archived(rows)
+        return failed
+
+    def _write_pages(self, pages) -> Tuple[List[tuple], Dict[str, str]]:
+        rows, failed = [], {}
+        for url, final_url, html, content_hash, headers in pages:
+            try:
+                location = self._writer.write_response(
+                    final_url, 200,
+                    [("Content-Type", "text/html; charset=utf-8"), *headers],
+                    html.encode("utf-8"), content_hash,
+                )
+            except OSError as e:
+                logger.error(f"Could not archive {url}: {e}")
+                failed[url] = str(e)
+                continue
+            rows.append((url, *location, content_hash))
+        self.records += len(rows)
+        self._writer.flush()
+        return rows, failed
+
+    async def close(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._writer.close)
+
+    def stats(self) -> dict:
+        """Counters for reporting: records written, of which revisits."""
+        return {"records": self.records, "revisits": self.revisits}
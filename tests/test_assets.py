@@ -0,0 +1,55 @@
+# tests/test_assets.py
+
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from forum_backup_crawler.storage.assets import AssetStore
+
+
+async def _chunks(data, size=7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@pytest.mark.asyncio
+async def test_save_streams_hashes_and_links(tmp_path):
+    store = AssetStore(tmp_path)
+    data = bytes(range(256)) * 40
+    stored = await store.save(_chunks(data), Path("f.example", "img", "a.png"))
+
+    assert stored.content_hash == hashlib.sha256(data).hexdigest()
+    assert stored.size == len(data)
+    target = tmp_path / stored.local_path
+    assert target.read_bytes() == data
+    assert os.path.samefile(target, store.blob_path(stored.content_hash))
+
+
+@pytest.mark.asyncio
+async def test_identical_bytes_are_stored_once(tmp_path):
+    store = AssetStore(tmp_path)
+    avatar = b"\x89PNG avatar bytes" * 100
+    first = await store.save(_chunks(avatar), Path("a", "u1.png"))
+    second = await store.save(_chunks(avatar, 64), Path("a", "u2.png"))
+    other = await store.save(_chunks(b"other"), Path("a", "u3.png"))
+
+    assert first.content_hash == second.content_hash != other.content_hash
+    blobs = [p for p in store.blob_dir.rglob("*") if p.is_file()]
+    assert len(blobs) == 2
+    assert os.path.samefile(tmp_path / first.local_path, tmp_path / second.local_path)
+
+
+@pytest.mark.asyncio
+async def test_failed_download_leaves_no_files(tmp_path):
+    store = AssetStore(tmp_path)
+
+    async def broken():
+        yield b"partial"
+        raise ConnectionError("reset by peer")
+
+    with pytest.raises(ConnectionError):
+        await store.save(broken(), Path("a", "x.zip"))
+    assert not (tmp_path / "a" / "x.zip").exists()
+    assert [p for p in store.blob_dir.rglob("*") if p.is_file()] == []
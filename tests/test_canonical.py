@@ -0,0 +1,77 @@
+# tests/test_canonical.py
+
+import re
+from pathlib import Path
+
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.processing.html_rewriter import rewrite_page
+from forum_backup_crawler.storage.canonical import CanonicalRules, TrapDetector, canonicalize
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+FIXTURES = Path(__file__).parent / "fixtures" / "pages"
+RULES = Settings(start_urls=["https://f.example/"], output_dir=Path("out")).canonical_rules()
+
+
+def test_url_variants_share_one_canonical_url():
+    variants = [
+        "https://f.example/viewtopic?t=12",
+        "HTTPS://F.Example:443/viewtopic?t=12#entry98001",
+        "https://f.example/viewtopic?t=12&highlight=decal",
+        "https://f.example/viewtopic?sid=9f1c2d&t=12",
+        "https://f.example/viewtopic?t=12&start=0",
+        "https://f.example/viewtopic?t=12&PHPSESSID=abc&",
+    ]
+    assert {canonicalize(url, RULES) for url in variants} == {"https://f.example/viewtopic?t=12"}
+    # Parameters are sorted by name, kept values untouched
+    assert canonicalize("https://f.example/search?q=a%20b&author=x+y", RULES) == (
+        "https://f.example/search?author=x+y&q=a%20b"
+    )
+    assert canonicalize("https://f.example/viewtopic?t=12&start=15", RULES) == (
+        "https://f.example/viewtopic?start=15&t=12"
+    )
+    assert canonicalize("http://f.example", RULES) == "http://f.example/"
+    unsorted = CanonicalRules.build(sort_query=False)
+    assert canonicalize("https://f.example/s?q=1&a=2", unsorted) == "https://f.example/s?q=1&a=2"
+
+
+def test_trap_detector_drops_and_counts_traps():
+    traps = TrapDetector(year=2026)
+    urls = {
+        "https://f.example/t12-topic": None,
+        "https://f.example/calendar?m=10&y=2026": None,
+        "https://f.example/calendar?m=1&y=2028": "calendar",
+        "https://f.example/calendar?date=1971-01-01": "calendar",
+        "https://f.example/a/b/a/b/a/b/a/b": "path_repeat",
+        "https://f.example/" + "/".join(f"d{i}" for i in range(20)): "path_depth",
+        "https://f.example/search?" + "&".join(f"p{i}=1" for i in range(11)): "query_params",
+        "https://f.example/search?search_id=newposts&start=150000": "page_offset",
+        "https://f.example/t12p150000-topic": None,
+        "https://f.example/?q=" + "x" * 2000: "url_length",
+    }
+    assert {url: traps.check(url) for url in urls} == urls
+
+    kept = traps.filter(urls)
+    assert kept == [url for url, reason in urls.items() if reason is None]
+    assert traps.stats() == {
+        "checked": len(urls),
+        "trapped": {
+            "calendar": 2, "path_repeat": 1, "path_depth": 1,
+            "query_params": 1, "page_offset": 1, "url_length": 1,
+        },
+    }
+    assert TrapDetector(max_segment_repeat=None).check("https://f.example/a/a/a/a/a") is None
+
+
+def test_rewriter_links_variants_to_the_canonical_page():
+    url = "https://ng.example.org/viewtopic.php?f=2&t=10&start=15"
+    html = (FIXTURES / "phpbb_viewtopic.html").read_text(encoding="utf-8")
+    plain = rewrite_page(html, url, PathMapper(Path("."), hosts=["ng.example.org"]).rules)
+    mapper = PathMapper(Path("."), hosts=["ng.example.org"], canonical=RULES)
+    result = rewrite_page(html, url, mapper.rules)
+
+    assert result.canonicalized > 0 and plain.canonicalized == 0
+    assert not any("sid=" in link for link in result.links + result.assets)
+    assert "https://ng.example.org/viewtopic.php?f=2&t=10" in result.links
+    # Links point at the files the canonical URLs are stored in
+    assert 'href="viewtopic.php_f=2&amp;t=10.html"' in result.html
+    assert not re.search(r'href="[^"]*sid=', result.html)
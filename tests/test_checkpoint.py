@@ -0,0 +1,84 @@
+# tests/test_checkpoint.py
+
+import pytest
+
+from forum_backup_crawler.core.checkpoint import (
+    CHECKPOINT_FILE,
+    Checkpointer,
+    load_checkpoint,
+    restore,
+    verify_checkpoint,
+)
+from forum_backup_crawler.network.rate_limit import AdaptiveLimiter, HostLimiterRegistry
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.seen_filter import SeenFilter, open_seen_filter
+from forum_backup_crawler.storage.state_db import StateDB
+
+
+def _registry():
+    return HostLimiterRegistry(
+        lambda host: AdaptiveLimiter(base_delay=0.5, min_delay=0.1, max_delay=5.0, max_workers=8)
+    )
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_restores_cursor_limiters_and_seen_filter(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(["https://a.example/", "https://b.example/"])
+    seen_path = tmp_path / "state.seen"
+    seen = await open_seen_filter(db, seen_path, 100, 0.001)
+    frontier = Frontier(db, seen=seen)
+    limiters = _registry()
+    await limiters.restore({"a.example": {"delay": 2.0, "workers": 3}})
+    db.host_cursor = 5
+
+    checkpointer = Checkpointer(tmp_path, db, frontier, limiters, seen_path, interval=0)
+    await frontier.add_seed_urls(["https://a.example/t1"])
+    await checkpointer.close()
+    await db.close()
+    assert (tmp_path / CHECKPOINT_FILE).exists() and seen_path.exists()
+
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    checkpoint = load_checkpoint(tmp_path)
+    assert checkpoint.max_url_id == 3
+    limiters = _registry()
+    await restore(checkpoint, db, limiters)
+    assert db.host_cursor == 5
+    assert limiters.state() == {"a.example": {"delay": 2.0, "workers": 3}}
+    # The saved filter covers the whole DB: nothing is loaded from it again
+    assert SeenFilter.load(seen_path).last_id == 3
+    seen = await open_seen_filter(db, seen_path, 100, 0.001)
+    assert "https://a.example/t1" in seen and seen.count == 3
+    assert await verify_checkpoint(db, Frontier(db, seen=seen))
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_limiter_state_is_clamped_and_bad_checkpoints_ignored(tmp_path):
+    limiters = _registry()
+    await limiters.restore({"a.example": {"delay": 60.0, "workers": 100}})
+    assert limiters.state()["a.example"] == {"delay": 5.0, "workers": 8}
+
+    assert load_checkpoint(tmp_path) is None
+    (tmp_path / CHECKPOINT_FILE).write_text("{not json", encoding="utf-8")
+    assert load_checkpoint(tmp_path) is None
+
+
+@pytest.mark.asyncio
+async def test_inconsistent_seen_filter_is_dropped(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls([f"https://f.example/t{i}" for i in range(50)])
+    seen_path = tmp_path / "state.seen"
+    # A filter claiming to cover the DB without knowing its URLs
+    stale = SeenFilter(100, 0.001)
+    stale.last_id = 50
+    stale.save(seen_path)
+
+    seen = await open_seen_filter(db, seen_path, 100, 0.001)
+    frontier = Frontier(db, seen=seen)
+    assert not await verify_checkpoint(db, frontier, seen_path, samples=4)
+    assert frontier.seen_filter is None and not seen_path.exists()
+    await db.close()
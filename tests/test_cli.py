@@ -0,0 +1,63 @@
+# tests/test_cli.py
+
+import json
+
+import pytest
+
+from forum_backup_crawler.benchmarks.bench_startup import cheap_commands, heavy_imports, import_times
+from forum_backup_crawler.cli import load_settings, main
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core import export
+
+
+def test_config_show_round_trips_with_overrides(tmp_path, capsys):
+    config = tmp_path / "config.toml"
+    config.write_text(
+        f'start_urls = ["https://f.example/"]\noutput_dir = "{tmp_path.as_posix()}/out"\n',
+        encoding="utf-8",
+    )
+    main([
+        "config", "show", str(config),
+        "--set", "processes=3", "--set", "user_agent=my bot", "--set", 'strip_params=["sid"]',
+    ])
+    shown = tmp_path / "shown.toml"
+    shown.write_text(capsys.readouterr().out, encoding="utf-8")
+
+    settings = Settings.from_file(shown)
+    assert settings.processes == 3 and settings.user_agent == "my bot"
+    assert settings.strip_params == ["sid"]
+    assert settings.temp_dir == tmp_path / "out" / "temp"
+    assert settings.to_toml() == load_settings(shown).to_toml()
+
+    with pytest.raises(SystemExit, match="name=value"):
+        load_settings(config, ["processes"])
+    with pytest.raises(SystemExit, match="Invalid settings"):
+        load_settings(config, ["processes=many"])
+
+
+def test_stats_prints_the_metrics_snapshot(tmp_path, capsys):
+    args = cheap_commands(tmp_path)["stats"]
+    (tmp_path / "out" / "temp" / "metrics.json").write_text(json.dumps({
+        "time": 0,
+        "metrics": {"fbc_pages_total": 12, "fbc_requests_total": {"status=200": 3}},
+    }), encoding="utf-8")
+    main(args[2:])
+    assert capsys.readouterr().out.splitlines() == [
+        "fbc_pages_total 12",
+        "fbc_requests_total{status=200} 3",
+    ]
+
+
+def test_cheap_commands_skip_heavy_imports(tmp_path):
+    for args in cheap_commands(tmp_path).values():
+        _, modules = import_times(args, tmp_path)
+        assert "forum_backup_crawler.config" in modules
+        assert heavy_imports(modules) == []
+
+
+def test_export_module_runs_the_cli_command(tmp_path):
+    args = cheap_commands(tmp_path)["stats"]
+    # Settings are loaded the CLI's way, --set included
+    missing = tmp_path / "elsewhere"
+    with pytest.raises(SystemExit, match="elsewhere"):
+        export.main([args[-1], "--set", f'temp_dir="{missing.as_posix()}"'])
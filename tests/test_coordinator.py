@@ -0,0 +1,143 @@
+# tests/test_coordinator.py
+
+import asyncio
+import sqlite3
+import sys
+
+import aiohttp
+import pytest
+
+from forum_backup_crawler.benchmarks.fake_forum import ForumSpec, serve
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.coordinator import Coordinator, RemoteFrontier
+from forum_backup_crawler.storage.state_db import StateDB
+
+# A worker node: run() with coordinator_url set, in its own interpreter
+WORKER = (
+    "import asyncio, sys\n"
+    "from forum_backup_crawler.config import Settings\n"
+    "from forum_backup_crawler.core.scheduler import run\n"
+    "asyncio.run(run(Settings.parse_raw(sys.argv[1])))\n"
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _post(session, url, **body):
+    async with session.post(url, json=body) as resp:
+        return await resp.json()
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_is_reassigned(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(["https://f.example/a", "https://f.example/b"])
+    clock = FakeClock()
+    coordinator = Coordinator(db, lease_ttl=10, clock=clock)
+    await coordinator.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            url = coordinator.url
+            first = await _post(session, f"{url}/lease", worker="w1", max=10)
+            assert sorted(u for u, _ in first["urls"]) == ["https://f.example/a", "https://f.example/b"]
+            # Nothing left to lease, but w1 may still find links
+            assert await _post(session, f"{url}/lease", worker="w2", max=10) == {"retry_after": 0.5}
+
+            clock.now = 5
+            assert await _post(session, f"{url}/renew", worker="w1", leases=[first["lease"]]) == {"lost": []}
+            clock.now = 12
+            assert await coordinator.expire_leases() == 0
+            clock.now = 16
+            assert await coordinator.expire_leases() == 2
+
+            second = await _post(session, f"{url}/lease", worker="w2", max=10)
+            assert sorted(second["urls"]) == sorted(first["urls"])
+            renewed = await _post(session, f"{url}/renew", worker="w1", leases=[first["lease"]])
+            assert renewed == {"lost": [first["lease"]]}
+
+            await _post(
+                session, f"{url}/report", worker="w2",
+                done=[["https://f.example/a", "a.html"]],
+                errors=[["https://f.example/b", "HTTP 500"]],
+                seeds=[["https://f.example/c", 1]],
+            )
+            third = await _post(session, f"{url}/lease", worker="w2", max=10)
+            assert third["urls"] == [["https://f.example/c", 1]]
+            await _post(session, f"{url}/report", worker="w2", done=[["https://f.example/c", "c.html"]])
+            assert await _post(session, f"{url}/lease", worker="w2", max=10) == {"finished": True}
+        # w1 was last heard from at t=16: wait for it to hear about the end, or time out
+        clock.now = 30
+        await asyncio.wait_for(coordinator.wait_finished(), 5)
+    finally:
+        await coordinator.close()
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_workers_crawl_fake_forum_through_coordinator(tmp_path):
+    spec = ForumSpec(
+        forums=2, topics_per_forum=3, topics_per_page=2, posts_per_topic=20,
+        users=4, avatars=2, attachment_kb=1,
+    )
+    async with serve(spec) as base_url:
+        db = StateDB(tmp_path / "state.db")
+        await db.connect()
+        await db.add_seed_urls([base_url + "/"])
+        coordinator = Coordinator(db, lease_ttl=1.0)
+        await coordinator.start()
+
+        # A worker that leases the start page and dies: its lease must be reassigned
+        ghost = RemoteFrontier(coordinator.url, worker="ghost")
+        await ghost.start()
+        assert await ghost.pop_pending() == (base_url + "/", 0)
+        for task in ghost._tasks:
+            task.cancel()
+
+        workers = []
+        for i in range(2):
+            settings = Settings(
+                start_urls=[base_url + "/"],
+                output_dir=tmp_path / "out",
+                temp_dir=tmp_path / f"worker-{i}",
+                coordinator_url=coordinator.url,
+                lease_size=8,
+                rate_limiter="token_bucket",
+                rate_limit_rate=1000.0,
+                rate_limit_burst=50,
+                depth_limit=100,
+                parse_workers=0,
+                pipeline_report_interval=0,
+                metrics_snapshot_interval=0,
+            )
+            workers.append(await asyncio.create_subprocess_exec(
+                sys.executable, "-c", WORKER, settings.json()
+            ))
+        try:
+            await asyncio.wait_for(coordinator.wait_finished(), 120)
+            codes = await asyncio.wait_for(asyncio.gather(*(w.wait() for w in workers)), 30)
+        finally:
+            for worker in workers:
+                if worker.returncode is None:
+                    worker.kill()
+            await ghost._session.close()
+            await coordinator.close()
+            await db.close()
+
+    assert codes == [0, 0]
+    assert coordinator.stats.expired == 1
+    assert coordinator.stats.snapshot()["workers"] == 3
+    conn = sqlite3.connect(str(tmp_path / "state.db"))
+    statuses = dict(conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status;"))
+    conn.close()
+    assert set(statuses) == {"done"}
+
+    site = tmp_path / "out" / base_url.split("//")[1].replace(":", "_")
+    pages = [p for p in site.rglob("*.html") if "download" not in p.parts]
+    assert len(pages) == spec.page_count()
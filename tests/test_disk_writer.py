@@ -0,0 +1,96 @@
+# tests/test_disk_writer.py
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from forum_backup_crawler.core.pipeline import Pipeline
+from forum_backup_crawler.storage.disk_writer import DiskWriter
+from forum_backup_crawler.storage.page_store import PageStore
+from forum_backup_crawler.tests.test_pipeline import _context
+from forum_backup_crawler.utils.timeit import REGISTRY
+
+
+@pytest.mark.asyncio
+async def test_files_are_replaced_atomically_and_synced_in_groups(tmp_path, monkeypatch):
+    disk = DiskWriter(threads=2, fsync_interval=60)
+    mkdirs = []
+    real_mkdir = type(tmp_path).mkdir
+
+    def mkdir(path, *args, **kwargs):
+        mkdirs.append(path)
+        real_mkdir(path, *args, **kwargs)
+
+    monkeypatch.setattr(type(tmp_path), "mkdir", mkdir)
+    target = tmp_path / "f.example" / "t1-topic.html"
+    jobs = [await disk.submit(disk.write_file, target, f"v{i}".encode()) for i in range(5)]
+    jobs.append(await disk.submit(disk.write_file, tmp_path / "f.example" / "t2-topic.html", b"t2"))
+    await asyncio.gather(*jobs)
+
+    assert target.read_bytes() in {f"v{i}".encode() for i in range(5)}
+    assert sorted(p.name for p in target.parent.iterdir()) == ["t1-topic.html", "t2-topic.html"]
+    # The folder was created once per thread at most, not once per file
+    assert 1 <= len(mkdirs) <= 2
+    assert disk.sync() == 2 and disk.sync() == 0
+    await disk.close()
+    stats = disk.stats()
+    assert (stats["files"], stats["bytes"], stats["syncs"]) == (6, 12, 1)
+
+
+@pytest.mark.asyncio
+async def test_submit_waits_only_when_the_queue_is_full(tmp_path):
+    disk = DiskWriter(threads=1, queue_size=2)
+    started = time.monotonic()
+    await disk.submit(time.sleep, 0.2)
+    await disk.submit(time.sleep, 0.2)
+    assert time.monotonic() - started < 0.1
+    await disk.submit(time.sleep, 0)
+    assert time.monotonic() - started >= 0.2
+    await disk.close()
+
+
+class SlowPageStore(PageStore):
+    def _put(self, local_path, data):
+        time.sleep(0.05)
+        super()._put(local_path, data)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_writes_through_the_disk_writer(tmp_path):
+    ctx = await _context(tmp_path)
+    ctx.disk = DiskWriter(threads=4)
+    ctx.pages = SlowPageStore(ctx.settings.output_dir, disk=ctx.disk)
+    pipeline = Pipeline(ctx, None, fetchers=3, parsers=2, persist_batch=1, report_interval=0)
+    await pipeline.run()
+    await ctx.disk.close()
+    await ctx.frontier.close()
+
+    out = ctx.settings.output_dir / "f.example"
+    assert 'href="t1-topic.html"' in (out / "f1-forum.html").read_text(encoding="utf-8")
+    assert ctx.disk.stats()["files"] == 5
+    assert pipeline.snapshot()["persist"]["processed"] == 5
+    assert await ctx.db.pending_count() == 0
+    await ctx.db.close()
+
+
+@pytest.mark.asyncio
+async def test_unopenable_paths_do_not_fail_the_sync(tmp_path, monkeypatch):
+    # Windows raises PermissionError when opening a folder
+    real_open = os.open
+
+    def open_files_only(path, flags, *args):
+        if os.path.isdir(path):
+            raise PermissionError(13, "Permission denied", str(path))
+        return real_open(path, flags, *args)
+
+    monkeypatch.setattr(os, "open", open_files_only)
+    disk = DiskWriter(threads=2, fsync_interval=60)
+    await disk.start()
+    synced = REGISTRY.snapshot()["fbc_fsync_seconds"]["count"]
+    await (await disk.submit(disk.write_file, tmp_path / "a" / "t1.html", b"t1"))
+    await disk.close()
+    # Synced from a writer thread, recorded on the loop
+    assert disk.stats()["syncs"] == 1
+    assert REGISTRY.snapshot()["fbc_fsync_seconds"]["count"] == synced + 1
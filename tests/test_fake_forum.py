@@ -0,0 +1,86 @@
+# tests/test_fake_forum.py
+
+import sqlite3
+
+import pytest
+
+from forum_backup_crawler.benchmarks.fake_forum import ForumSpec, serve
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.scheduler import run
+
+
+@pytest.mark.asyncio
+async def test_full_crawl_of_fake_forum_mirrors_every_page(tmp_path):
+    # Fewer members than posts: each profile is still linked, and counted
+    spec = ForumSpec(
+        forums=2, topics_per_forum=3, topics_per_page=2, posts_per_topic=20,
+        users=50, avatars=2, attachment_kb=1,
+    )
+    async with serve(spec) as base_url:
+        settings = Settings(
+            start_urls=[base_url + "/"],
+            output_dir=tmp_path / "out",
+            temp_dir=tmp_path / "temp",
+            rate_limiter="token_bucket",
+            rate_limit_rate=1000.0,
+            rate_limit_burst=50,
+            depth_limit=100,
+            parse_workers=0,
+            pipeline_report_interval=0,
+        )
+        stages = await run(settings)
+
+    conn = sqlite3.connect(str(settings.temp_dir / "state.db"))
+    (errors,) = conn.execute("SELECT COUNT(*) FROM urls WHERE status = 'error';").fetchone()
+    (blobs,) = conn.execute("SELECT COUNT(*) FROM blobs;").fetchone()
+    conn.close()
+    assert errors == 0
+    # Attachments are all distinct; avatars are shared between members
+    assert blobs == spec.avatars + spec.attachment_count()
+
+    site = settings.output_dir / base_url.split("//")[1].replace(":", "_")
+    pages = [p for p in site.rglob("*.html") if "download" not in p.parts]
+    assert len(pages) == spec.page_count()
+    # Pagination links are rewritten to the mirrored files
+    (topic,) = site.glob("t1-*.html")
+    assert 'href="t1p15-' in topic.read_text(encoding="utf-8")
+    assert stages["parse"]["processed"] >= spec.page_count()
+
+
+@pytest.mark.asyncio
+async def test_sharded_crawl_matches_single_process_crawl(tmp_path):
+    spec = ForumSpec(
+        forums=2, topics_per_forum=3, topics_per_page=2, posts_per_topic=20,
+        users=4, avatars=2, attachment_kb=1,
+    )
+    async with serve(spec) as base_url:
+        settings = Settings(
+            start_urls=[base_url + "/"],
+            output_dir=tmp_path / "out",
+            temp_dir=tmp_path / "temp",
+            processes=2,
+            rate_limiter="token_bucket",
+            rate_limit_rate=1000.0,
+            rate_limit_burst=50,
+            depth_limit=100,
+            pipeline_report_interval=0,
+            metrics_snapshot_interval=0,
+        )
+        stages = await run(settings)
+
+    # The shards' DBs are merged into the usual state.db
+    conn = sqlite3.connect(str(settings.temp_dir / "state.db"))
+    statuses = dict(conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status;"))
+    (blobs,) = conn.execute("SELECT COUNT(*) FROM blobs;").fetchone()
+    conn.close()
+    assert set(statuses) == {"done"}
+    assert blobs == spec.avatars + spec.attachment_count()
+
+    site = settings.output_dir / base_url.split("//")[1].replace(":", "_")
+    pages = [p for p in site.rglob("*.html") if "download" not in p.parts]
+    assert len(pages) == spec.page_count()
+    assert stages["parse"]["processed"] >= spec.page_count()
+
+    # Resuming needs the same number of shards
+    with pytest.raises(ValueError):
+        await run(settings.copy(update={"processes": 3}))
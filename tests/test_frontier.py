@@ -0,0 +1,133 @@
+# tests/test_frontier.py
+
+import asyncio
+import multiprocessing
+import queue
+import pytest
+
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.core.sharding import ShardLink, shard_of
+
+
+async def _open_db(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.reset_in_progress()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_pops_in_depth_order_and_claims_in_blocks(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.add_seed_urls(["b", "c"], depth=1)
+    await db.add_seed_urls(["a"], depth=0)
+
+    frontier = Frontier(db, block_size=2)
+    assert await frontier.pop_pending() == ("a", 0)
+    # The first block claimed "a" and "b"; only "c" is still pending in the DB
+    assert await db.pending_count() == 1
+    assert await frontier.pop_pending() == ("b", 1)
+    assert await frontier.pop_pending() == ("c", 1)
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_is_batched_until_flush(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.add_seed_urls(["a"], depth=0)
+
+    frontier = Frontier(db, max_buffered=100)
+    url, depth = await frontier.pop_pending()
+    await frontier.add_seed_urls(["x", "y"], depth + 1)
+    await frontier.mark_done(url, "a.html")
+
+    # Nothing has reached SQLite yet
+    assert await db.pending_count() == 0
+    assert frontier.buffered == 3
+
+    await frontier.flush()
+    assert frontier.buffered == 0
+    assert await db.pending_count() == 2
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_buffered_state_is_recovered_after_crash(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.add_seed_urls(["a", "b"], depth=0)
+
+    frontier = Frontier(db)
+    await frontier.pop_pending()
+    await frontier.mark_done("a", "a.html")
+    # Simulate a crash: the buffered 'done' never gets flushed
+    await db.reset_in_progress()
+    assert await db.pending_count() == 2
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_pop_waits_for_in_flight_urls(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.add_seed_urls(["a"], depth=0)
+    frontier = Frontier(db)
+
+    assert await frontier.pop_pending() == ("a", 0)
+    waiter = asyncio.create_task(frontier.pop_pending())
+    await asyncio.sleep(0.01)
+    # Still waiting: "a" may yet discover links
+    assert not waiter.done()
+
+    await frontier.add_seed_urls(["b"], 1)
+    await frontier.mark_done("a", "a.html")
+    assert await asyncio.wait_for(waiter, 1) == ("b", 1)
+
+    await frontier.mark_done("b", "b.html")
+    assert await frontier.pop_pending() is None
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_the_batch_buffered(tmp_path):
+    db = await _open_db(tmp_path)
+    await db.add_seed_urls(["a"], depth=0)
+    frontier = Frontier(db, max_buffered=100)
+    url, depth = await frontier.pop_pending()
+    await frontier.add_seed_urls(["x"], depth + 1)
+    await frontier.mark_done(url, "a.html")
+
+    apply_batch = db.apply_batch
+
+    async def fail(*args):
+        raise OSError("disk full")
+    db.apply_batch = fail
+    with pytest.raises(OSError):
+        await frontier.flush()
+    assert frontier.buffered == 2
+
+    db.apply_batch = apply_batch
+    await frontier.add_seed_urls(["y"], depth + 1)
+    await frontier.flush()
+    assert frontier.buffered == 0
+    assert await db.status_counts() == {"pending": 2, "in_progress": 0, "done": 1, "error": 0}
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_sharded_close_adds_queued_batches_and_frees_the_reader(tmp_path):
+    db = await _open_db(tmp_path)
+    link = ShardLink(
+        index=0, count=2, inboxes=[queue.Queue(), queue.Queue()],
+        sent=multiprocessing.Value("q", 0), received=multiprocessing.Value("q", 0),
+        idle=[0, 0], results=None,
+    )
+    own = next(f"https://f.example/t{i}" for i in range(100) if shard_of(f"https://f.example/t{i}", 2) == 0)
+    link.inboxes[0].put(("seed", {1: [own]}))
+
+    frontier = link.frontier(db)
+    await frontier.start()
+    # No end marker from a coordinator: close must not hang on the inbox reader
+    await asyncio.wait_for(frontier.close(), timeout=5)
+    assert link.received.value == 1
+    assert await db.pending_count() == 1
+    await db.close()
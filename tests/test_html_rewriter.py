@@ -0,0 +1,49 @@
+# tests/test_html_rewriter.py
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from forum_backup_crawler.processing.html_rewriter import rewrite_page, RewriteResult
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+PAGE = """<html><head>
+<link rel="stylesheet" href="/css/forum.css"><link rel="canonical" href="/t1-topic">
+<style>body { background: url('/img/bg.png') }</style>
+</head><body>
+<a href="/t2-other#p9">next</a>
+<a href="https://elsewhere.example/">out</a>
+<a href="javascript:void(0)">js</a>
+<img src="https://cdn.example/avatar.png" srcset="/a.png 1x, /b.png 2x">
+<div style="background:url(/c.gif)"></div>
+</body></html>"""
+
+
+def test_rewrites_links_and_resources(tmp_path):
+    mapper = PathMapper(tmp_path, hosts=["f.example"])
+    html, links, assets, _ = rewrite_page(PAGE, "https://f.example/t1-topic", mapper.rules)
+
+    assert 'href="t2-other.html#p9"' in html
+    assert 'href="css/forum.css"' in html
+    assert "url('img/bg.png')" in html
+    assert 'src="../cdn.example/avatar.png"' in html
+    assert 'srcset="a.png 1x, b.png 2x"' in html
+    assert "url(c.gif)" in html
+    # Out-of-scope pages and non-HTTP links are left alone
+    assert 'href="https://elsewhere.example/"' in html
+    assert 'href="javascript:void(0)"' in html
+
+    assert links == ["https://f.example/t1-topic", "https://f.example/t2-other"]
+    assert "https://cdn.example/avatar.png" in assets
+    assert "https://f.example/css/forum.css" in assets
+    assert "https://elsewhere.example/" not in links + assets
+    assert len(assets) == len(set(assets))
+
+
+def test_rewrite_page_runs_in_process_pool(tmp_path):
+    rules = PathMapper(tmp_path, hosts=["f.example"]).rules
+    assert pickle.loads(pickle.dumps(rules)) == rules
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result = pool.submit(rewrite_page, PAGE, "https://f.example/t1-topic", rules).result()
+    assert isinstance(result, RewriteResult)
+    assert result == rewrite_page(PAGE, "https://f.example/t1-topic", rules)
@@ -0,0 +1,129 @@
+# tests/test_http_client.py
+
+import asyncio
+
+import pytest
+from aiohttp import web
+from aioresponses import aioresponses
+
+from forum_backup_crawler.network.http_client import (
+    CONNECTIONS, HTTPClient, PoolConfig, parse_retry_after,
+)
+from forum_backup_crawler.network.rate_limit import HostLimiterRegistry
+
+
+class RecordingLimiter:
+    """Records what HTTPClient reports after each response."""
+
+    def __init__(self):
+        self.calls = []
+        self.latencies = []
+
+    async def before_request(self):
+        self.calls.append("before")
+
+    async def after_response(self, status, retry_after=None, latency=None):
+        self.calls.append((status, retry_after, latency is not None))
+        self.latencies.append(latency)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # in the past
+    assert 3500 < parse_retry_after("Fri, 01 Jan 2100 00:00:00 GMT")
+
+
+@pytest.mark.asyncio
+async def test_fetch_passes_status_and_retry_after_to_limiter():
+    limiter = RecordingLimiter()
+    client = HTTPClient(HostLimiterRegistry(lambda host: limiter), "test-agent")
+    await client.start()
+    with aioresponses() as m:
+        m.get("https://f.example/busy", status=429, body="slow down",
+              headers={"Retry-After": "7"})
+        m.get("https://f.example/img.png", status=200, body=b"\x89PNG")
+        status, _, _ = await client.fetch_text("https://f.example/busy")
+        assert status == 429
+        status, data = await client.fetch_bytes("https://f.example/img.png")
+        assert (status, data) == (200, b"\x89PNG")
+        # Unregistered URL: a network error still releases the slot
+        status, _, _ = await client.fetch_text("https://f.example/missing")
+        assert status == 0
+    await client.close()
+    assert limiter.calls == [
+        "before", (429, 7.0, True),
+        "before", (200, None, True),
+        "before", (0, None, True),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_streams_non_html_bodies_to_sink():
+    client = HTTPClient(HostLimiterRegistry(lambda host: RecordingLimiter()), "test-agent")
+    await client.start()
+    received = []
+
+    async def sink(final_url, chunks):
+        received.append((final_url, b"".join([chunk async for chunk in chunks])))
+
+    with aioresponses() as m:
+        m.get("https://f.example/a.png", status=200, body=b"\x89PNG", content_type="image/png")
+        m.get("https://f.example/t1", status=200, body="<p>hi</p>", content_type="text/html")
+        assert await client.fetch_text("https://f.example/a.png", sink=sink) == (
+            200, None, "https://f.example/a.png"
+        )
+        status, text, _ = await client.fetch_text("https://f.example/t1", sink=sink)
+        assert (status, text) == (200, "<p>hi</p>")
+    await client.close()
+    assert received == [("https://f.example/a.png", b"\x89PNG")]
+
+
+@pytest.mark.asyncio
+async def test_failing_sink_propagates_and_limiter_sees_server_latency():
+    limiter = RecordingLimiter()
+    client = HTTPClient(HostLimiterRegistry(lambda host: limiter), "test-agent")
+    await client.start()
+
+    async def full_disk(final_url, chunks):
+        async for _ in chunks:
+            await asyncio.sleep(0.3)    # a slow disk
+        raise OSError(28, "No space left on device")
+
+    with aioresponses() as m:
+        m.get("https://f.example/big.zip", status=200, body=b"PK", content_type="application/zip")
+        with pytest.raises(OSError, match="No space"):
+            await client.fetch("https://f.example/big.zip", sink=full_disk)
+    await client.close()
+    # Not a network error, and the write is not counted as server time
+    assert limiter.calls == ["before", (200, None, True)]
+    assert limiter.latencies[0] < 0.3
+
+@pytest.mark.asyncio
+async def test_session_reuses_kept_alive_connections():
+    async def page(request):
+        return web.Response(text="<p>hi</p>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/t{n}", page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    new, reused = CONNECTIONS.labels("new").value, CONNECTIONS.labels("reused").value
+    client = HTTPClient(
+        HostLimiterRegistry(lambda host: RecordingLimiter()), "test-agent",
+        pool=PoolConfig(limit_per_host=1),
+    )
+    await client.start()
+    for n in range(3):
+        status, text, _ = await client.fetch_text(f"http://127.0.0.1:{port}/t{n}")
+        assert (status, text) == (200, "<p>hi</p>")
+    await client.close()
+    await runner.cleanup()
+
+    assert CONNECTIONS.labels("new").value - new == 1
+    assert CONNECTIONS.labels("reused").value - reused == 2
@@ -0,0 +1,96 @@
+# tests/test_page_store.py
+
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+from forum_backup_crawler.core.viewer import MirrorViewer
+from forum_backup_crawler.storage.page_store import (
+    PAGES_DIR, PageReader, PageStore, SegmentStore, get_codec, open_page_store,
+)
+
+PAGE = "<html><body>" + "<p>Olá, fórum!</p>" * 200 + "</body></html>"
+
+
+def test_compressed_files_are_read_back(tmp_path):
+    store = open_page_store(tmp_path, "files", "gzip")
+    store.write(Path("f.example", "t1-topic.html"), PAGE)
+    store.close()
+
+    assert (tmp_path / "f.example" / "t1-topic.html.gz").exists()
+    assert not (tmp_path / "f.example" / "t1-topic.html").exists()
+    assert store.stats()["ratio"] > 10
+    reader = PageReader(tmp_path)
+    assert reader.read(Path("f.example", "t1-topic.html")).decode("utf-8") == PAGE
+    assert reader.read(Path("f.example", "missing.html")) is None
+    reader.close()
+
+
+def test_segments_roll_over_and_keep_the_latest_copy(tmp_path):
+    store = SegmentStore(tmp_path, get_codec("gzip"), writer="w1", segment_size=1)
+    for i in range(3):
+        store.write(Path("f.example", f"t{i}-topic.html"), f"{PAGE}{i}")
+    store.flush()
+    store.close()
+    # Resuming continues the last (here: full) segment; a rewritten page replaces the old copy
+    store = SegmentStore(tmp_path, get_codec("none"), writer="w1", segment_size=1)
+    store.write(Path("f.example", "t0-topic.html"), "changed")
+    store.close()
+
+    segments = sorted(p.name for p in (tmp_path / PAGES_DIR / "w1").glob("seg-*.dat"))
+    assert segments == [f"seg-0000{i}.dat" for i in range(1, 5)]
+    assert not list(tmp_path.glob("f.example/*"))
+    reader = PageReader(tmp_path)
+    assert reader.read(Path("f.example", "t0-topic.html")) == b"changed"
+    assert reader.read(Path("f.example", "t2-topic.html")).decode("utf-8") == f"{PAGE}2"
+    reader.close()
+
+
+def test_zstd_dictionary_is_trained_and_used(tmp_path):
+    pytest.importorskip("zstandard")
+    store = open_page_store(tmp_path, "segments", "zstd", writer="w1", dict_samples=50)
+    pages = [f"<html><head><title>Topic {i}</title></head>{PAGE}<p>post {i * 7}</p></html>" for i in range(80)]
+    for i, page in enumerate(pages):
+        store.write(Path("f.example", f"t{i}-topic.html"), page)
+    store.close()
+
+    assert (tmp_path / PAGES_DIR / "w1" / "zstd.dict").exists()
+    reader = PageReader(tmp_path)
+    for i in (0, 79):
+        assert reader.read(Path("f.example", f"t{i}-topic.html")).decode("utf-8") == pages[i]
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_viewer_serves_compressed_and_plain_files(tmp_path):
+    store = open_page_store(tmp_path, "segments", "gzip", writer="w1")
+    store.write(Path("f.example", "index.html"), PAGE)
+    store.close()
+    PageStore(tmp_path).write(Path("f.example", "t1-topic.html"), "plain")
+    (tmp_path / "f.example" / "logo.png").write_bytes(b"\x89PNG")
+
+    viewer = MirrorViewer(tmp_path)
+    await viewer.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{viewer.url}/") as resp:
+                assert 'href="f.example/"' in await resp.text()
+            async with session.get(f"{viewer.url}/f.example/") as resp:
+                assert resp.headers["Content-Type"].startswith("text/html")
+                assert await resp.text() == PAGE
+            # Without gzip support the viewer decompresses
+            async with session.get(
+                f"{viewer.url}/f.example/index.html", headers={"Accept-Encoding": "identity"}
+            ) as resp:
+                assert "Content-Encoding" not in resp.headers
+                assert await resp.text() == PAGE
+            async with session.get(f"{viewer.url}/f.example/t1-topic.html") as resp:
+                assert await resp.text() == "plain"
+            async with session.get(f"{viewer.url}/f.example/logo.png") as resp:
+                assert resp.headers["Content-Type"] == "image/png"
+            for missing in ("f.example/t9-topic.html", f"{PAGES_DIR}/w1/index.db"):
+                async with session.get(f"{viewer.url}/{missing}") as resp:
+                    assert resp.status == 404
+    finally:
+        await viewer.close()
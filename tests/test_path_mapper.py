@@ -0,0 +1,73 @@
+# tests/test_path_mapper.py
+
+import posixpath
+from pathlib import Path
+
+import pytest
+
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+
+def test_pages_get_html_suffix_and_host_folder(tmp_path):
+    mapper = PathMapper(tmp_path)
+    assert mapper.url_to_path("https://f.example/") == Path("f.example/index.html")
+    assert mapper.url_to_path("https://f.example/t12-topic") == Path("f.example/t12-topic.html")
+    assert mapper.url_to_path("https://cdn.example/img/a.PNG") == Path("cdn.example/img/a.PNG")
+
+
+def test_query_is_folded_into_safe_file_name(tmp_path):
+    mapper = PathMapper(tmp_path)
+    path = mapper.url_to_path("https://f.example/search?q=a*b&start=50")
+    assert path == Path("f.example/search_q=a_b&start=50.html")
+
+
+def test_long_names_are_shortened_uniquely(tmp_path):
+    mapper = PathMapper(tmp_path)
+    a = mapper.url_to_path("https://f.example/t1-" + "a" * 300)
+    b = mapper.url_to_path("https://f.example/t1-" + "a" * 299 + "b")
+    assert a != b
+    assert len(a.name) <= 120 and len(b.name) <= 120
+
+
+def test_scope_and_relative_links(tmp_path):
+    mapper = PathMapper(tmp_path, hosts=["f.example"])
+    assert mapper.in_scope("https://f.example/t1")
+    assert not mapper.in_scope("https://other.example/t1")
+    assert not mapper.in_scope("mailto:a@f.example")
+
+    link = mapper.relative_link(
+        Path("f.example/f1/index.html"), Path("f.example/t 2.html"), "p5"
+    )
+    assert link == "../t%202.html#p5"
+
+
+def test_sharded_layout_spreads_files_and_links_still_resolve(tmp_path):
+    mapper = PathMapper(tmp_path, shard_levels=2, shard_fanout=16)
+    paths = [mapper.url_to_path(f"https://f.example/t{i}-topic") for i in range(2000)]
+    assert all(len(p.parts) == 4 and len(p.parts[1]) == len(p.parts[2]) == 1 for p in paths)
+    assert len({p.parent for p in paths}) == 256
+    assert paths[7].name == "t7-topic.html"
+
+    a = mapper.url_to_path("https://f.example/f1/index")
+    b = mapper.url_to_path("https://f.example/t2-topic")
+    link = mapper.relative_link(a, b, "p5")
+    assert link.endswith("#p5") and link.startswith("../../../")
+    assert posixpath.normpath(posixpath.join(a.parent.as_posix(), link[:-3])) == b.as_posix()
+
+    rebuilt = PathMapper.from_rules(mapper.rules)
+    assert rebuilt.url_to_path("https://f.example/t7-topic") == paths[7]
+    with pytest.raises(ValueError):
+        PathMapper(tmp_path, shard_levels=5, shard_fanout=256)
+
+
+def test_mappings_are_memoized(tmp_path):
+    mapper = PathMapper(tmp_path, cache_size=2)
+    for url in ("https://f.example/a", "https://f.example/b", "https://f.example/a"):
+        mapper.url_to_path(url)
+    mapper.relative_link(Path("f.example/x.html"), Path("f.example/a.html"))
+    mapper.relative_link(Path("f.example/y.html"), Path("f.example/a.html"))
+    assert mapper.cache_stats() == {
+        "paths": {"hits": 1, "misses": 2, "size": 2},
+        # Links are memoized per folder, not per page
+        "links": {"hits": 1, "misses": 1, "size": 1},
+    }
@@ -0,0 +1,197 @@
+# tests/test_pipeline.py
+
+import hashlib
+import sqlite3
+
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.scheduler import Context, run
+from forum_backup_crawler.core.pipeline import Pipeline
+from forum_backup_crawler.core.incremental import prepare_recrawl
+from forum_backup_crawler.network.http_client import FetchResult, HTTPClient
+from forum_backup_crawler.network.rate_limit import FixedLimiter, HostLimiterRegistry
+from forum_backup_crawler.storage.assets import AssetStore
+from forum_backup_crawler.storage.disk_writer import DiskWriter
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.path_mapper import PathMapper
+from forum_backup_crawler.storage.state_db import StateDB
+
+SITE = {
+    "https://f.example/": '<a href="/f1-forum">forum</a><a href="/f2-forum">forum 2</a>',
+    "https://f.example/f2-forum": '<a href="/t5-topic">t5</a>',
+    "https://f.example/t5-topic": 'old topic',
+    "https://f.example/f1-forum": '<a href="/t1-topic">t1</a><a href="/t2-topic">t2</a>',
+    "https://f.example/t1-topic": (
+        '<a href="/f1-forum">back</a>'
+        '<img src="https://cdn.example/u1.png"><img src="https://cdn.example/u2.png">'
+    ),
+}
+# The same avatar served under two URLs
+ASSETS = {
+    "https://cdn.example/u1.png": b"\x89PNG avatar",
+    "https://cdn.example/u2.png": b"\x89PNG avatar",
+}
+
+
+class StubClient:
+    """
+    Serves `site` (default SITE) and ASSETS from memory, with ETags;
+    unknown URLs are 404s.
+    """
+
+    def __init__(self, site=None):
+        self.site = site or SITE
+        self.requests = []
+
+    async def fetch(self, url, allow_redirects=True, sink=None, etag=None, last_modified=None):
+        self.requests.append(url)
+        if url in self.site:
+            tag = hashlib.md5(self.site[url].encode()).hexdigest()
+            if etag == tag:
+                return FetchResult(304, None, url)
+            return FetchResult(200, self.site[url], url, tag)
+        if url in ASSETS and sink is not None:
+            async def chunks():
+                yield ASSETS[url]
+            await sink(url, chunks())
+            return FetchResult(200, None, url)
+        return FetchResult(404, "not found", url)
+
+
+async def _context(tmp_path):
+    settings = Settings(start_urls=["https://f.example/"], output_dir=tmp_path / "out")
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(settings.start_urls)
+    frontier = Frontier(db)
+    mapper = PathMapper(settings.output_dir, hosts=["f.example"])
+    return Context(
+        settings, db, frontier, StubClient(),
+        HostLimiterRegistry(lambda host: FixedLimiter(0, 1)), mapper,
+        AssetStore(settings.output_dir),
+    )
+
+
+@pytest.mark.asyncio
+async def test_pipeline_crawls_site_in_process(tmp_path):
+    ctx = await _context(tmp_path)
+    pipeline = Pipeline(ctx, None, fetchers=3, parsers=2, queue_size=1, report_interval=0)
+    await pipeline.run()
+    await ctx.frontier.close()
+
+    out = ctx.settings.output_dir / "f.example"
+    assert (out / "index.html").exists()
+    assert 'href="t1-topic.html"' in (out / "f1-forum.html").read_text(encoding="utf-8")
+    # t2 is a 404: recorded as an error, not written
+    assert not (out / "t2-topic.html").exists()
+    assert await ctx.db.pending_count() == 0
+    # Both avatar URLs are mirrored, from a single stored blob
+    cdn = ctx.settings.output_dir / "cdn.example"
+    assert (cdn / "u1.png").read_bytes() == (cdn / "u2.png").read_bytes() == ASSETS["https://cdn.example/u1.png"]
+    assert await ctx.db.blob_stats() == (2, 1, len(ASSETS["https://cdn.example/u1.png"]))
+
+    snap = pipeline.snapshot()
+    assert snap["fetch"]["processed"] == 8
+    assert snap["parse"]["processed"] == 5
+    assert snap["persist"]["processed"] == 5
+    await ctx.db.close()
+
+
+@pytest.mark.asyncio
+async def test_asset_that_cannot_be_stored_is_a_storage_error(tmp_path):
+    ctx = await _context(tmp_path)
+
+    async def disk_full(chunks, local_path):
+        raise OSError(28, "No space left on device")
+    ctx.assets.save = disk_full
+    pipeline = Pipeline(ctx, None, fetchers=2, parsers=1, report_interval=0)
+    await pipeline.run()
+    await ctx.frontier.close()
+
+    conn = sqlite3.connect(str(tmp_path / "state.db"))
+    errors = dict(conn.execute(
+        "SELECT url, error_text FROM urls JOIN url_keys USING (id) WHERE status = 'error';"
+    ).fetchall())
+    conn.close()
+    assert errors["https://cdn.example/u1.png"].startswith("storage error")
+    assert errors["https://f.example/t2-topic"] != errors["https://cdn.example/u1.png"]
+    # The pages are still mirrored
+    assert (ctx.settings.output_dir / "f.example" / "t1-topic.html").exists()
+    await ctx.db.close()
+
+@pytest.mark.asyncio
+async def test_pipeline_parses_in_process_pool(tmp_path):
+    ctx = await _context(tmp_path)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        pipeline = Pipeline(ctx, executor, fetchers=2, parsers=2, report_interval=0)
+        await pipeline.run()
+    await ctx.frontier.close()
+
+    assert (ctx.settings.output_dir / "f.example" / "t1-topic.html").exists()
+    await ctx.db.close()
+
+
+@pytest.mark.asyncio
+async def test_incremental_recrawl_only_rechecks_changed_branches(tmp_path):
+    ctx = await _context(tmp_path)
+    await Pipeline(ctx, None, fetchers=2, parsers=1, report_interval=0).run()
+    await ctx.frontier.close()
+
+    # A new topic appears in f1-forum; everything else is unchanged
+    site = dict(SITE)
+    site["https://f.example/f1-forum"] += '<a href="/t3-topic">t3</a>'
+    site["https://f.example/t3-topic"] = "new topic"
+    ctx.client = StubClient(site)
+    stats = await prepare_recrawl(ctx.db, ctx.settings.start_urls)
+    assert stats.known_pages == 5
+    pipeline = Pipeline(ctx, None, fetchers=1, parsers=1, report_interval=0, incremental=stats)
+    await pipeline.run()
+    await ctx.frontier.close()
+
+    requests = ctx.client.requests
+    # Topic lists first, then t1 (linked from the changed f1-forum) and the new t3
+    assert set(requests[:3]) == {
+        "https://f.example/", "https://f.example/f1-forum", "https://f.example/f2-forum",
+    }
+    assert set(requests[3:]) == {"https://f.example/t1-topic", "https://f.example/t3-topic"}
+    assert (ctx.settings.output_dir / "f.example" / "t3-topic.html").exists()
+    # t5 was not re-checked: its forum did not change
+    assert (stats.checked, stats.not_modified, stats.changed) == (4, 3, 1)
+    assert stats.requests_saved == 1
+    assert stats.bytes_saved == stats.known_bytes - len(site["https://f.example/f1-forum"])
+    await ctx.db.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_run_and_flush_still_close_everything(tmp_path, monkeypatch):
+    closed = []
+
+    def spy(cls):
+        close = cls.close
+
+        async def recording_close(self):
+            closed.append(cls.__name__)
+            await close(self)
+        monkeypatch.setattr(cls, "close", recording_close)
+
+    async def crash(self):
+        raise RuntimeError("stage crashed")
+
+    async def disk_full(self):
+        raise OSError("disk full")
+
+    spy(DiskWriter)
+    spy(StateDB)
+    spy(HTTPClient)
+    monkeypatch.setattr(Pipeline, "run", crash)
+    # The final flush fails too: the later steps must still run
+    monkeypatch.setattr(Frontier, "flush", disk_full)
+    settings = Settings(
+        start_urls=["https://f.example/"], output_dir=tmp_path / "out", temp_dir=tmp_path / "temp",
+        parse_workers=0, pipeline_report_interval=0,
+    )
+    with pytest.raises(OSError, match="disk full"):
+        await run(settings)
+    assert closed == ["DiskWriter", "StateDB", "HTTPClient"]
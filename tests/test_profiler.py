@@ -0,0 +1,64 @@
+# tests/test_profiler.py
+
+import asyncio
+
+import pytest
+
+from forum_backup_crawler.utils.profiler import Profiler
+
+
+class Worker:
+    async def wait(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def spin(self, n):
+        return sum(range(n))
+
+
+@pytest.mark.asyncio
+async def test_hooks_count_calls_and_are_removed(tmp_path):
+    original = Worker.__dict__["wait"]
+    profiler = Profiler(tmp_path, dump_interval=0)
+    profiler.hook(Worker, "wait")
+    profiler.hook(Worker, "spin", label="spin")
+    assert Worker.__dict__["wait"] is not original
+
+    worker = Worker()
+    await worker.wait(0.02)
+    await worker.wait(0)
+    assert worker.spin(10) == 45
+
+    profiler.unhook()
+    assert Worker.__dict__["wait"] is original
+    summary = profiler.dump().read_text()
+    assert "Worker.wait" in summary
+    assert "spin" in summary
+    # calls, then total seconds
+    row = next(line for line in summary.splitlines() if "Worker.wait" in line).split()
+    assert row[1] == "2"
+    assert float(row[2]) >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_profiler_writes_collapsed_stacks_and_summary(tmp_path):
+    profiler = Profiler(tmp_path, dump_interval=0, sample_interval=0.002)
+    profiler.start()
+    task = asyncio.create_task(Worker().wait(0.2), name="waiter-1")
+    await asyncio.sleep(0.1)
+    await profiler.close()
+    await task
+
+    (tasks,) = tmp_path.glob("tasks-*.collapsed")
+    (cpu,) = tmp_path.glob("cpu-*.collapsed")
+    (summary,) = tmp_path.glob("summary-*.txt")
+    # The waiting task's await chain, numbered task names merged
+    stacks = tasks.read_text().splitlines()
+    assert any(
+        s.startswith("task:waiter;tests/test_profiler.py:wait;asyncio/tasks.py:sleep:")
+        for s in stacks
+    )
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert cpu.read_text().startswith("thread:")
+    assert "tests/test_profiler.py:wait" in summary.read_text()
+    # Nothing sampled after close: a new window is empty and not written
+    assert profiler.dump() is None
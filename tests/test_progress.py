@@ -0,0 +1,67 @@
+# tests/test_progress.py
+
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from forum_backup_crawler.cli import main
+from forum_backup_crawler.core.progress import ProgressTracker, format_eta, read_progress
+from forum_backup_crawler.storage.state_db import StateDB
+
+
+def test_rate_eta_and_error_rate_from_successive_counts():
+    now = [100.0]
+    tracker = ProgressTracker(clock=lambda: now[0])
+    first = tracker.update({"pending": 100, "in_progress": 0, "done": 0, "error": 0})
+    assert first.per_sec == 0 and first.eta is None
+
+    now[0] += 10
+    progress = tracker.update({"pending": 40, "in_progress": 10, "done": 45, "error": 5})
+    assert progress.per_sec == 5.0
+    assert progress.eta == 10.0 and format_eta(progress.eta) == "0m10s"
+    assert progress.error_rate == 0.1
+    assert "45 done, 40 pending, 10 in progress, 5 errors (10.0%)" in progress.summary()
+    assert format_eta(2 * 3600 + 5 * 60) == "2h05m"
+
+
+@pytest.mark.asyncio
+async def test_status_reads_a_running_crawl_read_only(tmp_path, capsys):
+    out = tmp_path / "out"
+    temp = out / "temp"
+    temp.mkdir(parents=True)
+    crawl = StateDB(temp / "state.db")
+    await crawl.connect()
+    await crawl.add_seed_urls(["https://f.example/", "https://f.example/t1"])
+    await crawl.apply_batch(done=[("https://f.example/", "index.html")])
+
+    progress = await read_progress(temp / "state.db", sample=0)
+    assert progress.counts == {"pending": 1, "in_progress": 0, "done": 1, "error": 0}
+    reader = StateDB(temp / "state.db")
+    await reader.connect(read_only=True)
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        await reader.add_seed_urls(["https://f.example/t2"])
+    await reader.close()
+
+    # The crawl keeps writing meanwhile
+    await crawl.apply_batch(done=[("https://f.example/t1", "t1.html")])
+    (temp / "metrics.json").write_text(json.dumps({"time": 0, "metrics": {
+        "fbc_limiter_delay_seconds": {"host=f.example": 0.5},
+        "fbc_limiter_workers": {"host=f.example": 4},
+    }}), encoding="utf-8")
+    config = tmp_path / "config.toml"
+    config.write_text(
+        f'start_urls = ["https://f.example/"]\noutput_dir = "{out.as_posix()}"\n', encoding="utf-8"
+    )
+    # The CLI runs its own event loop
+    await asyncio.to_thread(main, ["status", str(config), "--sample", "0"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("URLs:     2 done, 0 pending") and "ETA 0m00s" in lines[0]
+    assert lines[1] == "Limiters: f.example 0.50s x4"
+    await crawl.close()
+
+    with pytest.raises(SystemExit, match="not found"):
+        await asyncio.to_thread(
+            main, ["status", str(config), "--set", f'temp_dir="{tmp_path.as_posix()}/none"']
+        )
@@ -1,6 +1,30 @@
 import asyncio
+import multiprocessing
 import pytest
-from forum_backup_crawler.network.rate_limit import AdaptiveLimiter, FixedLimiter
+from forum_backup_crawler.network.rate_limit import (
+    AdaptiveLimiter,
+    FixedLimiter,
+    HostLimiterRegistry,
+    SharedTokenBucket,
+    TokenBucketLimiter,
+    get_limiter,
+)
+
+
+class FakeClock:
+    """Manual clock: sleep() advances time instantly and records the wait."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
 
 @pytest.mark.asyncio
 async def test_fixed_limiter_keeps_delay_and_workers():
@@ -15,16 +39,203 @@ async def test_fixed_limiter_keeps_delay_and_workers():
 
 @pytest.mark.asyncio
 async def test_adaptive_backoff_and_recovery():
-    lim = AdaptiveLimiter(base_delay=0.1, min_delay=0.05, max_delay=1.0, max_workers=5)
+    clock = FakeClock()
+    lim = AdaptiveLimiter(
+        base_delay=0.1, min_delay=0.05, max_delay=1.0, max_workers=5,
+        clock=clock, sleep=clock.sleep,
+    )
     # simulate a 429
     await lim.before_request()
     await lim.after_response(429)
     assert lim.current_delay == 0.2  # doubled
-    assert lim.current_workers == 4  # one fewer
+    assert lim.current_workers == 2  # halved (multiplicative decrease)
 
-    # simulate 30 successes to speed up
-    for _ in range(30):
+    # each streak of 30 successes adds a worker back (additive increase)
+    for _ in range(90):
         await lim.before_request()
         await lim.after_response(200)
-    assert lim.current_delay == 0.1  # back toward base (but not below min)
-    assert lim.current_workers == 5  # back to max_workers
+    assert lim.current_delay == pytest.approx(0.05)  # not below min_delay
+    assert lim.current_workers == 5  # back to max_workers, not beyond
+
+def _bucket(rate, burst, clock):
+    return TokenBucketLimiter(rate, burst, clock=clock, sleep=clock.sleep)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_paces():
+    clock = FakeClock()
+    lim = _bucket(rate=2.0, burst=3, clock=clock)
+    for _ in range(3):
+        await lim.before_request()
+    assert clock.sleeps == []  # burst served immediately
+    await lim.before_request()
+    await lim.before_request()
+    assert clock.sleeps == [0.5, 0.5]  # then one request every 1/rate
+    assert clock.now == 1.0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_refills_while_idle_up_to_burst():
+    clock = FakeClock()
+    lim = _bucket(rate=1.0, burst=2, clock=clock)
+    await lim.before_request()
+    await lim.before_request()
+    assert lim.tokens == 0
+    clock.now += 10  # idle much longer than burst/rate
+    assert lim.tokens == 2
+    await lim.before_request()
+    await lim.before_request()
+    assert clock.sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_queues_concurrent_requests_in_order():
+    clock = FakeClock()
+    lim = _bucket(rate=4.0, burst=1, clock=clock)
+    # Reservations made at the same instant wait 0, 1/4, 2/4, 3/4 s
+    waits = [lim.reserve() for _ in range(4)]
+    assert waits == [0.0, 0.25, 0.5, 0.75]
+    assert lim.tokens == -3
+
+
+def _drain_shared(bucket, count, out):
+    out.put([bucket.reserve() for _ in range(count)])
+
+
+def test_shared_token_bucket_is_one_budget_across_processes():
+    ctx = multiprocessing.get_context("spawn")
+    # Slow refill: starting the child only earns a fraction of a token
+    bucket = SharedTokenBucket(rate=0.01, burst=2, ctx=ctx)
+    lim = TokenBucketLimiter(rate=1000.0, burst=50, shared=bucket)
+    assert lim.current_delay == 100.0
+    assert lim.reserve() == 0.0
+    out = ctx.Queue()
+    child = ctx.Process(target=_drain_shared, args=(bucket, 2, out))
+    child.start()
+    waits = out.get(timeout=30)
+    child.join()
+    # The child gets the burst's last token, then has to queue
+    assert waits[0] == 0.0
+    assert 90.0 < waits[1] <= 100.0
+    assert -1.0 <= lim.tokens < -0.9
+
+
+def test_token_bucket_rejects_bad_parameters():
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucketLimiter(rate=1, burst=0)
+
+
+@pytest.mark.asyncio
+async def test_host_registry_throttles_hosts_independently():
+    clock = FakeClock()
+    registry = HostLimiterRegistry(lambda host: _bucket(1.0, 1, clock))
+    page = registry.for_url("https://forum.example/t1-topic")
+    assert registry.for_url("https://FORUM.example/f2-forum") is page
+    cdn = registry.for_url("https://cdn.example/img/logo.png")
+    assert cdn is not page
+    assert registry.for_url("http://forum.example:8080/") is not page
+
+    await page.before_request()
+    await cdn.before_request()  # the CDN has its own bucket: no wait
+    assert clock.sleeps == []
+    await page.before_request()
+    assert clock.sleeps == [1.0]
+    assert sorted(host for host, _ in registry.items()) == [
+        "cdn.example", "forum.example", "forum.example:8080",
+    ]
+
+
+def test_get_limiter_builds_token_bucket():
+    lim = get_limiter(
+        "token_bucket", base_delay=0.5, min_delay=0.1, max_delay=5.0,
+        max_workers=4, rate=5.0, burst=2,
+    )
+    assert isinstance(lim, TokenBucketLimiter)
+    assert lim.current_delay == 0.2
+    assert lim.current_workers == 4
+
+
+def _adaptive(clock, **kwargs):
+    kwargs.setdefault("base_delay", 0)
+    return AdaptiveLimiter(
+        min_delay=0, max_delay=1.0, max_workers=4, clock=clock, sleep=clock.sleep, **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_adaptive_semaphore_gates_requests_in_flight():
+    lim = _adaptive(FakeClock())
+    for _ in range(4):
+        await lim.before_request()
+    assert lim.in_flight == 4
+    blocked = asyncio.ensure_future(lim.before_request())
+    await asyncio.sleep(0)
+    assert not blocked.done()  # a fifth request waits for a slot
+
+    # Back off to 2 workers: the waiter needs 3 slots released, not 1
+    await lim.after_response(503)
+    assert lim.current_workers == 2
+    await lim.after_response(200)
+    await asyncio.sleep(0)
+    assert not blocked.done()
+    await lim.after_response(200)
+    await asyncio.sleep(0)
+    assert blocked.done()
+    assert lim.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_adaptive_burst_of_errors_counts_once_per_cooldown():
+    clock = FakeClock()
+    lim = _adaptive(clock, cooldown=1.0)
+    for _ in range(4):
+        await lim.before_request()
+    for _ in range(4):
+        await lim.after_response(429)
+    assert lim.current_workers == 2  # not 4 → 2 → 1 → 1 → 1
+    clock.now += 1.0
+    await lim.before_request()
+    await lim.after_response(500)
+    assert lim.current_workers == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_honors_retry_after():
+    clock = FakeClock()
+    lim = _adaptive(clock)
+    await lim.before_request()
+    await lim.after_response(429, retry_after=30.0)
+    await lim.before_request()
+    assert clock.sleeps == [30.0]  # paused until Retry-After has passed
+    await lim.after_response(200)
+    await lim.before_request()
+    assert clock.sleeps == [30.0]  # the pause applies once
+
+
+@pytest.mark.asyncio
+async def test_adaptive_latency_mode_backs_off_before_errors():
+    clock = FakeClock()
+    lim = _adaptive(clock, latency_factor=2.0, latency_window=10, cooldown=0)
+    for _ in range(10):
+        await lim.before_request()
+        await lim.after_response(200, latency=0.1)
+    assert lim.p95_latency == pytest.approx(0.1)
+    assert lim.current_workers == 4
+
+    # The server slows down but still answers 200
+    for _ in range(10):
+        await lim.before_request()
+        await lim.after_response(200, latency=0.5)
+    assert lim.current_workers == 2
+    assert lim.current_delay == 0  # base_delay 0 stays 0
+
+
+@pytest.mark.asyncio
+async def test_adaptive_latency_mode_off_ignores_latency():
+    lim = _adaptive(FakeClock(), latency_window=10)
+    for latency in [0.1] * 10 + [5.0] * 10:
+        await lim.before_request()
+        await lim.after_response(200, latency=latency)
+    assert lim.current_workers == 4
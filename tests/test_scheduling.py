@@ -0,0 +1,138 @@
+# tests/test_scheduling.py
+
+import sqlite3
+
+import pytest
+
+from forum_backup_crawler.storage.scheduling import (
+    INDEX, OTHER, PROFILE, SEARCH, TOPIC, TOPIC_PAGE, ForumPolicy, SchedulingPolicy, get_policy,
+)
+from forum_backup_crawler.storage.state_db import StateDB
+
+
+def test_forum_policy_classifies_forum_urls():
+    policy = ForumPolicy()
+    cases = {
+        "https://f.example/": INDEX,
+        "https://f.example/f3-general": INDEX,
+        "https://f.example/f3p50-general": INDEX,
+        "https://f.example/viewforum.php?f=3": INDEX,
+        "https://f.example/t12-hello": TOPIC,
+        "https://f.example/viewtopic.php?t=12": TOPIC,
+        "https://f.example/t12p15-hello": TOPIC_PAGE,
+        "https://f.example/viewtopic.php?t=12&start=15": TOPIC_PAGE,
+        "https://f.example/u7": PROFILE,
+        "https://f.example/memberlist?start=50": PROFILE,
+        "https://f.example/memberlist.php?mode=viewprofile&u=7": PROFILE,
+        "https://f.example/search?search_id=newposts": SEARCH,
+        "https://f.example/posting.php?mode=reply&t=12": SEARCH,
+        "https://f.example/users/7/avatar.png": OTHER,
+    }
+    assert {url: policy.classify(url) for url in cases} == cases
+
+
+def test_policy_rejects_unknown_classes_and_bad_quotas():
+    with pytest.raises(ValueError):
+        ForumPolicy({"memberlist": 0.1})
+    with pytest.raises(ValueError):
+        ForumPolicy({"search": 0})
+    with pytest.raises(ValueError):
+        get_policy("alphabetical")
+
+
+@pytest.mark.asyncio
+async def test_claims_follow_classes_within_quotas(tmp_path):
+    db = StateDB(tmp_path / "state.db", ForumPolicy({"profile": 0.2, "search": 0.1}))
+    await db.connect()
+    base = "https://f.example"
+    # Seeded in the order a board index page links to them
+    await db.add_seed_urls(
+        [f"{base}/search?start={i}" for i in range(5)]
+        + [f"{base}/memberlist?start={i}" for i in range(5)]
+        + [f"{base}/t{i}-topic" for i in range(3)],
+        depth=1,
+    )
+    await db.add_seed_urls([f"{base}/f1-forum"], depth=2)
+
+    claimed = [url for url, _, _ in await db.claim_pending(10)]
+    # Forums and topics first (a deeper index still beats topics), then
+    # profiles and search within their quotas ...
+    assert claimed[:7] == [
+        f"{base}/f1-forum", f"{base}/t0-topic", f"{base}/t1-topic", f"{base}/t2-topic",
+        f"{base}/memberlist?start=0", f"{base}/memberlist?start=1", f"{base}/search?start=0",
+    ]
+    # ... then the room left goes to the capped classes, in class order
+    assert claimed[7:] == [f"{base}/memberlist?start={i}" for i in range(2, 5)]
+    assert [url for url, _, _ in await db.claim_pending(10)] == [
+        f"{base}/search?start={i}" for i in range(1, 5)
+    ]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_quotas_keep_a_large_class_from_filling_the_block(tmp_path):
+    db = StateDB(tmp_path / "state.db", ForumPolicy({"index": 0.5}))
+    await db.connect()
+    await db.add_seed_urls([f"https://f.example/f{i}-forum" for i in range(20)], depth=1)
+    await db.add_seed_urls([f"https://f.example/t{i}-topic" for i in range(20)], depth=2)
+    claimed = await db.claim_pending(10)
+    assert sum("example/f" in url for url, _, _ in claimed) == 5
+    assert sum("example/t" in url for url, _, _ in claimed) == 5
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_hosts_take_turns_within_a_block(tmp_path):
+    db = StateDB(tmp_path / "state.db", SchedulingPolicy(host_fairness=True))
+    await db.connect()
+    await db.add_seed_urls([f"https://a.example/{i}" for i in range(10)])
+    await db.add_seed_urls(["https://cdn.example/1.png", "https://cdn.example/2.png"])
+
+    claimed = [url for url, _, _ in await db.claim_pending(6)]
+    # The CDN gets its share although a.example's URLs were seeded first;
+    # a.example takes the room it leaves, and the hosts alternate
+    assert claimed[:4] == [
+        "https://a.example/0", "https://cdn.example/1.png",
+        "https://a.example/1", "https://cdn.example/2.png",
+    ]
+    assert claimed[4:] == ["https://a.example/2", "https://a.example/3"]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_changing_policy_reclassifies_known_urls(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(["https://f.example/search", "https://f.example/t1-topic"])
+    await db.close()
+
+    db = StateDB(tmp_path / "state.db", ForumPolicy())
+    await db.connect()
+    assert [url for url, _, _ in await db.claim_pending(2)] == [
+        "https://f.example/t1-topic", "https://f.example/search",
+    ]
+    await db.close()
+
+
+def test_claim_queries_use_the_claim_indexes(tmp_path):
+    # Pops must stay index range scans at millions of rows
+    conn = sqlite3.connect(str(tmp_path / "plan.db"))
+    conn.executescript("""
+        CREATE TABLE url_keys (id INTEGER PRIMARY KEY, url TEXT, host_id INTEGER);
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, status TEXT, depth INTEGER,
+                           priority INTEGER, url_class INTEGER, host_id INTEGER);
+        CREATE INDEX urls_class_claim_idx ON urls(status, url_class, priority, depth, id);
+        CREATE INDEX urls_host_claim_idx ON urls(status, host_id, url_class, priority, depth, id);
+    """)
+    for where, index in (
+        ("u.url_class = 1", "urls_class_claim_idx"),
+        ("u.url_class = 1 AND u.host_id = 2", "urls_host_claim_idx"),
+    ):
+        plan = " ".join(row[3] for row in conn.execute(f"""
+            EXPLAIN QUERY PLAN SELECT u.id FROM urls u JOIN url_keys k ON k.id = u.id
+            WHERE u.status = 'pending' AND {where}
+            ORDER BY u.priority, u.depth, u.id LIMIT 10
+        """))
+        assert index in plan
+        assert "TEMP B-TREE" not in plan
+    conn.close()
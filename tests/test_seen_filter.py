@@ -0,0 +1,75 @@
+# tests/test_seen_filter.py
+
+import pytest
+
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.frontier import Frontier
+from forum_backup_crawler.storage.seen_filter import (
+    SeenFilter,
+    open_seen_filter,
+    save_seen_filter,
+)
+
+
+def test_no_false_negatives_and_low_fp_rate():
+    seen = SeenFilter(capacity=2000, fp_rate=0.01)
+    added = [f"https://f.example/t{i}" for i in range(2000)]
+    seen.update(added)
+    assert all(url in seen for url in added)
+
+    probes = [f"https://f.example/p{i}" for i in range(5000)]
+    false_positives = sum(url in seen for url in probes)
+    assert false_positives / len(probes) < 0.03
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    seen = SeenFilter(capacity=100, fp_rate=0.001)
+    seen.update(["a", "b"])
+    seen.last_id = 7
+    seen.save(tmp_path / "state.seen")
+
+    loaded = SeenFilter.load(tmp_path / "state.seen")
+    assert "a" in loaded and "b" in loaded
+    assert (loaded.count, loaded.last_id) == (2, 7)
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_from_db_and_caught_up(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(["a", "b"])
+    path = tmp_path / "state.seen"
+
+    # Missing file: rebuilt from the urls table
+    seen = await open_seen_filter(db, path, capacity=100, fp_rate=0.001)
+    assert "a" in seen and "b" in seen
+    await save_seen_filter(db, seen, path)
+
+    # Stale file: URLs added since the save are loaded on open
+    await db.add_seed_urls(["c"])
+    seen = await open_seen_filter(db, path, capacity=100, fp_rate=0.001)
+    assert "c" in seen
+    assert seen.count == 3
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_frontier_skips_known_links(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    await db.add_seed_urls(["a"])
+    seen = await open_seen_filter(db, tmp_path / "state.seen", 100, 0.001)
+    frontier = Frontier(db, seen=seen)
+
+    await frontier.pop_pending()
+    await frontier.add_seed_urls(["a", "b"], 1)
+    # Not seen until its batch is committed
+    assert "b" not in seen
+    await frontier.mark_done("a", "a.html")
+    await frontier.flush()
+    assert "b" in seen
+
+    await frontier.add_seed_urls(["a", "b", "c"], 1)
+    assert seen.stats()["skipped"] == 3
+    assert frontier.buffered == 1
+    await db.close()
@@ -4,7 +4,8 @@ import pytest
 import asyncio
 from pathlib import Path
 
-from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.state_db import StateDB, SCHEMA_VERSION
+from forum_backup_crawler.storage.migrate import migrate
 
 
 @pytest.mark.asyncio
@@ -33,6 +34,7 @@ async def test_add_and_pop_and_done(tmp_path):
     assert second[0] == "b"
     assert third[0] == "c"
     assert await db.pending_count() == 0
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -48,6 +50,7 @@ async def test_record_error(tmp_path):
     await db.record_error("x", "oops")
     # No pending left
     assert await db.pending_count() == 0
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -64,6 +67,7 @@ async def test_redirect_and_resolve(tmp_path):
     assert result == "C"
     # Non-existing src returns itself
     assert await db.resolve("X") == "X"
+    await db.close()
 
 
 @pytest.mark.asyncio
@@ -81,3 +85,162 @@ async def test_asset_cache(tmp_path):
     # get_asset returns the stored path
     path = await db.get_asset("u1")
     assert path == "path1"
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_record_asset_counts_each_blob_once(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    assert await db.record_asset("https://cdn.example/u1.png", "u1.png", "ab12", 100)
+    # Same bytes under another URL: known blob
+    assert not await db.record_asset("https://cdn.example/u2.png", "u2.png", "ab12", 100)
+    assert await db.record_asset("https://cdn.example/u3.png", "u3.png", "cd34", 50)
+    assert await db.get_asset_hash("https://cdn.example/u2.png") == "ab12"
+    assert await db.get_asset("https://cdn.example/u3.png") == "u3.png"
+    assert await db.blob_stats() == (3, 2, 150)
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_merge_from_combines_shard_dbs(tmp_path):
+    shard = StateDB(tmp_path / "shard.db")
+    await shard.connect()
+    await shard.add_seed_urls(["https://f.example/t2", "https://f.example/t1"], depth=1)
+    await shard.apply_batch([], [("https://f.example/t1", "t1.html")], [], [])
+    await shard.add_redirect("https://f.example/old", "https://f.example/t1")
+    await shard.record_asset("https://cdn.example/a.png", "a.png", "ab12", 100)
+    await shard.close()
+
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    # Ids differ between files: interned here in another order first
+    await db.add_seed_urls(["https://f.example/", "https://f.example/t1"], depth=0)
+    await db.merge_from(tmp_path / "shard.db")
+
+    assert await db.resolve("https://f.example/old") == "https://f.example/t1"
+    assert await db.get_asset_hash("https://cdn.example/a.png") == "ab12"
+    assert await db.blob_stats() == (1, 1, 100)
+    # The shard's row replaces the one seeded here
+    assert await db.pending_count() == 2
+    assert await db.pop_pending() == ("https://f.example/", 0)
+    assert await db.pop_pending() == ("https://f.example/t2", 1)
+    await db.close()
+
+
+def _make_v1_db(path):
+    # The original layout, keyed by URL text, as written by older releases
+    import sqlite3
+    conn = sqlite3.connect(str(path))
+    conn.executescript("""
+        CREATE TABLE urls (url TEXT PRIMARY KEY, status TEXT, local_path TEXT,
+                           depth INTEGER, error_text TEXT);
+        CREATE INDEX urls_status_idx ON urls(status);
+        CREATE TABLE assets (url TEXT PRIMARY KEY, local_path TEXT);
+        CREATE TABLE redirects (src TEXT PRIMARY KEY, dst TEXT);
+        INSERT INTO urls VALUES ('https://f.example/t2', 'pending', NULL, 1, NULL);
+        INSERT INTO urls VALUES ('https://f.example/t1', 'pending', NULL, 1, NULL);
+        INSERT INTO urls VALUES ('https://f.example/', 'done', 'index.html', 0, NULL);
+        INSERT INTO assets VALUES ('https://cdn.example/a.png', 'a.png');
+        INSERT INTO redirects VALUES ('https://f.example/old', 'https://f.example/t1');
+    """)
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_migrates_v1_schema_on_connect(tmp_path):
+    db_path = tmp_path / "state.db"
+    _make_v1_db(db_path)
+
+    db = StateDB(db_path)
+    await db.connect()
+    assert await db.schema_version() == SCHEMA_VERSION
+
+    # Old pop order (depth, url) is preserved
+    assert await db.pending_count() == 2
+    assert await db.pop_pending() == ("https://f.example/t1", 1)
+    assert await db.pop_pending() == ("https://f.example/t2", 1)
+    assert await db.get_asset("https://cdn.example/a.png") == "a.png"
+    assert await db.resolve("https://f.example/old") == "https://f.example/t1"
+    # Known URLs are still ignored on re-seed
+    await db.add_seed_urls(["https://f.example/"], depth=0)
+    assert await db.pending_count() == 0
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_migrate_tool_upgrades_in_place(tmp_path):
+    db_path = tmp_path / "state.db"
+    _make_v1_db(db_path)
+
+    assert await migrate(db_path) == (1, SCHEMA_VERSION)
+    # Second run is a no-op
+    assert await migrate(db_path) == (SCHEMA_VERSION, SCHEMA_VERSION)
+
+
+@pytest.mark.asyncio
+async def test_migrates_v2_schema_to_add_blobs(tmp_path):
+    import sqlite3
+    db_path = tmp_path / "state.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript("""
+        CREATE TABLE hosts (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE url_keys (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE,
+                               host_id INTEGER);
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, status TEXT, local_path TEXT,
+                           depth INTEGER, error_text TEXT);
+        CREATE TABLE assets (url_id INTEGER PRIMARY KEY, local_path TEXT);
+        CREATE TABLE redirects (src_id INTEGER PRIMARY KEY, dst_id INTEGER);
+        INSERT INTO url_keys (id, url) VALUES (1, 'https://cdn.example/a.png');
+        INSERT INTO assets VALUES (1, 'a.png');
+        PRAGMA user_version = 2;
+    """)
+    conn.commit()
+    conn.close()
+
+    assert await migrate(db_path, vacuum=False) == (2, SCHEMA_VERSION)
+    db = StateDB(db_path)
+    await db.connect()
+    assert await db.get_asset("https://cdn.example/a.png") == "a.png"
+    assert await db.get_asset_hash("https://cdn.example/a.png") is None
+    await db.record_asset("https://cdn.example/a.png", "a.png", "ef56", 10)
+    assert await db.blob_stats() == (1, 1, 10)
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_status_counts_follow_every_change(tmp_path):
+    import sqlite3
+    db_path = tmp_path / "state.db"
+    db = StateDB(db_path)
+    await db.connect()
+    await db.add_seed_urls(["a", "b", "c", "d"])
+    await db.add_seed_urls(["a"])                  # ignored: already known
+    claimed = await db.claim_pending(3)
+    await db.apply_batch(
+        done=[(claimed[0][0], "x.html"), (claimed[1][0], "y.html")],
+        errors=[(claimed[2][0], "boom")],
+    )
+    await db.requeue_done([claimed[0][0]])
+    await db.claim_pending(1)
+    assert await db.status_counts() == {"pending": 1, "in_progress": 1, "done": 1, "error": 1}
+    await db.reset_in_progress()
+    assert await db.pending_count() == 2
+    await db.close()
+
+    # A schema 6 DB is counted once on upgrade
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript("""
+        DROP TRIGGER urls_count_insert;
+        DROP TRIGGER urls_count_delete;
+        DROP TRIGGER urls_count_update;
+        DROP TABLE status_counts;
+        UPDATE urls SET status = 'done';
+        PRAGMA user_version = 6;
+    """)
+    conn.close()
+    db = StateDB(db_path)
+    await db.connect()
+    assert await db.status_counts() == {"pending": 0, "in_progress": 0, "done": 4, "error": 0}
+    await db.close()
@@ -0,0 +1,88 @@
+# tests/test_stream_rewriter.py
+
+"""
+Golden-file tests for the HTML rewriter engines.
+
+Each page in fixtures/pages/ has a `.golden.html` / `.golden.json` pair
+holding the "soup" engine's output. The "stream" engine must produce the
+same links and assets, and HTML that is identical once both are normalized
+through BeautifulSoup (the stream engine keeps the source formatting).
+
+After an intended change to the rewriting rules, regenerate the goldens with:
+    python -m forum_backup_crawler.tests.test_stream_rewriter
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from forum_backup_crawler.processing.html_rewriter import rewrite_page
+from forum_backup_crawler.storage.path_mapper import PathMapper
+
+FIXTURES = Path(__file__).parent / "fixtures" / "pages"
+# Fixture name → URL the page was served from
+PAGES = {
+    "forumeiros_index": "https://modelistas.forumeiros.com/",
+    "forumeiros_topic": "https://modelistas.forumeiros.com/t2211p30-kit-frateschi-g12-pintura",
+    "phpbb_viewtopic": "https://ng.example.org/viewtopic.php?f=2&t=10&start=15",
+}
+
+
+def _rewrite(name, engine):
+    url = PAGES[name]
+    rules = PathMapper(Path("."), hosts=[url.split("/")[2]]).rules
+    html = (FIXTURES / f"{name}.html").read_text(encoding="utf-8")
+    return rewrite_page(html, url, rules, engine=engine)
+
+
+def _golden(name):
+    html = (FIXTURES / f"{name}.golden.html").read_text(encoding="utf-8")
+    found = json.loads((FIXTURES / f"{name}.golden.json").read_text(encoding="utf-8"))
+    return html, found["links"], found["assets"]
+
+
+@pytest.mark.parametrize("name", PAGES)
+def test_soup_engine_matches_golden(name):
+    html, links, assets = _golden(name)
+    result = _rewrite(name, "soup")
+    assert result.html == html
+    assert (result.links, result.assets) == (links, assets)
+
+
+@pytest.mark.parametrize("name", PAGES)
+def test_stream_engine_matches_golden(name):
+    html, links, assets = _golden(name)
+    result = _rewrite(name, "stream")
+    assert str(BeautifulSoup(result.html, "html.parser")) == html
+    assert (result.links, result.assets) == (links, assets)
+
+
+def test_stream_engine_keeps_untouched_markup_verbatim():
+    source = (FIXTURES / "forumeiros_index.html").read_text(encoding="utf-8")
+    html = _rewrite("forumeiros_index", "stream").html
+    # Script bodies, comments and entities are copied byte for byte
+    for snippet in (
+        "document.write('<a href=\"/login\">Entrar</a> <img src=\"/spacer.gif\">');",
+        "<!-- Cabeçalho do fórum -->",
+        "Desde 2007, tudo sobre escalas N, HO &amp; O<br />&nbsp;",
+        '<th colspan="2" nowrap="nowrap">Fóruns</th>',
+    ):
+        assert snippet in source and snippet in html
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        _rewrite("phpbb_viewtopic", "regex")
+
+
+if __name__ == "__main__":
+    for name in PAGES:
+        result = _rewrite(name, "soup")
+        (FIXTURES / f"{name}.golden.html").write_text(result.html, encoding="utf-8")
+        (FIXTURES / f"{name}.golden.json").write_text(
+            json.dumps({"links": result.links, "assets": result.assets}, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        print(f"Updated {name} goldens")
@@ -0,0 +1,113 @@
+# tests/test_timeit.py
+
+import json
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+
+from forum_backup_crawler.core.metrics import CONTENT_TYPE, MetricsExporter
+from forum_backup_crawler.network.rate_limit import FixedLimiter, HostLimiterRegistry
+from forum_backup_crawler.utils.timeit import MetricsRegistry, timed
+
+
+def test_render_uses_prometheus_text_format():
+    registry = MetricsRegistry()
+    responses = registry.counter("responses_total", "Responses", ["status"])
+    responses.labels(200).inc()
+    responses.labels(200).inc()
+    responses.labels(404).inc()
+    registry.gauge("delay_seconds", "Delay").set(0.25)
+    latency = registry.histogram("fetch_seconds", "Latency", buckets=[0.1, 1.0])
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE responses_total counter" in text
+    assert 'responses_total{status="200"} 2' in text
+    assert 'responses_total{status="404"} 1' in text
+    assert "delay_seconds 0.25" in text
+    # Buckets are cumulative, and a value equal to a bound falls in that bucket
+    assert 'fetch_seconds_bucket{le="0.1"} 2' in text
+    assert 'fetch_seconds_bucket{le="1"} 3' in text
+    assert 'fetch_seconds_bucket{le="+Inf"} 4' in text
+    assert "fetch_seconds_sum 3.65" in text
+    assert "fetch_seconds_count 4" in text
+
+
+def test_snapshot_and_quantiles():
+    registry = MetricsRegistry()
+    latency = registry.histogram("fetch_seconds", "Latency", ["host"], buckets=[1, 2, 3, 4])
+    for value in (0.5, 1.5, 2.5, 3.5):
+        latency.labels("a").observe(value)
+
+    snap = registry.snapshot()["fetch_seconds"]["host=a"]
+    assert snap["count"] == 4
+    assert snap["mean"] == 2.0
+    assert snap["p50"] == 2.0
+    assert snap["p99"] == pytest.approx(3.96)
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("requests_total", "Requests")
+    assert registry.counter("requests_total", "Requests") is first
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests")
+    with pytest.raises(ValueError):
+        first.labels("unexpected")
+
+
+@pytest.mark.asyncio
+async def test_timed_observes_sync_and_async_calls():
+    registry = MetricsRegistry()
+    calls = registry.histogram("call_seconds", "Calls", ["op"])
+
+    @timed(calls, "sync")
+    def add(a, b):
+        return a + b
+
+    @timed(calls, "async")
+    async def fail():
+        raise RuntimeError
+
+    assert add(1, 2) == 3
+    with pytest.raises(RuntimeError):
+        await fail()
+    assert calls.labels("sync").count == 1
+    assert calls.labels("async").count == 1
+
+
+@pytest.mark.asyncio
+async def test_exporter_serves_metrics_and_writes_snapshot(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("pages_total", "Pages").inc(3)
+    pipeline = SimpleNamespace(snapshot=lambda: {
+        "parse": {"queue": 5, "utilization": 0.5},
+    })
+    frontier = SimpleNamespace(buffered=7, in_flight=2)
+    limiters = HostLimiterRegistry(lambda host: FixedLimiter(0.5, 4))
+    limiters.get("f.example")
+
+    exporter = MetricsExporter(
+        pipeline, frontier, limiters, tmp_path / "metrics.json",
+        interval=60, port=0, registry=registry,
+    )
+    await exporter.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(exporter.url) as resp:
+                assert resp.headers["Content-Type"] == CONTENT_TYPE
+                text = await resp.text()
+    finally:
+        await exporter.close()
+
+    assert "pages_total 3" in text
+    # Gauges are refreshed from the crawl's components on each scrape
+    assert 'fbc_queue_depth{stage="parse"} 5' in text
+    assert "fbc_frontier_buffered 7" in text
+    assert 'fbc_limiter_workers{host="f.example"} 4' in text
+    # close() writes a final snapshot
+    written = json.loads((tmp_path / "metrics.json").read_text())
+    assert written["metrics"]["pages_total"] == 3
+    assert written["metrics"]["fbc_limiter_delay_seconds"] == {"host=f.example": 0.5}
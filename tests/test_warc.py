@@ -0,0 +1,137 @@
+# tests/test_warc.py
+
+import gzip
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from forum_backup_crawler.benchmarks.fake_forum import ForumSpec, serve
+from forum_backup_crawler.config import Settings
+from forum_backup_crawler.core.export import export_archive
+from forum_backup_crawler.core.scheduler import run
+from forum_backup_crawler.storage.state_db import StateDB
+from forum_backup_crawler.storage.warc import WARC_DIR, WarcReader, WarcStore, WarcWriter, payload_digest
+
+PAGE = "<html><body>" + "<p>Olá, fórum!</p>" * 200 + "</body></html>"
+
+
+def test_records_roll_over_and_are_read_back_by_offset(tmp_path):
+    writer = WarcWriter(tmp_path, "w1", segment_size=1)
+    first = writer.write_response(
+        "https://f.example/t1", 200, [("Content-Type", "text/html")], PAGE.encode(), "ab" * 32
+    )
+    asset = tmp_path / "logo.png"
+    asset.write_bytes(b"\x89PNG" * 1000)
+    second = writer.write_response("https://f.example/logo.png", 200, [], asset, "cd" * 32)
+    revisit = writer.write_revisit("https://f.example/logo2.png", "https://f.example/logo.png", [], "cd" * 32)
+    writer.close()
+    # A new writer never appends to an existing file
+    writer = WarcWriter(tmp_path, "w1")
+    last = writer.write_response("https://f.example/t2", 200, [], b"two", "ef" * 32)
+    writer.close()
+
+    assert [loc.file for loc in (first, second, revisit, last)] == [
+        f"w1-0000{i}.warc.gz" for i in range(1, 5)
+    ]
+    reader = WarcReader(tmp_path)
+    record = reader.read(first)
+    assert record.body.decode("utf-8") == PAGE
+    assert record.status == 200 and record.http_headers["Content-Type"] == "text/html"
+    assert record.headers["WARC-Target-URI"] == "https://f.example/t1"
+    assert record.headers["WARC-Payload-Digest"] == payload_digest("ab" * 32)
+    assert reader.read(second).body == asset.read_bytes()
+    record = reader.read(revisit)
+    assert record.headers["WARC-Type"] == "revisit" and record.body == b""
+    assert record.headers["WARC-Refers-To-Target-URI"] == "https://f.example/logo.png"
+    assert reader.read(last).body == b"two"
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_repeated_asset_is_archived_as_a_revisit(tmp_path):
+    db = StateDB(tmp_path / "state.db")
+    await db.connect()
+    store = WarcStore(db, tmp_path / WARC_DIR, "w1")
+
+    async def chunks():
+        yield b"\x89PNG avatar"
+
+    first = await store.save_asset("https://cdn.example/u1.png", chunks(), Path("u1.png"))
+    second = await store.save_asset("https://cdn.example/u2.png", chunks(), Path("u2.png"))
+    failed = await store.save_pages([
+        ("https://f.example/", "https://f.example/index", PAGE, "ab" * 32, [("ETag", '"1"')]),
+    ])
+    await store.close()
+
+    assert failed == {} and store.stats() == {"records": 3, "revisits": 1}
+    assert first.content_hash == second.content_hash
+    location = await db.archive_location("https://cdn.example/u2.png")
+    assert location == await db.archive_location("https://cdn.example/u1.png")
+    assert await db.archived_by_hash(first.content_hash) == ("https://cdn.example/u1.png", *location)
+    reader = WarcReader(tmp_path / WARC_DIR)
+    assert reader.read(location).http_headers["Content-Type"] == "image/png"
+    page = reader.read(await db.archive_location("https://f.example/"))
+    assert page.body.decode("utf-8") == PAGE and page.http_headers["ETag"] == '"1"'
+    assert page.headers["WARC-Target-URI"] == "https://f.example/index"
+    reader.close()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_warc_crawl_is_indexed_and_exported_to_the_mirror(tmp_path):
+    spec = ForumSpec(
+        forums=2, topics_per_forum=3, topics_per_page=2, posts_per_topic=20,
+        users=4, avatars=2, attachment_kb=1,
+    )
+    async with serve(spec) as base_url:
+        settings = Settings(
+            start_urls=[base_url + "/"],
+            output_dir=tmp_path / "out",
+            temp_dir=tmp_path / "temp",
+            rate_limiter="token_bucket",
+            rate_limit_rate=1000.0,
+            rate_limit_burst=50,
+            depth_limit=100,
+            parse_workers=0,
+            pipeline_report_interval=0,
+            output_format="warc",
+            page_codec="gzip",
+        )
+        await run(settings)
+
+    site = settings.output_dir / base_url.split("//")[1].replace(":", "_")
+    assert not site.exists()
+    conn = sqlite3.connect(str(settings.temp_dir / "state.db"))
+    (done,) = conn.execute("SELECT COUNT(*) FROM urls WHERE status = 'done';").fetchone()
+    (archived,) = conn.execute("SELECT COUNT(*) FROM archive;").fetchone()
+    conn.close()
+    assert spec.page_count() < archived <= done
+
+    db = StateDB(settings.temp_dir / "state.db")
+    await db.connect(read_only=True)
+    location = await db.archive_location(base_url + "/")
+    await db.close()
+    reader = WarcReader(settings.output_dir / WARC_DIR)
+    assert reader.read(location).body.startswith(b"<")
+    reader.close()
+
+    def crawl_state():
+        conn = sqlite3.connect(str(settings.temp_dir / "state.db"))
+        state = (
+            conn.execute("SELECT value FROM meta WHERE key = 'policy';").fetchone(),
+            conn.execute("SELECT id, url_class FROM urls ORDER BY id;").fetchall(),
+        )
+        conn.close()
+        return state
+
+    before = crawl_state()
+    pages, assets, failed = await export_archive(settings, workers=2, chunk_size=10)
+    assert failed == 0 and pages + assets == archived
+    # Exporting only reads the DB: the crawl's policy and URL classes are kept
+    assert crawl_state() == before and before[0] == (settings.scheduling_policy().name,)
+    # Stored per the page settings (legacy links to a topic export the same
+    # file twice), rewritten like a mirror crawl's
+    assert len(list(site.rglob("*.html.gz"))) == spec.page_count()
+    (topic,) = site.glob("t1-*.html.gz")
+    assert 'href="t1p15-' in gzip.decompress(topic.read_bytes()).decode("utf-8")
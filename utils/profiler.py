@@ -0,0 +1,362 @@
+# utils/profiler.py
+
+"""
+Opt-in sampling profiler for a running crawl, using only the standard
+library:
+
+  - CPU samples: a background thread records the Python stack of every
+    other thread (event loop, SQLite, to_thread workers) every
+    `sample_interval` seconds. Time the event loop spends idle in the
+    selector shows up as such.
+  - Task samples: on the event loop, the await chain of every suspended
+    asyncio task is recorded at the same rate, ending with what it waits
+    on. A task waiting for the limiter, for SQLite or for the parse pool
+    therefore shows where its wall time goes, which CPU samples can't.
+  - Call accounting: hooked functions count calls and wall time (for
+    coroutines, including every await inside them).
+
+Every `dump_interval` seconds (and on close) the window's samples are
+written to `out_dir` as collapsed-stack files (`cpu-<time>.collapsed`,
+`tasks-<time>.collapsed`; one "frame;frame;frame count" line per stack, the
+input of flamegraph.pl, speedscope and inferno) plus a per-function
+`summary-<time>.txt`, then reset.
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from types import FrameType
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Functions listed in each section of the summary
+SUMMARY_TOP = 25
+
+
+@dataclass
+class CallStats:
+    """Calls of one hooked function: count, total and worst wall time."""
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class Profiler:
+    """
+    Samples CPU and task stacks and accounts hooked calls; see the module
+    docstring. Use start() on the event loop, then close().
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        dump_interval: float = 300.0,
+        sample_interval: float = 0.01,
+    ) -> None:
+        """
+        :param out_dir: Folder for the collapsed-stack and summary files
+        :param dump_interval: Seconds between dumps (0 = only on close)
+        :param sample_interval: Seconds between stack samples
+        """
+        self._out_dir = out_dir
+        self._dump_interval = dump_interval
+        self._sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._cpu: Counter = Counter()
+        self._tasks: Counter = Counter()
+        self._calls: Dict[str, CallStats] = {}
+        self._hooks: List[Tuple[object, str, object]] = []
+        self._labels: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task_timer: Optional[asyncio.TimerHandle] = None
+        self._dump_task: Optional[asyncio.Task] = None
+        self._window_started = time.time()
+
+    def hook(self, owner: object, name: str, label: Optional[str] = None) -> None:
+        """
+        Replace `owner.name` (a function or method) with a wrapper that
+        accounts its calls under `label` (default "Owner.name") until close().
+        """
+        original = getattr(owner, name)
+        label = label or f"{getattr(owner, '__name__', owner)}.{name}"
+        stats = self._calls.setdefault(label, CallStats())
+        lock = self._lock
+
+        # Stats are reset by dump() in another thread, and sync functions
+        # may run in executor threads, so every update takes the lock
+        if asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        stats.add(elapsed)
+        else:
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        stats.add(elapsed)
+
+        # The owner's own attribute (None if inherited), so unhook() puts
+        # back exactly what was there
+        raw = vars(owner).get(name) if hasattr(owner, "__dict__") else None
+        self._hooks.append((owner, name, raw))
+        setattr(owner, name, wrapper)
+
+    def unhook(self) -> None:
+        for owner, name, raw in reversed(self._hooks):
+            if raw is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, raw)
+        self._hooks.clear()
+
+    def start(self) -> None:
+        """Start sampling; must be called from the running event loop."""
+        self._out_dir.mkdir(parents=True, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._window_started = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample_threads, name="profiler", daemon=True
+        )
+        self._thread.start()
+        self._task_timer = self._loop.call_later(self._sample_interval, self._sample_tasks)
+        if self._dump_interval > 0:
+            self._dump_task = asyncio.create_task(self._dump_loop(), name="profiler-dump")
+        logger.info(f"Profiling to {self._out_dir}")
+
+    async def close(self) -> None:
+        """Stop sampling, remove the hooks and write the last window."""
+        self._stop.set()
+        if self._task_timer is not None:
+            self._task_timer.cancel()
+        if self._dump_task is not None:
+            self._dump_task.cancel()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+        self.unhook()
+        await asyncio.to_thread(self.dump)
+
+    def _sample_threads(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self._sample_interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            stacks = [
+                self._fold(frame, _thread_root(names.get(ident, "thread")))
+                for ident, frame in frames.items() if ident != me
+            ]
+            del frames
+            with self._lock:
+                self._cpu.update(stacks)
+
+    def _sample_tasks(self) -> None:
+        # Runs on the event loop, between tasks: every task is suspended
+        stacks = [_await_stack(task, self._label) for task in asyncio.all_tasks(self._loop)]
+        with self._lock:
+            self._tasks.update(stacks)
+        if not self._stop.is_set():
+            self._task_timer = self._loop.call_later(self._sample_interval, self._sample_tasks)
+
+    def _fold(self, frame: Optional[FrameType], root: str) -> str:
+        names = []
+        while frame is not None:
+            name = self._label(frame)
+            if name:
+                # The innermost frame carries its line, e.g. to tell a
+                # thread waiting for work from one running a C call
+                names.append(name if names else f"{name}:{frame.f_lineno}")
+            frame = frame.f_back
+        names.append(root)
+        return ";".join(reversed(names))
+
+    def _label(self, frame: FrameType) -> str:
+        """
+        "package/module.py:function" for a frame, cached per file; "" for
+        the profiler's and metrics' own wrappers, which are left out.
+        """
+        code = frame.f_code
+        module = self._labels.get(code.co_filename)
+        if module is None:
+            module = "/".join(Path(code.co_filename).parts[-2:])
+            if module in _WRAPPER_MODULES:
+                module = ""
+            self._labels[code.co_filename] = module
+        return f"{module}:{code.co_name}" if module else ""
+
+    async def _dump_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._dump_interval)
+            try:
+                await asyncio.to_thread(self.dump)
+            except OSError as e:
+                logger.warning(f"Could not write profile: {e}")
+
+    def dump(self) -> Optional[Path]:
+        """Write and reset the current window; returns the summary path."""
+        with self._lock:
+            cpu, self._cpu = self._cpu, Counter()
+            tasks, self._tasks = self._tasks, Counter()
+            calls = {
+                label: CallStats(s.calls, s.total, s.max) for label, s in self._calls.items()
+            }
+            for stats in self._calls.values():
+                stats.calls, stats.total, stats.max = 0, 0.0, 0.0
+            started, self._window_started = self._window_started, time.time()
+        if not cpu and not tasks and not any(s.calls for s in calls.values()):
+            return None
+
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        _write_collapsed(self._out_dir / f"cpu-{stamp}.collapsed", cpu)
+        _write_collapsed(self._out_dir / f"tasks-{stamp}.collapsed", tasks)
+        summary = self._out_dir / f"summary-{stamp}.txt"
+        text = summarize(cpu, tasks, calls, time.time() - started, self._sample_interval)
+        summary.write_text(text, encoding="utf-8")
+        return summary
+
+
+def summarize(
+    cpu: Counter,
+    tasks: Counter,
+    calls: Dict[str, CallStats],
+    window: float,
+    sample_interval: float,
+) -> str:
+    """Per-function report of one profiling window."""
+    lines = [f"Profile window: {window:.0f}s, sampled every {sample_interval * 1000:g} ms", ""]
+
+    if any(s.calls for s in calls.values()):
+        lines.append("Hooked calls (wall time, including awaits):")
+        lines.append(f"  {'function':44} {'calls':>9} {'total s':>9} {'mean ms':>9} {'max ms':>9}")
+        for label, s in sorted(calls.items(), key=lambda kv: -kv[1].total):
+            if s.calls:
+                lines.append(
+                    f"  {label:44} {s.calls:9d} {s.total:9.2f} "
+                    f"{s.total / s.calls * 1000:9.2f} {s.max * 1000:9.2f}"
+                )
+        lines.append("")
+
+    lines += _function_table(
+        "CPU samples by function (all threads; idle threads sit in waits)",
+        cpu, lambda frames: frames[-1],
+    )
+    lines += _function_table(
+        "Task samples by the function suspended tasks are awaiting in", tasks, _wait_site
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _function_table(
+    title: str, samples: Counter, site: Callable[[List[str]], str]
+) -> List[str]:
+    """
+    Share of samples per function: "self" where `site` places the sample,
+    "total" anywhere on the stack.
+    """
+    total = sum(samples.values())
+    if not total:
+        return []
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, n in samples.items():
+        frames = stack.split(";")
+        own[site(frames)] += n
+        for frame in {_LINE.sub("", f) for f in frames}:
+            inclusive[frame] += n
+    lines = [f"{title}: {total} samples", f"  {'self%':>6} {'total%':>7}  function"]
+    for frame, n in own.most_common(SUMMARY_TOP):
+        lines.append(f"  {n / total:6.1%} {inclusive[_LINE.sub('', frame)] / total:7.1%}  {frame}")
+    lines.append("")
+    return lines
+
+
+def _wait_site(frames: List[str]) -> str:
+    """Innermost frame of a task stack outside asyncio: where it awaits."""
+    for frame in reversed(frames):
+        if not frame.startswith(("asyncio/", "<")):
+            return _LINE.sub("", frame)
+    return frames[-1]
+
+
+def _write_collapsed(path: Path, samples: Counter) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for stack, n in samples.most_common():
+            f.write(f"{stack} {n}\n")
+    os.replace(tmp, path)
+
+
+_TRAILING_NUMBER = re.compile(r"[-_]?\d+$")
+# The line number suffix of a frame label
+_LINE = re.compile(r":\d+$")
+# Wrappers around hooked / timed calls, not shown in stacks
+_WRAPPER_MODULES = {"utils/profiler.py", "utils/timeit.py"}
+
+
+def _thread_root(name: str) -> str:
+    """Thread name without its counter, so workers merge in a flamegraph."""
+    return "thread:" + (_TRAILING_NUMBER.sub("", name) or name)
+
+
+def _await_stack(task: asyncio.Task, label: Callable[[FrameType], str]) -> str:
+    """Collapsed await chain of a suspended task, ending with what it awaits."""
+    names = ["task:" + (_TRAILING_NUMBER.sub("", task.get_name()) or "task")]
+    innermost = None
+    awaitable: object = task.get_coro()
+    while awaitable is not None:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        name = label(frame)
+        if name:
+            names.append(name)
+            innermost = frame
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    if innermost is not None:
+        names[-1] += f":{innermost.f_lineno}"
+    if awaitable is not None:
+        # A Future, or a coroutine that has just finished
+        names.append(f"<{type(awaitable).__name__}>")
+    return ";".join(names)
+
+
+def hook_all(profiler: Profiler, targets: Sequence[Tuple[object, Sequence[str]]]) -> None:
+    """profiler.hook() each (owner, [method names]) pair."""
+    for owner, names in targets:
+        for name in names:
+            profiler.hook(owner, name)
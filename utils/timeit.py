@@ -0,0 +1,324 @@
+# utils/timeit.py
+
+"""
+Lightweight in-process metrics: counters, gauges and histograms, rendered
+in the Prometheus text exposition format or as a JSON-friendly dict.
+
+Metrics are module-level objects registered in REGISTRY:
+
+    FETCH_SECONDS = REGISTRY.histogram("fbc_fetch_seconds", "Fetch latency")
+    RESPONSES = REGISTRY.counter("fbc_responses_total", "Responses", ["status"])
+
+    FETCH_SECONDS.observe(0.12)
+    RESPONSES.labels(200).inc()
+    with timer(FETCH_SECONDS):
+        ...
+
+An update is a dict lookup plus a couple of float additions (a bisect for
+histograms), cheap enough to leave on for every request. Updates are not
+locked: make them from the event loop thread, not from worker threads.
+"""
+
+from __future__ import annotations
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+# Seconds: 1 ms … 1 min
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# Bytes: 1 KiB … 64 MiB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+Labels = Tuple[str, ...]
+
+
+class CounterValue:
+    """One labelled series of a Counter."""
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeValue:
+    """One labelled series of a Gauge."""
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class HistogramValue:
+    """One labelled series of a Histogram: per-bucket counts, sum and count."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Bucket i counts values <= bounds[i] (Prometheus "le")
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile (0..1) by linear interpolation inside the
+        bucket it falls in; None if nothing was observed. Values in the
+        +Inf bucket are reported as the largest bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class Metric:
+    """
+    Base of Counter, Gauge and Histogram: a named family of series, one per
+    combination of label values. Without label names the metric has a
+    single series and its update methods can be called on it directly.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Labels, object] = {}
+
+    def labels(self, *values: object):
+        """The series for these label values (created on first use)."""
+        key = tuple(map(str, values))
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            series = self._series[key] = self._new_series()
+        return series
+
+    def series(self) -> List[Tuple[Labels, object]]:
+        return list(self._series.items())
+
+    def clear(self) -> None:
+        """Drop all series (e.g. gauges about hosts no longer crawled)."""
+        self._series.clear()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A value that only goes up (requests, bytes, errors)."""
+    kind = "counter"
+
+    def _new_series(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """A value that goes up and down (queue depth, current delay)."""
+    kind = "gauge"
+
+    def _new_series(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """A distribution of observations (latencies, sizes) in fixed buckets."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """A set of uniquely named metrics, with renderers for all of them."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Re-registering the same metric (e.g. a module reloaded) is fine
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered differently")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, series in metric.series():
+                labels = dict(zip(metric.labelnames, key))
+                if isinstance(series, HistogramValue):
+                    cumulative = 0
+                    for bound, n in zip((*series.bounds, float("inf")), series.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else _format(bound)
+                        lines.append(
+                            f"{metric.name}_bucket{_labels({**labels, 'le': le})} {cumulative}"
+                        )
+                    lines.append(f"{metric.name}_sum{_labels(labels)} {_format(series.sum)}")
+                    lines.append(f"{metric.name}_count{_labels(labels)} {series.count}")
+                else:
+                    lines.append(f"{metric.name}{_labels(labels)} {_format(series.value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        All metrics as plain data: {name: value} for unlabelled metrics,
+        {name: {"label=value,…": value}} for labelled ones. Histograms
+        become {count, sum, mean, p50, p95, p99}.
+        """
+        out: Dict[str, object] = {}
+        for metric in self._metrics.values():
+            values = {}
+            for key, series in metric.series():
+                if isinstance(series, HistogramValue):
+                    value: object = {
+                        "count": series.count,
+                        "sum": series.sum,
+                        "mean": series.sum / series.count if series.count else None,
+                        "p50": series.quantile(0.5),
+                        "p95": series.quantile(0.95),
+                        "p99": series.quantile(0.99),
+                    }
+                else:
+                    value = series.value
+                values[",".join(f"{k}={v}" for k, v in zip(metric.labelnames, key))] = value
+            out[metric.name] = values if metric.labelnames else values.get("")
+        return out
+
+
+@contextmanager
+def timer(series) -> Iterator[None]:
+    """Observe the duration of the block, in seconds, on a Histogram (series)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        series.observe(time.perf_counter() - started)
+
+
+def timed(histogram: Histogram, *labels: object) -> Callable[[F], F]:
+    """Decorator: observe each call's duration on `histogram` (sync or async)."""
+    series = histogram.labels(*labels)
+
+    def decorate(func: F) -> F:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    series.observe(time.perf_counter() - started)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - started)
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"") + '"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+# Process-wide registry used by the crawler's own instrumentation
+REGISTRY = MetricsRegistry()